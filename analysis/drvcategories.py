@@ -30,6 +30,7 @@ Created on 06/03/2013
 
 '''
 import xml.etree.ElementTree as ET
+import xmlcleaner
 import sys
 import os
 import csv
@@ -87,10 +88,10 @@ def main():
         drvdata = dict((categ, {'z':0, 'tt':0, 'xps':0, 'count':0}) for categ in categories)
         
         #parses the i-th routeinfo file
-        rinfo_tree = ET.parse(os.path.join(
+        rinfo_tree = xmlcleaner.parse(os.path.join(
            options.path_to_input, 
            '%s_%d.xml' % (options.tripinfo_prefix, i + 1)
-        )) 
+        ), '<routes') 
         
         full_trips = full_trips_in_window(options.begin, options.finish, os.path.join(
            options.path_to_input, 
@@ -149,7 +150,7 @@ def full_trips_in_window(begin, finish, routeinfo_file):
     made a full trip between begin and finish
     
     '''
-    rinfo_tree = ET.parse(routeinfo_file)
+    rinfo_tree = xmlcleaner.parse(routeinfo_file, '<routes')
     
     fulltrips = []
     
@@ -9,6 +9,7 @@ Created on 22/02/2013
 @author: artavares
 '''
 import xml.etree.ElementTree as ET
+import xmlcleaner
 import sys
 import os
 import csv
@@ -53,10 +54,10 @@ def main():
         print 'Generating data for iteration', i+1
         
         #parses the i-th routeinfo file
-        rinfo_tree = ET.parse(os.path.join(
+        rinfo_tree = xmlcleaner.parse(os.path.join(
            options.path_to_input, 
            '%s_%d.xml' % (options.routeinfo_prefix, i + 1)
-        )) 
+        ), '<routes') 
         
         vehnum = 0
         for vdata in rinfo_tree.getroot():
@@ -125,7 +126,7 @@ def full_trips_in_window(begin, finish, routeinfo_file):
     made a full trip between begin and finish
     
     '''
-    rinfo_tree = ET.parse(routeinfo_file)
+    rinfo_tree = xmlcleaner.parse(routeinfo_file, '<routes')
     
     fulltrips = []
     
@@ -17,6 +17,7 @@ Created on May 17, 2013
 import sumolib
 import sys
 import xml.etree.ElementTree as ET
+import xmlcleaner
 
 from optparse import OptionParser
 from drvcategories import full_trips_in_window,new_average
@@ -33,8 +34,8 @@ def normalize(net_file_name, routeinfo_prefix, num_iterations, factor, first, la
         print 'Generating data for iteration', it+1
         
         #parses the i-th routeinfo file
-        rinfo_tree = ET.parse(
-           '%s_%d.xml' % (routeinfo_prefix, it + 1)
+        rinfo_tree = xmlcleaner.parse(
+           '%s_%d.xml' % (routeinfo_prefix, it + 1), '<routes'
         ) 
         
         full_trips = full_trips_in_window(first, last,
@@ -10,6 +10,8 @@ Created on 22/02/2013
 @author: artavares
 
 '''    
+import xml.etree.ElementTree as ET
+
 def clean_xml(filename, rootname):
     f = open(filename)
     lines = f.readlines()
@@ -22,6 +24,26 @@ def clean_xml(filename, rootname):
     f.writelines(lines)
     f.close
     
+def parse(filename, rootname):
+    '''
+    Parses the xml document from its <maintag>, without rewriting 
+    the file (i.e. ignores what comes before the line starting with rootname)
+    
+    '''
+    f = open(filename)
+    
+    position = f.tell()
+    line = f.readline()
+    while line != '' and not line.startswith(rootname):
+        position = f.tell()
+        line = f.readline()
+    
+    f.seek(position)
+    tree = ET.parse(f)
+    f.close()
+    
+    return tree
+    
 if __name__ == '__main__':
     import sys
     
@@ -0,0 +1,118 @@
+"""Flat, integer-indexed representation of a SUMO network for searching.
+
+Building the decorated EdgeData objects and resolving every attribute
+through DecoratorClass is expensive when many searches are performed
+over the same network. A CompiledNet is built once from a sumolib.Net:
+edges receive integer indices (in the order of net.getEdges()) and
+their successors are stored in CSR form, i.e. the successors of edge
+i are succ[succ_start[i]:succ_start[i + 1]].
+
+It also keeps the cost/predecessor buffers reused by the searches
+in the search module, so no per-search allocation is needed.
+
+CompiledNets can be pickled (e.g. to be sent to worker processes),
+in which case only the arrays are kept, not the sumolib edges.
+"""
+from weakref import WeakKeyDictionary
+
+INFINITY = float('inf')
+
+# Compiled networks are cached by the sumolib.Net they were built from
+_compiled_nets = WeakKeyDictionary()
+
+
+def compiled_net_of(net):
+    """Returns the CompiledNet of net, compiling it on the first call.
+
+    Returns None if net cannot be cached (i.e. it does not support
+    weak references), in which case callers should not compile it.
+    """
+    try:
+        compiled = _compiled_nets.get(net)
+    except TypeError:
+        return None
+
+    if compiled is None:
+        compiled = _compiled_nets[net] = CompiledNet(net)
+    return compiled
+
+
+class CompiledNet(object):
+    """Integer-indexed successor arrays and edge attributes of a network."""
+
+    def __init__(self, net):
+        """Compiles the edges of net (a sumolib.Net or compatible object).
+        """
+        self._edges = list(net.getEdges())
+
+        self.ids = [edge.getID() for edge in self._edges]
+        self._index = dict((edge_id, i) for i, edge_id in enumerate(self.ids))
+
+        self.lengths = [float(edge.getLength()) for edge in self._edges]
+        self.speeds = [float(edge.getSpeed()) for edge in self._edges]
+
+        # Successors in CSR form
+        self.succ_start = [0]
+        self.succ = []
+        for edge in self._edges:
+            self.succ.extend(self._index[neighbor.getID()]
+                             for neighbor in edge.getOutgoing())
+            self.succ_start.append(len(self.succ))
+
+        # Searches break ties by edge ID, just like the PriorityDict
+        # keyed by ID does, so both engines return the same routes
+        self.rank = [0] * len(self.ids)
+        for rank, i in enumerate(sorted(xrange(len(self.ids)),
+                                        key=self.ids.__getitem__)):
+            self.rank[i] = rank
+
+        self._init_buffers()
+
+    def _init_buffers(self):
+        """Allocates the buffers used (and restored) by the searches."""
+        self.reaching_cost = [INFINITY] * len(self.ids)
+        self.previous = [-1] * len(self.ids)
+        self.closed = [False] * len(self.ids)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attr in ['_edges', 'reaching_cost', 'previous', 'closed']:
+            del state[attr]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._edges = None
+        self._init_buffers()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def edges(self):
+        """List of the compiled edges, indexed by their edge index."""
+        return self._edges
+
+    def index_of(self, edge_or_id):
+        """Returns the index of the given edge (or edge ID)."""
+        if isinstance(edge_or_id, basestring):
+            return self._index[edge_or_id]
+        return self._index[edge_or_id.getID()]
+
+    def edge(self, index):
+        """Returns the edge with the given index."""
+        return self._edges[index]
+
+    def successors(self, index):
+        """Returns the indices of the successors of the given edge."""
+        return self.succ[self.succ_start[index]:self.succ_start[index + 1]]
+
+    def reset_buffers(self, touched):
+        """Restores the search buffers at the given indices."""
+        reaching_cost = self.reaching_cost
+        previous = self.previous
+        closed = self.closed
+        for i in touched:
+            reaching_cost[i] = INFINITY
+            previous[i] = -1
+            closed[i] = False
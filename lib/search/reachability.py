@@ -0,0 +1,143 @@
+"""Reachability index of the edges of a SUMO network.
+
+Searching between two edges that are not connected exhausts all the
+edges reachable from the origin before giving up. A ReachabilityIndex
+is built once from a CompiledNet: edges are labeled with their strongly
+connected component (Tarjan's algorithm) and, for each component, the
+set of components reachable from it in the condensation DAG is stored
+as a bit set (a Python long). Whether a path exists between two edges
+is then answered in constant time, before searching.
+"""
+from weakref import WeakKeyDictionary
+
+from compilednet import compiled_net_of
+
+# Indices are cached by the sumolib.Net they were built from
+_reachability_indices = WeakKeyDictionary()
+
+
+def reachability_of(net):
+    """Returns the ReachabilityIndex of net, building it on the first call.
+
+    Returns None if net cannot be compiled (see compiled_net_of).
+    """
+    compiled = compiled_net_of(net)
+    if compiled is None:
+        return None
+
+    index = _reachability_indices.get(net)
+    if index is None:
+        index = _reachability_indices[net] = ReachabilityIndex(compiled)
+    return index
+
+
+class ReachabilityIndex(object):
+    """Strongly connected components and their reachability."""
+
+    def __init__(self, compiled):
+        """Labels the edges of compiled (a CompiledNet) with their
+        components and calculates the reachability among components.
+        """
+        self._compiled = compiled
+        self.component = _strong_components(compiled)
+        self.num_components = max(self.component) + 1 if self.component else 0
+
+        members = [[] for _ in xrange(self.num_components)]
+        for i, c in enumerate(self.component):
+            members[c].append(i)
+
+        # Components are numbered in reverse topological order, so the
+        # components reachable from c have lower (already known) numbers
+        component = self.component
+        self._reach = []
+        self._cyclic = []
+        for c, edges in enumerate(members):
+            reach = 1 << c
+            cyclic = len(edges) > 1
+            for i in edges:
+                for j in compiled.successors(i):
+                    if component[j] != c:
+                        reach |= self._reach[component[j]]
+                    elif j == i:
+                        cyclic = True
+            self._reach.append(reach)
+            self._cyclic.append(cyclic)
+
+    def __len__(self):
+        return len(self.component)
+
+    def reachable_indices(self, origin, destination, accept_single_edge=True):
+        """Whether a path exists between two edge indices.
+
+        With accept_single_edge False, an edge only reaches itself
+        through a cycle, as in search_compiled.
+        """
+        c = self.component[origin]
+        if origin == destination and not accept_single_edge:
+            return self._cyclic[c]
+        return bool((self._reach[c] >> self.component[destination]) & 1)
+
+    def reachable(self, origin, destination, accept_single_edge=True):
+        """Whether a path exists between two edges (or edge IDs)."""
+        return self.reachable_indices(self._compiled.index_of(origin),
+                                      self._compiled.index_of(destination),
+                                      accept_single_edge)
+
+
+def _strong_components(compiled):
+    """Returns the component number of each edge of compiled.
+
+    Iterative version of Tarjan's algorithm: components are numbered
+    as they are completed, i.e. in reverse topological order.
+    """
+    succ = compiled.succ
+    succ_start = compiled.succ_start
+    num_edges = len(compiled)
+
+    order = [-1] * num_edges
+    low = [0] * num_edges
+    component = [-1] * num_edges
+    stack = []
+    counter = 0
+    num_components = 0
+
+    for root in xrange(num_edges):
+        if order[root] != -1:
+            continue
+
+        # Each call frame is (edge, position of its next successor)
+        order[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        frames = [(root, succ_start[root])]
+
+        while frames:
+            current, k = frames[-1]
+            if k < succ_start[current + 1]:
+                frames[-1] = (current, k + 1)
+                neighbor = succ[k]
+                if order[neighbor] == -1:
+                    order[neighbor] = low[neighbor] = counter
+                    counter += 1
+                    stack.append(neighbor)
+                    frames.append((neighbor, succ_start[neighbor]))
+                elif component[neighbor] == -1 and order[neighbor] < low[current]:
+                    # Neighbor still on the stack
+                    low[current] = order[neighbor]
+                continue
+
+            frames.pop()
+            if frames:
+                parent = frames[-1][0]
+                if low[current] < low[parent]:
+                    low[parent] = low[current]
+
+            if low[current] == order[current]:
+                while True:
+                    member = stack.pop()
+                    component[member] = num_components
+                    if member == current:
+                        break
+                num_components += 1
+
+    return component
@@ -12,15 +12,25 @@ Also contains method-object classes for the algorithms, taking
 as parameters a function for obtaining the cost of each edge and
 for calculating heuristics.
 
+Whenever the network can be compiled (see the compilednet module),
+astar and dijkstra run over its flat arrays instead, which avoids
+building EdgeData instances on every search. Both engines break
+ties by edge ID and return the same paths.
+
 All search methods assume that no negative costs exist.
 """
-from collections import deque
+from collections import deque, OrderedDict
+from heapq import heappush, heappop
 
 from dicts import PriorityDict, DefaultDict
 from decoratorclass import DecoratorClass
+from compilednet import CompiledNet, compiled_net_of, INFINITY
+from reachability import ReachabilityIndex, reachability_of
 
 # Export ONLY the AStar class
-__all__ = ['astar', 'dijkstra', 'AStar']
+__all__ = ['astar', 'dijkstra', 'AStar', 'CompiledNet', 'compiled_net_of',
+           'search_compiled', 'search_compiled_many', 'PathCache',
+           'ReachabilityIndex', 'reachability_of']
 
 
 def astar(net, origin, destination, edge_cost_function,
@@ -33,21 +43,294 @@ def astar(net, origin, destination, edge_cost_function,
 
     The result may not be exact unless the heuristic is admissible
     with regard to the edge cost function (i.e. never overestimates)
+
+    If the network can be compiled, edge_cost_function may also be a
+    sequence of costs indexed by the edge indices of its CompiledNet.
     """
-    searcher = AStar(edge_cost_function, heuristic_distance_function)
-    return searcher.search(net, origin, destination, accept_single_edge)
+    compiled = compiled_net_of(net)
+    if compiled is None:
+        searcher = AStar(edge_cost_function, heuristic_distance_function)
+        return searcher.search(net, origin, destination, accept_single_edge)
+
+    heuristic_costs = None
+    if heuristic_distance_function is not None:
+        destination_edge = compiled.edge(compiled.index_of(destination))
+        heuristic_costs = DefaultDict(lambda i: heuristic_distance_function(
+            compiled.edge(i), destination_edge))
+
+    return _search_edges(compiled, origin, destination, edge_cost_function,
+                         heuristic_costs, accept_single_edge)
 
 def dijkstra(net, origin, destination, edge_cost_function=None, accept_single_edge=None):
     """Calculates the least-cost path from origin to destination.
 
     Applies edge_cost_function to obtain the cost of each edge,
-    which by default is just its length.
+    which by default is just its length. If the network can be
+    compiled, it may also be a sequence of costs indexed by the
+    edge indices of its CompiledNet (e.g. a NumPy array).
+    """
+    compiled = compiled_net_of(net)
+    if compiled is None:
+        # Just an A* ignoring the heuristic
+        searcher = AStar(edge_cost_function or (lambda e: e.getLength()),
+                         lambda a, b: 0.0)
+        return searcher.search(net, origin, destination, accept_single_edge)
+
+    return _search_edges(compiled, origin, destination, edge_cost_function,
+                         None, accept_single_edge)
+
+def _search_edges(compiled, origin, destination, edge_cost_function,
+                  heuristic_costs, accept_single_edge):
+    """Runs search_compiled between edges, returning a list of edges."""
+    path = search_compiled(compiled,
+                           compiled.index_of(origin),
+                           compiled.index_of(destination),
+                           edge_costs(compiled, edge_cost_function),
+                           heuristic_costs, accept_single_edge)
+    if path is None:
+        return None
+    return [compiled.edge(i) for i in path]
+
+def edge_costs(compiled, edge_cost_function=None):
+    """Returns the costs of the edges of compiled, indexable by edge index.
+
+    edge_cost_function may be None (costs are the edge lengths), a
+    function receiving an edge (evaluated lazily, once per edge) or
+    a sequence of costs already indexed by edge index.
+    """
+    if edge_cost_function is None:
+        return compiled.lengths
+
+    if callable(edge_cost_function):
+        return DefaultDict(lambda i: edge_cost_function(compiled.edge(i)))
+
+    if hasattr(edge_cost_function, 'tolist'):
+        # NumPy arrays are much slower to index one item at a time
+        return edge_cost_function.tolist()
+
+    return edge_cost_function
+
+def search_compiled(compiled, origin, destination, costs,
+                    heuristic_costs=None, accept_single_edge=False):
+    """Calculates the least-cost path between two edge indices.
+
+    Runs over the arrays of a CompiledNet, with the same semantics of
+    AStar.search: the cost of a path is the sum of the costs of its
+    edges, excluding the origin. costs and heuristic_costs (the
+    estimated costs to the destination, zero if None) are indexed by
+    edge index.
+
+    Returns the list of edge indices of the path, or None if the
+    destination cannot be reached.
+    """
+    return search_compiled_many(compiled, origin, [destination], costs,
+                                heuristic_costs, accept_single_edge)[0]
+
+def search_compiled_many(compiled, origin, destinations, costs,
+                         heuristic_costs=None, accept_single_edge=False):
+    """Calculates the least-cost paths from origin to many destinations.
+
+    A single search tree is grown from the origin until all destinations
+    are reached. Each path is the same that search_compiled returns for
+    its destination, since the search proceeds identically until then.
+    A heuristic, if given, must not overestimate for any destination.
+
+    Returns a list with the path (list of edge indices) to each
+    destination, or None for the unreachable ones.
+    """
+    if not accept_single_edge and origin in destinations and len(set(destinations)) > 1:
+        # Reaching the origin again changes the search tree,
+        # so it is searched separately from other destinations
+        others = [d for d in destinations if d != origin]
+        paths = dict(zip(others, search_compiled_many(
+            compiled, origin, others, costs, heuristic_costs, accept_single_edge)))
+        paths[origin] = search_compiled(compiled, origin, origin, costs,
+                                        heuristic_costs, accept_single_edge)
+        return [paths[d] for d in destinations]
+
+    reaching_cost = compiled.reaching_cost
+    previous = compiled.previous
+    closed = compiled.closed
+    succ = compiled.succ
+    succ_start = compiled.succ_start
+    rank = compiled.rank
+
+    use_heuristic = heuristic_costs is not None
+    remaining = set(destinations)
+    open_edges = []
+    touched = [origin]
+
+    try:
+        if accept_single_edge:
+            # Insert the first edge into the queue
+            reaching_cost[origin] = 0.0
+            heuristic = heuristic_costs[origin] if use_heuristic else 0.0
+            heappush(open_edges, (heuristic, rank[origin], origin))
+        else:
+            # If the origin and destination are the same, the origin
+            # must still be reached through its neighbors
+            if origin not in remaining:
+                reaching_cost[origin] = 0.0
+                closed[origin] = True
+
+            # Insert the neighbors of the first edge into the queue
+            for k in xrange(succ_start[origin], succ_start[origin + 1]):
+                neighbor = succ[k]
+                cost = costs[neighbor]
+                if cost < reaching_cost[neighbor]:
+                    if reaching_cost[neighbor] == INFINITY:
+                        touched.append(neighbor)
+                    reaching_cost[neighbor] = cost
+                    previous[neighbor] = origin
+                    if use_heuristic:
+                        cost += heuristic_costs[neighbor]
+                    heappush(open_edges, (cost, rank[neighbor], neighbor))
+
+        # Main search body
+        while open_edges:
+            current = heappop(open_edges)[2]
+            if closed[current]:
+                # Outdated entry of an edge whose cost was lowered
+                continue
+            closed[current] = True
+
+            # Ends search if found all destinations
+            if current in remaining:
+                remaining.discard(current)
+                if not remaining:
+                    break
+
+            original_cost = reaching_cost[current]
+            for k in xrange(succ_start[current], succ_start[current + 1]):
+                neighbor = succ[k]
+                if closed[neighbor]:
+                    continue
+
+                cost = costs[neighbor] + original_cost
+                if cost < reaching_cost[neighbor]:
+                    if reaching_cost[neighbor] == INFINITY:
+                        touched.append(neighbor)
+                    reaching_cost[neighbor] = cost
+                    previous[neighbor] = current
+                    if use_heuristic:
+                        cost += heuristic_costs[neighbor]
+                    heappush(open_edges, (cost, rank[neighbor], neighbor))
+
+        # Reconstructs the paths to the destinations that were reached
+        return [_reconstruct_path(previous, d) if closed[d]
+                else None for d in destinations]
+
+    finally:
+        compiled.reset_buffers(touched)
+
+def _reconstruct_path(previous, destination):
+    """Best path to destination, obtained from the chain of previous edges.
+
+    Breaks any cycles when reaches the destination again.
+    """
+    path = [destination]
+    current = previous[destination]
+    while current != -1 and current != destination:
+        path.append(current)
+        current = previous[current]
+
+    path.reverse()
+    return path
+
+class PathCache(object):
+    """Memoizes the least-cost paths of a static cost function.
+
+    Paths are keyed by (origin ID, destination ID) and are the same that
+    dijkstra returns, including None for unreachable destinations. The
+    least recently used paths are evicted once max_size paths are stored
+    (the cache is unbounded if max_size is None).
+
+    Costs must not change while the cache is used, e.g. the default
+    cost (edge lengths) of the auxiliary demand loaders. The returned
+    paths are shared, so they must not be modified.
+
+    Pairs that the reachability index of the network rejects are
+    answered with None without searching, and are not cached.
     """
-    # Just an A* ignoring the heuristic
-    return astar(net, origin, destination,
-                 edge_cost_function or (lambda e: e.getLength()),
-                 lambda a, b: 0.0,
-                 accept_single_edge)
+
+    def __init__(self, net, edge_cost_function=None, accept_single_edge=True,
+                 max_size=100000):
+        """Initializes an empty cache of the paths in net."""
+        self._net = net
+        self._edge_cost_function = edge_cost_function
+        self._accept_single_edge = accept_single_edge
+        self._max_size = max_size
+
+        self._paths = OrderedDict()
+        self._reachability = reachability_of(net)
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self._paths)
+
+    def path(self, origin, destination):
+        """Returns the least-cost path (list of edges) from origin to
+        destination, searching it only if it is not cached.
+        """
+        if not self.reachable(origin, destination):
+            self.rejected += 1
+            return None
+
+        key = (origin.getID(), destination.getID())
+
+        path = self._paths.pop(key, self)
+        if path is not self:
+            self.hits += 1
+        else:
+            self.misses += 1
+            path = dijkstra(self._net, origin, destination,
+                            self._edge_cost_function, self._accept_single_edge)
+
+        # Re-inserted as the most recently used
+        self._store(key, path)
+        return path
+
+    def reachable(self, origin, destination):
+        """Whether a path may exist from origin to destination (edges or
+        edge IDs). Always True if the network cannot be compiled.
+        """
+        if self._reachability is None:
+            return True
+        return self._reachability.reachable(origin, destination,
+                                            self._accept_single_edge)
+
+    def precompute(self, origins, destinations):
+        """Searches and caches the paths between all origins and
+        destinations (edges), with one search tree per origin when the
+        network can be compiled.
+        """
+        compiled = compiled_net_of(self._net)
+
+        for origin in origins:
+            if compiled is None:
+                for destination in destinations:
+                    self.path(origin, destination)
+                continue
+
+            paths = search_compiled_many(
+                compiled, compiled.index_of(origin),
+                [compiled.index_of(d) for d in destinations],
+                edge_costs(compiled, self._edge_cost_function),
+                None, self._accept_single_edge)
+
+            for destination, path in zip(destinations, paths):
+                if path is not None:
+                    path = [compiled.edge(i) for i in path]
+                self._store((origin.getID(), destination.getID()), path)
+
+    def _store(self, key, path):
+        """Caches the path, evicting the least recently used ones."""
+        self._paths[key] = path
+        if self._max_size is not None:
+            while len(self._paths) > self._max_size:
+                self._paths.popitem(last=False)
 
 class EdgeData(DecoratorClass):
     """Decorator class for Edges, adding information required for search."""
@@ -26,7 +26,7 @@ class DynamicLoadController(object):
     '''
     
     def __init__(self, road_network, max_drivers, 
-                 aux_id_prefix = 'aux', exclude_prefix = None):
+                 aux_id_prefix = 'aux', exclude_prefix = None, path_cache = None):
         '''
         Initializes the auxiliary load controller class
         
@@ -38,6 +38,8 @@ class DynamicLoadController(object):
         :type aux_id_prefix: str
         :param exclude_prefix: exclude these drivers from being controlled
         :type exclude_prefix: string 
+        :param path_cache: the cache of the routes (length-based) between edges (created if None)
+        :type path_cache: search.PathCache
 
         '''
         
@@ -49,6 +51,9 @@ class DynamicLoadController(object):
         self._num_drv = 0
         self._insertions = 0
         
+        #routes are calculated once for each origin and destination
+        self._paths = path_cache if path_cache is not None else search.PathCache(road_network)
+        
     def act(self):
         '''
         Must be called every timestep. Inserts vehicles in the simulation
@@ -80,11 +85,7 @@ class DynamicLoadController(object):
                 
                 #print '%.2f\t%.2f' % (origOcc, destOcc)
                 
-                theRoute = search.dijkstra(
-                    self._road_net, 
-                    orig, 
-                    dest, None, True
-                )
+                theRoute = self._paths.path(orig, dest)
                 #tries again if dest is not reachable from orig
                 if theRoute is None:
                     continue
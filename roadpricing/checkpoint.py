@@ -0,0 +1,81 @@
+'''
+checkpoint module
+
+Saves the state of an experiment after an iteration and loads it back,
+so that the experiment can be resumed without replaying the route
+information files of the previous iterations.
+
+The checkpoint is a binary (pickle) file with the drivers' knowledge
+base, the arrays of the link managers' states (prices, q-tables,
+epsilons...), the drivers' total expenses, the state of the random
+number generators and the number of the finished iteration.
+
+'''
+import os
+import random
+import cPickle
+import numpy
+
+#name of the checkpoint file in the output path of the experiment
+CHECKPOINT_FILE = 'checkpoint.pkl'
+
+def save_checkpoint(filename, iteration, knowledge_base, link_states, drivers):
+    '''
+    Saves the state of the experiment after the given iteration. The file
+    is replaced only when completely written, so that a crash while
+    saving does not destroy the previous checkpoint
+
+    :param filename: the path to the checkpoint file
+    :type filename: str
+    :param iteration: the number of the finished iteration
+    :type iteration: int
+    :param knowledge_base: the drivers' knowledge base
+    :type knowledge_base: drivers.KnowledgeBase
+    :param link_states: the states of the link managers
+    :type link_states: netmanagement.LinkStates
+    :param drivers: the drivers of the experiment
+    :type drivers: list
+
+    '''
+    state = {
+        'iteration': iteration,
+        'knowledge_base': knowledge_base.arrays(),
+        'link_states': link_states.arrays(),
+        'total_expenses': numpy.array([d.total_expenses for d in drivers]),
+        'random_state': random.getstate(),
+        'numpy_random_state': numpy.random.get_state(),
+    }
+
+    tmpname = filename + '.tmp'
+    outfile = open(tmpname, 'wb')
+    cPickle.dump(state, outfile, cPickle.HIGHEST_PROTOCOL)
+    outfile.close()
+
+    os.rename(tmpname, filename)
+
+def load_checkpoint(filename, knowledge_base, link_states, drivers):
+    '''
+    Restores the state of the experiment saved in the checkpoint file
+
+    :return: the number of the last finished iteration
+    :rtype: int
+
+    '''
+    infile = open(filename, 'rb')
+    state = cPickle.load(infile)
+    infile.close()
+
+    try:
+        knowledge_base.restore(state['knowledge_base'])
+    except ValueError, e:
+        raise ValueError('Invalid checkpoint %s: %s' % (filename, e))
+
+    link_states.restore(state['link_states'])
+
+    for d, expenses in zip(drivers, state['total_expenses'].tolist()):
+        d._total_expenses = expenses
+
+    random.setstate(state['random_state'])
+    numpy.random.set_state(state['numpy_random_state'])
+
+    return state['iteration']
@@ -72,6 +72,27 @@ class ConfigParser(object):
             if param_element.tag == 'broadcast-prices':
                 self.broadcast_prices = str_to_bool(param_element.get('value'))
                 
+            if param_element.tag == 'route-workers':
+                self.route_workers = int(param_element.get('value'))
+                
+            if param_element.tag == 'checkpoint':
+                self.checkpoint = str_to_bool(param_element.get('value'))
+                
+            if param_element.tag == 'resume':
+                self.resume = str_to_bool(param_element.get('value'))
+                
+            if param_element.tag == 'binary-stats':
+                self.binary_stats = str_to_bool(param_element.get('value'))
+                
+            if param_element.tag == 'departure-lookahead':
+                self.departure_lookahead = int(param_element.get('value'))
+                
+            if param_element.tag == 'sparse-knowledge-base':
+                self.sparse_kb = str_to_bool(param_element.get('value'))
+                
+            if param_element.tag == 'online-payment':
+                self.online_payment = str_to_bool(param_element.get('value'))
+                
         if cfgtree.find('qlparams'): #qlparams are optional         
             for param_element in cfgtree.find('qlparams'):
                 
@@ -102,6 +123,9 @@ class ConfigParser(object):
                 
             if sumo_element.tag == 'summary-output-prefix':
                 self.summary_prefix = self._parse_path(sumo_element.get('value'))
+                
+            if sumo_element.tag == 'persistent':
+                self.persistent_sumo = str_to_bool(sumo_element.get('value'))
 
     def _parse_path(self, value):
         return os.path.join(
@@ -125,6 +149,13 @@ class ConfigParser(object):
         self.use_lk = False
         self.time_limit = -1
         self.broadcast_prices = False
+        self.route_workers = 1
+        self.checkpoint = True
+        self.resume = False
+        self.binary_stats = False
+        self.departure_lookahead = 100
+        self.sparse_kb = False
+        self.online_payment = False
         
         #qlparams group (empty coz params need to be explicit)
         self.qlparams = type('qlparams', (object,), {})()
@@ -136,3 +167,4 @@ class ConfigParser(object):
         self.sumopath = None
         self.summary_prefix = None
         self.warmuptime = 0
+        self.persistent_sumo = False
@@ -13,90 +13,388 @@ import sumolib
 import traci
 import sys
 import os
+import struct
+import numpy
 import xml.etree.ElementTree as ET
+from weakref import WeakKeyDictionary
 
 #looks up on ../lib to import Guilherme's implementation of Dijkstra algorithm
 path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'lib', 'search'))
 if not path in sys.path: sys.path.append(path)
 
-from search import dijkstra
+from search import dijkstra, compiled_net_of
+import routeinfo
 
-def parse_drivers(filename, road_net):
+#3 * free-flow travel time of each edge, cached per compiled network
+_max_travel_times = WeakKeyDictionary()
+
+def max_travel_times(compiled_net):
+    '''
+    Returns an array with the travel time used to normalize the known
+    travel time of each edge (3*fftt), indexed by edge index
+    
+    :param compiled_net: the compiled road network
+    :type compiled_net: search.CompiledNet
+    :return: the normalization travel times
+    :rtype: numpy.ndarray
+    
+    '''
+    if compiled_net not in _max_travel_times:
+        _max_travel_times[compiled_net] = (
+            3.0 * numpy.array(compiled_net.lengths)) / numpy.array(compiled_net.speeds)
+        
+    return _max_travel_times[compiled_net]
+
+#number of columns in a drivers' file: id orig dest depart pref
+_DRV_COLUMNS = 5
+
+class DriversTable(object):
+    '''
+    The drivers of a drivers' file stored as columns (struct of arrays):
+    ids, origin and destination edge indices (in the compiled road 
+    network), departure times and preferences. Drivers keep the order
+    of the file, departure_order gives them sorted by departure time.
+    
+    '''
+    
+    def __init__(self, ids, origins, destinations, departs, preferences):
+        self.ids = ids
+        self.origins = origins
+        self.destinations = destinations
+        self.departs = departs
+        self.preferences = preferences
+        
+    def __len__(self):
+        return len(self.ids)
+    
+    @property
+    def departure_order(self):
+        '''
+        Returns the positions of the drivers sorted by departure time
+        (drivers departing at the same time keep the order of the file)
+        
+        '''
+        return numpy.argsort(self.departs, kind='mergesort')
+    
+def read_drivers_table(filename, compiled_net):
+    '''
+    Reads the drivers' file at once into a DriversTable. Edges are 
+    referenced by their indices in the compiled road network
+    
+    :param filename: the path to the drivers' file
+    :type filename: string
+    :param compiled_net: the compiled road network
+    :type compiled_net: search.CompiledNet
+    :return: the drivers' columns
+    :rtype: DriversTable
+    
+    '''
+    infile = open(filename, 'r')
+    lines = infile.read().splitlines()
+    infile.close()
+    
+    #extra columns are ignored, missing ones would misalign the following drivers
+    tokens = []
+    for number, line in enumerate(lines):
+        if line[:1] == '#' or line.strip() == '':
+            continue
+        
+        columns = line.split()
+        if len(columns) < _DRV_COLUMNS:
+            raise ValueError(
+                'Line %d of %s has %d columns, %d expected' % 
+                (number + 1, filename, len(columns), _DRV_COLUMNS)
+            )
+        tokens.extend(columns[:_DRV_COLUMNS])
+    
+    try:
+        origins = numpy.array([compiled_net.index_of(e) for e in tokens[1::_DRV_COLUMNS]], dtype=int)
+        destinations = numpy.array([compiled_net.index_of(e) for e in tokens[2::_DRV_COLUMNS]], dtype=int)
+    except KeyError, e:
+        raise ValueError('Edge %s of %s is not in the road network' % (e, filename))
+    
+    table = DriversTable(
+        tokens[0::_DRV_COLUMNS],
+        origins,
+        destinations,
+        numpy.array(tokens[3::_DRV_COLUMNS]).astype(int),
+        numpy.array(tokens[4::_DRV_COLUMNS]).astype(float)
+    )
+    
+    if ((table.preferences < 0) | (table.preferences > 1)).any():
+        raise ValueError('Driver\'s preference must be on the interval [0:1]')
+    
+    return table
+
+def parse_drivers(filename, road_net, knowledge_base=None):
     '''
     Returns a list with the drivers from the file.
     
     :param filename: the path to the drivers' file
     :type filename: string
+    :param knowledge_base: the knowledge base shared by the drivers (created if None)
+    :type knowledge_base: KnowledgeBase
     return: a list with drivers
     :rtype: list
     
     '''
+    return create_drivers(
+        read_drivers_table(filename, compiled_net_of(road_net)), road_net, knowledge_base
+    )
+
+def create_drivers(table, road_net, knowledge_base=None):
+    '''
+    Returns a list with the drivers of the table, in the same order.
+    
+    :param table: the drivers' columns (see read_drivers_table)
+    :type table: DriversTable
+    :param knowledge_base: the knowledge base shared by the drivers (created if None)
+    :type knowledge_base: KnowledgeBase
+    return: a list with drivers
+    :rtype: list
+    
+    '''
+    if knowledge_base is None:
+        knowledge_base = KnowledgeBase(road_net, len(table))
+    
+    #the rows of all drivers are initialized at once
+    rows = knowledge_base.allocate_rows(len(table))
+    edges = compiled_net_of(road_net).edges
     
-    lines = open(filename,'r').readlines()
-    drivers = []
-    for l in lines:
-        if l[0] != '#': 
-            attributes = l.split(' ')
-            drivers.append(Driver(
-                attributes[0], #id
-                road_net,
-                road_net.getEdge(attributes[1]), #origin
-                road_net.getEdge(attributes[2]), #destination
-                int(attributes[3]), #depart
-                float(attributes[4]) #preference
-            ))
-                           
-    return drivers
+    return [
+        Driver(
+            drv_id, road_net, edges[orig], edges[dest], depart, pref,
+            knowledge_base = knowledge_base, kb_row = row
+        )
+        for drv_id, orig, dest, depart, pref, row in zip(
+            table.ids, table.origins.tolist(), table.destinations.tolist(), 
+            table.departs.tolist(), table.preferences.tolist(), rows
+        )
+    ]
 
 
+class DepartureScheduler(object):
+    '''
+    Releases the drivers in the order of their departure times, in
+    batches of drivers departing within a look-ahead horizon. Drivers
+    are sorted once (in any input order), then released by advancing 
+    a cursor over the sorted departure times.
+    
+    '''
+    
+    def __init__(self, drivers, lookahead=100, order=None):
+        '''
+        Initializes the scheduler
+        
+        :param drivers: the drivers to be released
+        :type drivers: list
+        :param lookahead: drivers departing in up to lookahead timesteps are released
+        :type lookahead: int
+        :param order: positions of the drivers sorted by departure time, e.g. DriversTable.departure_order (sorted here if None)
+        :type order: numpy.ndarray
+        
+        '''
+        self._drivers = drivers
+        self._lookahead = lookahead
+        
+        departs = numpy.array([d.depart_time for d in drivers])
+        
+        #drivers departing at the same time keep their order
+        if order is None:
+            order = numpy.argsort(departs, kind='mergesort')
+        self._order = numpy.asarray(order)
+        self._departs = departs[self._order]
+        self._cursor = 0
+        
+    def __len__(self):
+        '''
+        Returns the number of drivers not released yet
+        
+        '''
+        return len(self._drivers) - self._cursor
+    
+    @property
+    def lookahead(self):
+        return self._lookahead
+    
+    def reset(self):
+        '''
+        Makes all drivers scheduled again (e.g. for the next iteration)
+        
+        '''
+        self._cursor = 0
+        
+    def release(self, timestep):
+        '''
+        Returns the drivers not released yet that depart before 
+        timestep + lookahead, sorted by departure time
+        
+        :param timestep: the current timestep
+        :type timestep: int
+        :return: the released drivers
+        :rtype: list
+        
+        '''
+        end = numpy.searchsorted(self._departs, timestep + self._lookahead, 'left')
+        if end <= self._cursor:
+            return []
+        
+        released = [self._drivers[i] for i in self._order[self._cursor:end]]
+        self._cursor = end
+        
+        return released
+    
 def update_kb(drivers, net_mgmt, route_info_file):
     '''
     Updates the drivers knowledge base
     using the information from route_info_file
     
     '''
-    #pre-parse the file, disregarding the commented lines =/
-    f = open(route_info_file)
-    lines = f.readlines()
-    f.close()
-    #del lines[3]
-    while not lines[0].startswith("<routes>"):
-        del lines[0]
+    drivers_dict = dict((d.driver_id, d) for d in drivers)
+    prices = net_mgmt.current_prices()
+    
+    for record in routeinfo.read_routes(route_info_file, net_mgmt.index_of_link):
+        update_driver_kb(drivers_dict[record.vehicle_id], record, prices)
+        
+def update_driver_kb(driver, record, prices, charge=True):
+    '''
+    Updates the knowledge base of a driver with the trip it made
     
-    f = open(route_info_file,'w')
-    for l in lines:
-        f.write(l)
-    f.close()
-    #finish pre-parsing =/
+    :param driver: the driver
+    :type driver: Driver
+    :param record: the trip of the driver, read from the route information file
+    :type record: routeinfo.RouteRecord
+    :param prices: the current price of each link, indexed by edge index
+    :type prices: numpy.ndarray
+    :param charge: add the prices of the route to the driver's trip expenses?
+    :type charge: bool
     
-    tree = ET.parse(route_info_file)
-    drivers_dict = dict((d.driver_id, d) for d in drivers)
-    last_arrival = 0 #for glitch-fixing
-    for vehicle in tree.getroot():
+    '''
+    edges = record.edges
+    exit_times = numpy.array(record.exit_times)
+    
+    driver._time_when_departed = record.depart
+    driver._time_when_arrived = record.arrival
+    
+    ids = driver.knowledge_base.compiled_net.ids
+    driver._route = [ids[i].encode('utf-8') for i in edges]
+    
+    #time spent in each edge, from entering to exiting it
+    entry_times = numpy.empty(len(exit_times))
+    entry_times[0] = record.depart
+    entry_times[1:] = exit_times[:-1]
+    
+    edge_prices = prices[edges]
+    
+    row = driver.kb_row
+    driver.knowledge_base.set_travel_times(row, edges, exit_times - entry_times)
+    driver.knowledge_base.set_prices(row, edges, edge_prices)
+    if charge:
+        driver._trip_expenses += int(edge_prices.sum())
+
+class TripStatistics(object):
+    '''
+    Statistics of the last trips of a population of drivers, stored as
+    arrays with one value per driver (in the order of the drivers).
+    They are calculated at once from the route information records,
+    with segment sums over the edges of all routes, yielding the same
+    values of the drivers' norm_travel_time, trip_expenses and
+    perceived_trip_cost properties.
+
+    '''
+
+    def __init__(self, drivers, factor=100):
+        '''
+        Initializes the (empty) statistics
+
+        :param drivers: the drivers, sharing one knowledge base
+        :type drivers: list
+        :param factor: the scale of normalized travel times
+        :type factor: int
+
+        '''
+        self._drivers = drivers
+        self._factor = factor
+        self._position = dict((d.driver_id, i) for i, d in enumerate(drivers))
+        self._preferences = numpy.array([d.preference for d in drivers], dtype=float)
+
+        self.norm_travel_time = None
+        self.trip_expenses = None
+        self.perceived_trip_cost = None
         
-        d = drivers_dict[vehicle.get('id')]
+        #positions of the drivers without a trip in the last update
+        self._without_trip = []
+
+    def update(self, trips):
+        '''
+        Calculates the statistics of the given trips. Drivers without a
+        trip take the values of their properties (e.g. NOT_DEPARTED)
+
+        :param trips: the (driver, record) of each trip, after the driver's knowledge base is updated
+        :type trips: list
+
+        '''
+        num_drivers = len(self._drivers)
+        norm_tt = numpy.empty(num_drivers)
+        travel_times = numpy.empty(num_drivers)
+        expenses = numpy.empty(num_drivers, dtype=int)
+
+        #drivers without a trip are left with their own values
+        with_trip = numpy.zeros(num_drivers, dtype=bool)
+
+        if len(trips) > 0:
+            positions = numpy.array([self._position[d.driver_id] for d, r in trips])
+            with_trip[positions] = True
+
+            kb = trips[0][0].knowledge_base
+            rows = numpy.array([d.kb_row for d, r in trips])
+            route_lengths = numpy.array([len(r.edges) for d, r in trips])
+            edges = numpy.fromiter(
+                (e for d, r in trips for e in r.edges), dtype=int, count=route_lengths.sum()
+            )
+
+            #known travel time of each edge of each route, normalized by 3*fftt
+            norm_edge_tt = self._factor * kb.travel_times_at(numpy.repeat(rows, route_lengths), edges).astype(float) / \
+                max_travel_times(kb.compiled_net)[edges]
+
+            starts = numpy.cumsum(route_lengths) - route_lengths
+            norm_tt[positions] = numpy.add.reduceat(norm_edge_tt, starts)
+
+            travel_times[positions] = [r.arrival - r.depart for d, r in trips]
+            expenses[positions] = [d.trip_expenses for d, r in trips]
+
+        self._without_trip = numpy.flatnonzero(~with_trip).tolist()
+        for i in self._without_trip:
+            d = self._drivers[i]
+            norm_tt[i] = d.norm_travel_time
+            travel_times[i] = d.travel_time
+            expenses[i] = d.trip_expenses
+
+        self.norm_travel_time = norm_tt
+        self.trip_expenses = expenses
+        self.perceived_trip_cost = self._preferences * travel_times + \
+            (1 - self._preferences) * expenses
+    
+    def values(self, name):
+        '''
+        Returns one of the statistics as a list, to be written. Drivers
+        without a trip have the values of their properties, keeping their
+        types (e.g. the int NOT_DEPARTED is written as -1, not -1.0)
         
-        tstart = float(vehicle.get('depart'))
-        d._time_when_departed = tstart
-        d._time_when_arrived = float(vehicle.get('arrival')) if vehicle.get('arrival') != '' else last_arrival
-        last_arrival = d._time_when_arrived
-        edges = vehicle[0].get('edges').split(' ')
-        exit_times = vehicle[0].get('exitTimes').split(' ')
+        :param name: the statistic (norm_travel_time, trip_expenses or perceived_trip_cost)
+        :type name: str
+        :return: the value of each driver
+        :rtype: list
         
-        d._route = edges
+        '''
+        values = getattr(self, name).tolist()
+        for i in self._without_trip:
+            values[i] = getattr(self._drivers[i], name)
         
-        for i in range(len(edges)):
-            spent_time = float(exit_times[i]) - tstart
-            edge_price = net_mgmt.manager_of_link(edges[i]).price
-            
-            d.set_known_travel_time(edges[i], spent_time) 
-            d.set_known_price(edges[i],  edge_price)
-            d._trip_expenses += edge_price
-            
-            tstart = float(exit_times[i])
+        return values
 
 
-def _save_attr_to_file(self, net, drivers, filename, getter):
+def _save_attr_to_file(net, drivers, filename, getter):
         '''
         Saves one attribute of the drivers regarding the road network to a file in the format:
         drv\road,road1,road2,...
@@ -115,7 +413,7 @@ def _save_attr_to_file(self, net, drivers, filename, getter):
             outfile.write(','.join([str(getter(d,e.getID())) for e in net.getEdges()]) + '\n')
         outfile.close()
         
-def _load_data(self, drivers, filename, setter):
+def _load_data(drivers, filename, setter):
         '''
         Loads data of drivers regarding the road network from a file in the format:
         drv\road,road1,road2,...
@@ -124,7 +422,7 @@ def _load_data(self, drivers, filename, setter):
         
         '''
         #makes a dict {id: driver,...} from the list of drivers
-        drvdict = dict((d.getId(), d) for d in drivers)
+        drvdict = dict((d.driver_id, d) for d in drivers)
         
         indata = open(filename).readlines()
         #edges ids are in the first row, from 2nd col onwards 
@@ -142,19 +440,21 @@ def _load_data(self, drivers, filename, setter):
                 setter(drvdict[drv_id], edges[i], float(edg_data[i]))
             
 
-def _open_file(file_or_filename):
+def _open_file(file_or_filename, mode='w'):
     '''
     Checks if given parameter is a file or a filename and returns an 
     actual file if a filename is given
     :param file_or_filename: the variable to be checked
     :type file_or_filename: file|string
+    :param mode: the mode to open the file with the given filename
+    :type mode: string
     return: file object
     :rtype: file
     '''
     
     #if is string, returns the file with the given filename
     if isinstance(file_or_filename,str):
-        return open(file_or_filename, 'w')
+        return open(file_or_filename, mode)
     
     #if not, assumes that it is a file object and returns it
     return file_or_filename
@@ -162,7 +462,9 @@ def _open_file(file_or_filename):
 class KBLoader(object):
     def __init__(self, prc_file, tt_file):
         '''
-        Initializes knowledge base loader
+        Initializes knowledge base loader. If prc_file is the name of a binary
+        snapshot (see save_kb_snapshot), both prices and travel times are 
+        loaded from it and tt_file is not used
         
         :param prc_file: the file object or the string with the file name to load prices
         :type prc_file: file|string
@@ -183,6 +485,10 @@ class KBLoader(object):
         :type drivers: list
         
         '''
+        #a binary snapshot holds both prices and travel times
+        if is_kb_snapshot(self._prc_file):
+            return KBSnapshot(self._prc_file).load(drivers)
+        
         #creates a dict from the list
         self._drivers = {}
         
@@ -195,11 +501,11 @@ class KBLoader(object):
         return drivers
     
     def _load_prices(self):
-        self._prc_file = _open_file(self._prc_file)
+        self._prc_file = _open_file(self._prc_file, 'r')
         self._load_content(self._prc_file, 'set_known_price')
     
     def _load_travel_times(self):
-        self._load_content(_open_file(self._tt_file), 'set_known_travel_time')
+        self._load_content(_open_file(self._tt_file, 'r'), 'set_known_travel_time')
     
     def _load_content(self, the_file, attribute):
         '''
@@ -272,6 +578,21 @@ class KBSaver(object):
         self._save_prices(iteration, timestep)
         self._save_travel_times(iteration, timestep)
     
+    def save_snapshot(self, filename, iteration, timestep):
+        '''
+        Saves known prices and travel times in a binary snapshot, 
+        much faster to save and load than the text files
+        
+        :param filename: the path to the snapshot file
+        :type filename: str
+        :param iteration: the number of the iteration when save was called
+        :type iteration: int
+        :param timestep: the number of the timestep when save was called
+        :type timestep: int
+        
+        '''
+        save_kb_snapshot(filename, self._drivers, iteration, timestep)
+    
     def _save_prices(self, iteration, timestep):
         '''
         Saves known prices
@@ -344,6 +665,816 @@ class KBSaver(object):
         
     
 
+#identifies the binary knowledge base snapshots
+KB_SNAPSHOT_MAGIC = 'RPKBSNAP'
+KB_SNAPSHOT_VERSION = 1
+
+#magic, version, iteration, timestep, num. of drivers, num. of edges, size of the id tables
+_SNAPSHOT_HEADER = struct.Struct('<8s6q')
+
+#matrices start at multiples of this (in bytes) from the beginning of the file
+_SNAPSHOT_ALIGNMENT = 64
+
+#number of drivers whose rows are written at once
+_SNAPSHOT_BLOCK = 4096
+
+def is_kb_snapshot(file_or_filename):
+    '''
+    Returns whether the given file is a binary knowledge base snapshot
+    
+    '''
+    if not isinstance(file_or_filename, str):
+        return False
+    
+    infile = open(file_or_filename, 'rb')
+    magic = infile.read(len(KB_SNAPSHOT_MAGIC))
+    infile.close()
+    
+    return magic == KB_SNAPSHOT_MAGIC
+
+def save_kb_snapshot(filename, drivers, iteration=-1, timestep=-1):
+    '''
+    Saves the known prices and travel times of the drivers in a binary
+    snapshot: a header with the tables of edge and driver IDs, followed 
+    by the raw (drivers x edges) float32 matrices of prices and travel times
+    
+    :param filename: the path to the snapshot file
+    :type filename: str
+    :param drivers: the drivers, sharing one knowledge base
+    :type drivers: list
+    :param iteration: the number of the iteration when the snapshot is saved
+    :type iteration: int
+    :param timestep: the number of the timestep when the snapshot is saved
+    :type timestep: int
+    
+    '''
+    kb = drivers[0].knowledge_base
+    
+    ids = '\n'.join(
+        [eid.encode('utf-8') for eid in kb.compiled_net.ids] + 
+        [d.driver_id for d in drivers]
+    )
+    
+    #the matrices are aligned, so that they can be mapped into memory
+    offset = _SNAPSHOT_HEADER.size + len(ids)
+    padding = -offset % _SNAPSHOT_ALIGNMENT
+    
+    outfile = open(filename, 'wb')
+    outfile.write(_SNAPSHOT_HEADER.pack(
+        KB_SNAPSHOT_MAGIC, KB_SNAPSHOT_VERSION, iteration, timestep, 
+        len(drivers), len(kb.compiled_net), len(ids)
+    ))
+    outfile.write(ids + '\0' * padding)
+    
+    #rows are written in blocks, so that whole matrices are not built in memory
+    for getter in ['price_rows', 'travel_time_rows']:
+        for first in xrange(0, len(drivers), _SNAPSHOT_BLOCK):
+            block = _kb_rows(drivers[first:first + _SNAPSHOT_BLOCK], getter)
+            block.astype('<f4').tofile(outfile)
+        
+    outfile.close()
+
+def _kb_rows(drivers, getter):
+    '''
+    Returns the rows of the drivers in their knowledge bases, 
+    obtained with the given getter (price_rows or travel_time_rows)
+    
+    '''
+    kb = drivers[0].knowledge_base
+    
+    #drivers usually share one knowledge base
+    if all(d.knowledge_base is kb for d in drivers):
+        return getattr(kb, getter)([d.kb_row for d in drivers])
+    
+    return numpy.array([getattr(d.knowledge_base, getter)([d.kb_row])[0] for d in drivers])
+
+class KBSnapshot(object):
+    '''
+    A binary knowledge base snapshot (see save_kb_snapshot). Its 
+    matrices are mapped into memory, so only the rows that are 
+    loaded into drivers are actually read from the file
+    
+    '''
+    
+    def __init__(self, filename):
+        '''
+        Opens the snapshot, reading its header
+        
+        :param filename: the path to the snapshot file
+        :type filename: str
+        
+        '''
+        infile = open(filename, 'rb')
+        header = infile.read(_SNAPSHOT_HEADER.size)
+        
+        if len(header) < _SNAPSHOT_HEADER.size or not header.startswith(KB_SNAPSHOT_MAGIC):
+            infile.close()
+            raise ValueError('%s is not a knowledge base snapshot' % filename)
+        
+        (magic, version, self.iteration, self.timestep, 
+         num_drivers, num_edges, ids_size) = _SNAPSHOT_HEADER.unpack(header)
+        
+        if version != KB_SNAPSHOT_VERSION:
+            infile.close()
+            raise ValueError('%s has unknown snapshot version %d' % (filename, version))
+        
+        ids = infile.read(ids_size).split('\n') if ids_size > 0 else []
+        infile.close()
+        
+        self.edge_ids = [eid.decode('utf-8') for eid in ids[:num_edges]]
+        self.driver_ids = ids[num_edges:]
+        
+        offset = _SNAPSHOT_HEADER.size + ids_size
+        offset += -offset % _SNAPSHOT_ALIGNMENT
+        shape = (num_drivers, num_edges)
+        
+        self.prices = self.travel_times = None
+        if num_drivers * num_edges > 0:
+            self.prices = numpy.memmap(filename, '<f4', 'r', offset, shape)
+            self.travel_times = numpy.memmap(
+                filename, '<f4', 'r', offset + self.prices.nbytes, shape
+            )
+        
+    def load(self, drivers):
+        '''
+        Loads the known prices and travel times into the drivers with an ID
+        in the snapshot
+        
+        :param drivers: the list of drivers
+        :type drivers: list
+        :return: the drivers
+        :rtype: list
+        
+        '''
+        if len(drivers) == 0 or self.prices is None:
+            return drivers
+        
+        position = dict((drv_id, i) for i, drv_id in enumerate(self.driver_ids))
+        
+        #the rows are loaded at once into each knowledge base
+        kb_rows = {}
+        for d in drivers:
+            if d.driver_id in position:
+                kb_rows.setdefault(d.knowledge_base, []).append((position[d.driver_id], d.kb_row))
+        
+        for kb, loaded in kb_rows.iteritems():
+            try:
+                columns = numpy.array([kb.index_of(eid) for eid in self.edge_ids], dtype=int)
+            except KeyError, e:
+                raise ValueError('Edge %s of the snapshot is not in the road network' % e)
+            
+            positions, rows = numpy.array(loaded, dtype=int).T
+            
+            #prices are integers (see Driver.set_known_price)
+            kb.set_prices(rows[:, numpy.newaxis], columns, numpy.trunc(self.prices[positions]))
+            kb.set_travel_times(rows[:, numpy.newaxis], columns, self.travel_times[positions])
+        
+        return drivers
+    
+
+class KnowledgeBase(object):
+    '''
+    Stores the known prices and travel times of a population of drivers
+    in two (drivers x edges) matrices. Each driver owns one row, and
+    columns are the edge indices of the compiled road network.
+    
+    Broadcast prices are published as a single shared vector with a new
+    version. A known price is the driver's own value if it was written 
+    after the last broadcast (its stamp is the current version), or 
+    the shared price otherwise.
+    
+    '''
+    
+    DEFAULT_PRICE = 50 #half of max price
+    
+    def __init__(self, road_network, num_drivers=0, dtype=numpy.float32):
+        '''
+        Initializes the (empty) knowledge base
+        
+        :param road_network: road network object
+        :type road_network: sumolib.net.Net
+        :param num_drivers: the number of rows to be preallocated
+        :type num_drivers: int
+        :param dtype: the type of the stored values
+        :type dtype: numpy.dtype
+        
+        '''
+        self._compiled = compiled_net_of(road_network)
+        self._num_rows = 0
+        self._dtype = dtype
+        
+        num_edges = len(self._compiled)
+        self._prices = numpy.empty((num_drivers, num_edges), dtype)
+        self._travel_times = numpy.empty((num_drivers, num_edges), dtype)
+        
+        #version of the broadcast prices when each price was written (0: no broadcast yet)
+        self._price_stamps = numpy.zeros((num_drivers, num_edges), numpy.int32)
+        self._price_version = 0
+        self._shared_prices = None
+        
+        #drivers are initialized with the free-flow travel times
+        self._free_flow_tt = numpy.array(self._compiled.lengths) / \
+            numpy.array(self._compiled.speeds)
+    
+    @property
+    def compiled_net(self):
+        return self._compiled
+    
+    @property
+    def prices(self):
+        '''
+        Returns the (drivers x edges) matrix of known prices. It cannot be 
+        modified, prices are changed by set_prices and broadcast_prices
+        
+        '''
+        if self._price_version == 0:
+            prices = self._prices[:self._num_rows].view()
+        else:
+            prices = numpy.where(
+                self._price_stamps[:self._num_rows] == self._price_version,
+                self._prices[:self._num_rows], self._shared_prices
+            )
+        
+        prices.flags.writeable = False
+        return prices
+    
+    def known_prices(self, row):
+        '''
+        Returns the known price of each edge for the driver in the given row
+        
+        '''
+        if self._price_version == 0:
+            return self._prices[row]
+        
+        return numpy.where(
+            self._price_stamps[row] == self._price_version, 
+            self._prices[row], self._shared_prices
+        )
+    
+    def known_price(self, row, column):
+        '''
+        Returns the known price of one edge for the driver in the given row
+        
+        '''
+        if self._price_stamps[row, column] == self._price_version:
+            return self._prices[row, column]
+        
+        return self._shared_prices[column]
+    
+    def set_prices(self, rows, columns, prices):
+        '''
+        Stores the prices known by drivers, indexing the prices matrix 
+        with rows and columns (e.g. a row and a list of columns)
+        
+        '''
+        self._prices[:self._num_rows][rows, columns] = prices
+        self._price_stamps[:self._num_rows][rows, columns] = self._price_version
+    
+    def price_rows(self, rows):
+        '''
+        Returns the (len(rows) x edges) matrix of prices known by the 
+        drivers in the given rows
+        
+        '''
+        if self._price_version == 0:
+            return self._prices[rows]
+        
+        return numpy.where(
+            self._price_stamps[rows] == self._price_version, 
+            self._prices[rows], self._shared_prices
+        )
+    
+    @property
+    def travel_times(self):
+        '''
+        Returns the (drivers x edges) matrix of known travel times
+        
+        '''
+        return self._travel_times[:self._num_rows]
+    
+    def known_travel_times(self, row):
+        '''
+        Returns the known travel time of each edge for the driver in the given row
+        
+        '''
+        return self._travel_times[row]
+    
+    def known_travel_time(self, row, column):
+        '''
+        Returns the known travel time of one edge for the driver in the given row
+        
+        '''
+        return self._travel_times[row, column]
+    
+    def set_travel_times(self, rows, columns, travel_times):
+        '''
+        Stores the travel times known by drivers (see set_prices)
+        
+        '''
+        self._travel_times[:self._num_rows][rows, columns] = travel_times
+        
+    def travel_times_at(self, rows, columns):
+        '''
+        Returns the known travel times at the given (row, column) pairs
+        
+        '''
+        return self._travel_times[rows, columns]
+    
+    def travel_time_rows(self, rows):
+        '''
+        Returns the (len(rows) x edges) matrix of travel times known by 
+        the drivers in the given rows
+        
+        '''
+        return self._travel_times[rows]
+    
+    def arrays(self):
+        '''
+        Returns the known prices and travel times, to be saved 
+        (e.g. in a checkpoint) and restored later
+        
+        '''
+        return {'prices': self.prices, 'travel_times': self.travel_times}
+    
+    def restore(self, arrays):
+        '''
+        Restores the known prices and travel times returned by arrays()
+        
+        '''
+        if arrays.get('prices') is None or arrays['prices'].shape != self.prices.shape:
+            raise ValueError(
+                'Knowledge base has shape %s, expected %s' % 
+                (None if arrays.get('prices') is None else arrays['prices'].shape, self.prices.shape)
+            )
+        
+        self.set_prices(slice(None), slice(None), arrays['prices'])
+        self._travel_times[:self._num_rows] = arrays['travel_times']
+    
+    def __len__(self):
+        return self._num_rows
+    
+    def index_of(self, edge_or_id):
+        '''
+        Returns the column of the given edge (or edge ID)
+        
+        '''
+        return self._compiled.index_of(edge_or_id)
+    
+    def reserve(self, num_drivers):
+        '''
+        Makes room for num_drivers more rows without reallocations
+        
+        '''
+        capacity = self._num_rows + num_drivers
+        if capacity > len(self._prices):
+            self._prices = self._resized(self._prices, capacity)
+            self._travel_times = self._resized(self._travel_times, capacity)
+            self._price_stamps = self._resized(self._price_stamps, capacity)
+    
+    def _resized(self, matrix, capacity):
+        resized = numpy.empty((capacity, matrix.shape[1]), matrix.dtype)
+        resized[:self._num_rows] = matrix[:self._num_rows]
+        return resized
+    
+    def allocate_row(self, prc_init=None, tt_init=None):
+        '''
+        Allocates and initializes the row of a new driver
+        
+        :param prc_init: price initialization function (receives the edge ID)
+        :type prc_init: function
+        :param tt_init: travel time initialization function (receives the edge ID)
+        :type tt_init: function
+        :return: the index of the row
+        :rtype: int
+        
+        '''
+        if self._num_rows == len(self._prices):
+            self.reserve(max(1, self._num_rows))
+            
+        row = self._num_rows
+        self._num_rows += 1
+        
+        #uses default initialization if no init function was given
+        if prc_init is not None:
+            self._prices[row] = [prc_init(eid) for eid in self._compiled.ids]
+        else:
+            self._prices[row] = self.DEFAULT_PRICE
+        self._price_stamps[row] = self._price_version
+            
+        if tt_init is not None:
+            self._travel_times[row] = [tt_init(eid) for eid in self._compiled.ids]
+        else:
+            self._travel_times[row] = self._free_flow_tt
+        
+        return row
+    
+    def allocate_rows(self, num_drivers):
+        '''
+        Allocates and initializes (with the default values) the rows
+        of many new drivers at once
+        
+        :param num_drivers: the number of rows to be allocated
+        :type num_drivers: int
+        :return: the indices of the rows
+        :rtype: list
+        
+        '''
+        self.reserve(num_drivers)
+        
+        first = self._num_rows
+        self._num_rows += num_drivers
+        
+        self._prices[first:self._num_rows] = self.DEFAULT_PRICE
+        self._price_stamps[first:self._num_rows] = self._price_version
+        self._travel_times[first:self._num_rows] = self._free_flow_tt
+        
+        return range(first, self._num_rows)
+    
+    def broadcast_prices(self, prices):
+        '''
+        Makes all drivers know the given prices, publishing them as 
+        the new shared prices. Prices known by each driver are not copied
+        
+        :param prices: the price of each edge, indexed by edge index
+        :type prices: list|numpy.ndarray
+        
+        '''
+        self._shared_prices = numpy.array(prices, self._dtype)
+        self._price_version += 1
+    
+
+class SparseKnowledgeBase(KnowledgeBase):
+    '''
+    Knowledge base that stores, for each driver, only the edges whose 
+    price or travel time it has observed (a sparse delta over the shared
+    default values: the default price and the free-flow travel times). 
+    The memory used grows with the number of observed edges rather than
+    with drivers x edges. Dense rows are built when needed (e.g. to 
+    calculate routes) and hold the same values of KnowledgeBase.
+    
+    Each row is stored as sorted arrays of the observed edge indices, 
+    their prices, price stamps (see KnowledgeBase) and travel times.
+    
+    '''
+    
+    def __init__(self, road_network, num_drivers=0, dtype=numpy.float32):
+        '''
+        Initializes the (empty) knowledge base
+        
+        :param road_network: road network object
+        :type road_network: sumolib.net.Net
+        :param num_drivers: not used, rows take no room until edges are observed
+        :type num_drivers: int
+        :param dtype: the type of the stored values
+        :type dtype: numpy.dtype
+        
+        '''
+        self._compiled = compiled_net_of(road_network)
+        self._num_rows = 0
+        self._dtype = dtype
+        
+        self._price_version = 0
+        self._shared_prices = None
+        
+        #the default values, shared by all drivers
+        self._default_prices = numpy.empty(len(self._compiled), dtype)
+        self._default_prices[:] = self.DEFAULT_PRICE
+        self._free_flow_tt = (numpy.array(self._compiled.lengths) / \
+            numpy.array(self._compiled.speeds)).astype(dtype)
+        
+        #observed edges of each row and their values
+        self._columns = []
+        self._prices = []
+        self._price_stamps = []
+        self._travel_times = []
+        
+        #version of the broadcast prices when each row was allocated
+        self._row_versions = []
+        
+    @property
+    def prices(self):
+        '''
+        Returns the (drivers x edges) matrix of known prices. It is built
+        from the sparse rows, changing it has no effect
+        
+        '''
+        return self.price_rows(range(self._num_rows))
+    
+    @property
+    def travel_times(self):
+        '''
+        Returns the (drivers x edges) matrix of known travel times. It is 
+        built from the sparse rows, changing it has no effect
+        
+        '''
+        return self.travel_time_rows(range(self._num_rows))
+    
+    def known_prices(self, row):
+        '''
+        Returns the known price of each edge for the driver in the given row
+        
+        '''
+        #unobserved edges have the default price until the next broadcast
+        if self._row_versions[row] == self._price_version:
+            prices = self._default_prices.copy()
+        else:
+            prices = self._shared_prices.copy()
+        
+        own = self._price_stamps[row] == self._price_version
+        prices[self._columns[row][own]] = self._prices[row][own]
+        
+        return prices
+    
+    def known_price(self, row, column):
+        '''
+        Returns the known price of one edge for the driver in the given row
+        
+        '''
+        position = self._position(row, column)
+        
+        if position is not None:
+            stamp = self._price_stamps[row][position]
+        else:
+            stamp = self._row_versions[row]
+        
+        if stamp != self._price_version:
+            return self._shared_prices[column]
+        
+        return self._prices[row][position] if position is not None else self._default_prices[column]
+    
+    def set_prices(self, rows, columns, prices):
+        '''
+        Stores the prices known by drivers. rows may be a single row, 
+        or a column of rows (e.g. rows[:, numpy.newaxis]) with one line
+        of prices for each row. Prices of unobserved edges that are equal 
+        to the ones already known (e.g. when loading a whole knowledge base)
+        are not stored
+        
+        '''
+        for row, columns, prices in self._row_values(rows, columns, prices):
+            if self._row_versions[row] == self._price_version:
+                known = self._default_prices
+            else:
+                known = self._shared_prices
+            
+            columns, prices = self._changed(row, columns, prices, known)
+            positions = self._observe(row, columns)
+            self._prices[row][positions] = prices
+            self._price_stamps[row][positions] = self._price_version
+    
+    def price_rows(self, rows):
+        '''
+        Returns the (len(rows) x edges) matrix of prices known by the 
+        drivers in the given rows
+        
+        '''
+        return numpy.array([self.known_prices(row) for row in rows], self._dtype).reshape(
+            len(rows), len(self._compiled)
+        )
+    
+    def known_travel_times(self, row):
+        '''
+        Returns the known travel time of each edge for the driver in the given row
+        
+        '''
+        travel_times = self._free_flow_tt.copy()
+        travel_times[self._columns[row]] = self._travel_times[row]
+        
+        return travel_times
+    
+    def known_travel_time(self, row, column):
+        '''
+        Returns the known travel time of one edge for the driver in the given row
+        
+        '''
+        position = self._position(row, column)
+        
+        if position is None:
+            return self._free_flow_tt[column]
+        
+        return self._travel_times[row][position]
+    
+    def set_travel_times(self, rows, columns, travel_times):
+        '''
+        Stores the travel times known by drivers (see set_prices)
+        
+        '''
+        for row, columns, travel_times in self._row_values(rows, columns, travel_times):
+            columns, travel_times = self._changed(row, columns, travel_times, self._free_flow_tt)
+            positions = self._observe(row, columns)
+            self._travel_times[row][positions] = travel_times
+    
+    def travel_times_at(self, rows, columns):
+        '''
+        Returns the known travel times at the given (row, column) pairs
+        
+        '''
+        rows = numpy.asarray(rows)
+        columns = numpy.asarray(columns)
+        travel_times = self._free_flow_tt[columns]
+        
+        #pairs are grouped by row, so that each row is searched once
+        order = numpy.argsort(rows, kind='mergesort')
+        bounds = numpy.flatnonzero(numpy.diff(rows[order])) + 1
+        
+        for group in numpy.split(order, bounds):
+            if len(group) == 0:
+                continue
+            
+            row = rows[group[0]]
+            row_columns = self._columns[row]
+            
+            positions = numpy.searchsorted(row_columns, columns[group])
+            found = positions < len(row_columns)
+            found[found] = row_columns[positions[found]] == columns[group][found]
+            
+            travel_times[group[found]] = self._travel_times[row][positions[found]]
+        
+        return travel_times
+    
+    def travel_time_rows(self, rows):
+        '''
+        Returns the (len(rows) x edges) matrix of travel times known by 
+        the drivers in the given rows
+        
+        '''
+        return numpy.array([self.known_travel_times(row) for row in rows], self._dtype).reshape(
+            len(rows), len(self._compiled)
+        )
+    
+    def arrays(self):
+        '''
+        Returns the sparse rows and the shared prices, to be saved 
+        (e.g. in a checkpoint) and restored later
+        
+        '''
+        return {
+            'columns': self._columns, 'prices': self._prices, 
+            'price_stamps': self._price_stamps, 'travel_times': self._travel_times,
+            'row_versions': self._row_versions, 'price_version': self._price_version,
+            'shared_prices': self._shared_prices
+        }
+    
+    def restore(self, arrays):
+        '''
+        Restores the sparse rows returned by arrays()
+        
+        '''
+        if len(arrays.get('row_versions', [])) != self._num_rows:
+            raise ValueError(
+                'Knowledge base has %d rows, expected %d' % 
+                (len(arrays.get('row_versions', [])), self._num_rows)
+            )
+        
+        self._columns = [a.copy() for a in arrays['columns']]
+        self._prices = [a.copy() for a in arrays['prices']]
+        self._price_stamps = [a.copy() for a in arrays['price_stamps']]
+        self._travel_times = [a.copy() for a in arrays['travel_times']]
+        self._row_versions = list(arrays['row_versions'])
+        self._price_version = arrays['price_version']
+        self._shared_prices = arrays['shared_prices']
+    
+    def reserve(self, num_drivers):
+        '''
+        Rows take no room until their drivers observe edges
+        
+        '''
+        pass
+    
+    def allocate_row(self, prc_init=None, tt_init=None):
+        '''
+        Allocates the row of a new driver. Edges whose initial values 
+        differ from the default ones are stored as observed
+        
+        :param prc_init: price initialization function (receives the edge ID)
+        :type prc_init: function
+        :param tt_init: travel time initialization function (receives the edge ID)
+        :type tt_init: function
+        :return: the index of the row
+        :rtype: int
+        
+        '''
+        row = self.allocate_rows(1)[0]
+        
+        if prc_init is not None:
+            prices = numpy.array([prc_init(eid) for eid in self._compiled.ids], self._dtype)
+            changed = numpy.flatnonzero(prices != self._default_prices)
+            self.set_prices(row, changed, prices[changed])
+            
+        if tt_init is not None:
+            travel_times = numpy.array([tt_init(eid) for eid in self._compiled.ids], self._dtype)
+            changed = numpy.flatnonzero(travel_times != self._free_flow_tt)
+            self.set_travel_times(row, changed, travel_times[changed])
+        
+        return row
+    
+    def allocate_rows(self, num_drivers):
+        '''
+        Allocates the rows of many new drivers at once, with no observed edges
+        
+        :param num_drivers: the number of rows to be allocated
+        :type num_drivers: int
+        :return: the indices of the rows
+        :rtype: list
+        
+        '''
+        first = self._num_rows
+        self._num_rows += num_drivers
+        
+        empty_columns = numpy.empty(0, numpy.int32)
+        empty_values = numpy.empty(0, self._dtype)
+        empty_stamps = numpy.empty(0, numpy.int32)
+        
+        #empty arrays are shared by the rows until they observe edges
+        self._columns.extend([empty_columns] * num_drivers)
+        self._prices.extend([empty_values] * num_drivers)
+        self._price_stamps.extend([empty_stamps] * num_drivers)
+        self._travel_times.extend([empty_values] * num_drivers)
+        self._row_versions.extend([self._price_version] * num_drivers)
+        
+        return range(first, self._num_rows)
+    
+    def _position(self, row, column):
+        '''
+        Returns the position of the column in the observed edges of 
+        the row (None if the edge was not observed)
+        
+        '''
+        columns = self._columns[row]
+        position = numpy.searchsorted(columns, column)
+        
+        if position < len(columns) and columns[position] == column:
+            return position
+        return None
+    
+    def _row_values(self, rows, columns, values):
+        '''
+        Splits the values to be stored into (row, columns, values) of each row.
+        Repeated columns (e.g. of looping routes) keep their last value, as 
+        in the dense knowledge base
+        
+        '''
+        rows = numpy.ravel(rows)
+        columns = numpy.atleast_1d(columns)
+        values = numpy.broadcast_to(values, (len(rows), len(columns)))
+        
+        #positions of the last occurrence of each column
+        unique_columns, first_reversed = numpy.unique(columns[::-1], return_index=True)
+        last = len(columns) - 1 - first_reversed
+        columns = unique_columns
+        
+        return [(row, columns, values[i][last]) for i, row in enumerate(rows.tolist())]
+    
+    def _changed(self, row, columns, values, known):
+        '''
+        Discards the values of unobserved edges that are equal to 
+        the known ones (indexed by column), which need not be stored
+        
+        :return: the columns and values to be stored
+        :rtype: tuple(numpy.ndarray, numpy.ndarray)
+        
+        '''
+        values = numpy.asarray(values, self._dtype)
+        
+        row_columns = self._columns[row]
+        positions = numpy.searchsorted(row_columns, columns)
+        
+        observed = positions < len(row_columns)
+        observed[observed] = row_columns[positions[observed]] == columns[observed]
+        
+        keep = observed | (values != known[columns])
+        if keep.all():
+            return columns, values
+        
+        return columns[keep], values[keep]
+    
+    def _observe(self, row, columns):
+        '''
+        Makes the given columns observed edges of the row, with their default
+        values, and returns their positions in the row's arrays
+        
+        '''
+        row_columns = self._columns[row]
+        positions = numpy.searchsorted(row_columns, columns)
+        
+        found = positions < len(row_columns)
+        found[found] = row_columns[positions[found]] == columns[found]
+        
+        if found.all():
+            return positions
+        
+        #inserts the new columns, keeping the row sorted by column
+        new_columns = numpy.unique(columns[~found])
+        insert_at = numpy.searchsorted(row_columns, new_columns)
+        
+        self._columns[row] = numpy.insert(row_columns, insert_at, new_columns).astype(numpy.int32)
+        self._prices[row] = numpy.insert(self._prices[row], insert_at, self._default_prices[new_columns])
+        self._price_stamps[row] = numpy.insert(self._price_stamps[row], insert_at, self._row_versions[row])
+        self._travel_times[row] = numpy.insert(self._travel_times[row], insert_at, self._free_flow_tt[new_columns])
+        
+        return numpy.searchsorted(self._columns[row], columns)
+    
+
 class Driver(object):
     '''
     Represents a driver
@@ -353,13 +1484,15 @@ class Driver(object):
     DEPART_POS = 5.10 #in this position, vehicle starts in edge's beginning
     NOT_ARRIVED = -1
     NOT_DEPARTED = -1
+    ROUTE_NOT_GIVEN = object() #prepare_next_trip calculates the route
 
     _route = []
     
     _trip_number = -1
 
     def __init__(self, drv_id, road_network, origin, destination, depart=0,
-                 preference=1, prc_init=None, tt_init=None):
+                 preference=1, prc_init=None, tt_init=None, knowledge_base=None, 
+                 kb_row=None):
         '''
         Initializes properties and the knowledge bases
         
@@ -379,6 +1512,10 @@ class Driver(object):
         :type prc_init: function
         :param tt_init: driver's travel time initialization function
         :type tt_init: function
+        :param knowledge_base: knowledge base shared with other drivers (a private one is created if None)
+        :type knowledge_base: KnowledgeBase
+        :param kb_row: the row already allocated to the driver in knowledge_base (allocated if None)
+        :type kb_row: int
         
         '''
         self._driver_id = drv_id
@@ -390,8 +1527,6 @@ class Driver(object):
         self._trip_expenses = 0 #credits spent in one trip
         self._total_expenses = 0 #credits spent in all trips
         
-        self._knownprices = {}
-        self._knownTT = {}
        
         self._length_of_traversed_edges = 0
         self._last_timestep_edge_id = None
@@ -407,23 +1542,11 @@ class Driver(object):
             raise ValueError('Driver\'s preference must be on the interval [0:1]')
         self._preference = preference
         
-        #uses default price initialization if none was provided
-        for edge in self._road_network.getEdges():
-            #initializes known prices and travel times. 
-            #uses default initialization if no init function was given
-            
-            if prc_init is not None:
-                self._knownprices[edge.getID()] = prc_init(edge.getID())
-            else:
-                self._knownprices[edge.getID()] = 50 #half of max price
-                
-            if tt_init is not None:
-                self._knownTT[edge.getID()] = tt_init(edge.getID())
-            else:
-                self._knownTT[edge.getID()] = float(edge.getLength()) / edge.getSpeed() 
-                #initializes with free-flow travel time 
-                #casts first term to float to prevent integer division
-            
+        #initializes known prices and travel times in a row of the knowledge base
+        if knowledge_base is None:
+            knowledge_base = KnowledgeBase(road_network, 1)
+        self._kb = knowledge_base
+        self._kb_row = kb_row if kb_row is not None else knowledge_base.allocate_row(prc_init, tt_init)
         
     @property
     def driver_id(self):
@@ -441,6 +1564,14 @@ class Driver(object):
     def preference(self):
         return self._preference
     
+    @property
+    def knowledge_base(self):
+        return self._kb
+    
+    @property
+    def kb_row(self):
+        return self._kb_row
+    
     @property
     def route(self):
         return self._route
@@ -557,41 +1688,72 @@ class Driver(object):
         '''
         return self._current_edge_id != self._last_timestep_edge_id
     
-    def on_depart(self):
+    def _edge_length(self, edge_id):
+        '''
+        Returns the length of the given edge, taken from the road network.
+        The length of internal edges (not in the road network) is 
+        queried via TraCI
+        
+        '''
+        try:
+            index = self._kb.index_of(edge_id)
+        except KeyError:
+            return traci.lane.getLength(edge_id + '_0')
+        
+        return self._kb.compiled_net.lengths[index]
+    
+    def on_depart(self, current_time=None):
         '''
         Action to be performed when vehicle enters the simulation
         
+        :param current_time: the current simulation time (queried via TraCI if None)
+        :type current_time: int
+        
         '''
-        self._time_when_departed = traci.simulation.getCurrentTime()
+        if current_time is None:
+            current_time = traci.simulation.getCurrentTime()
+            
+        self._time_when_departed = current_time
         traci.vehicle.setColor(self.driver_id, [255, 0, int(255 * self.preference), 0])
         #print '%s: departed' % self._driver_id
         
         
-    def on_arrive(self):
+    def on_arrive(self, current_time=None):
         '''
         Action to be performed when driver finishes its trip. Updates traversed
         distance, travel time and flags vehicle with trip finished
         
+        :param current_time: the current simulation time (queried via TraCI if None)
+        :type current_time: int
+        
         '''
+        if current_time is None:
+            current_time = traci.simulation.getCurrentTime()
+            
         self._arrived = True
-        self._time_when_arrived = traci.simulation.getCurrentTime()
+        self._time_when_arrived = current_time
         self._current_edge_id = None
         
         #updates known travel time of last edge
-        self._time_spent_on_last_edge = traci.simulation.getCurrentTime() - self._entry_time 
+        self._time_spent_on_last_edge = current_time - self._entry_time 
         
         #updates traversed distance and knowledge base if last edge is valid (avoids errors at departure)
-        self._length_of_traversed_edges += traci.lane.getLength(self._last_timestep_edge_id + '_0')
+        self._length_of_traversed_edges += self._edge_length(self._last_timestep_edge_id)
             
         self.set_known_travel_time(self._last_timestep_edge_id, 
                                        self._time_spent_on_last_edge / 1000)
          
         #print '%s: arrived' % self._driver_id
         
-    def on_timestep(self):
+    def on_timestep(self, road_id=None, current_time=None):
         '''
         Must be called every timestep. Updates driver status.
         
+        :param road_id: the edge of the vehicle (e.g. from a subscription), queried via TraCI if None
+        :type road_id: str
+        :param current_time: the current simulation time (queried via TraCI if None)
+        :type current_time: int
+        
         '''
         
         #updates the edge occupied by the vehicle in last timestep
@@ -605,21 +1767,26 @@ class Driver(object):
             print 'ARRIVED!', traci.vehicle.getRoadID(self.driver_id)
         
         #updates edge of vehicle in the current timestep
-        self._current_edge_id = traci.vehicle.getRoadID(self.driver_id)
+        if road_id is None:
+            road_id = traci.vehicle.getRoadID(self.driver_id)
+        self._current_edge_id = road_id
         
         
         #check if vehicle has changed its edge...
         if self.has_changed_link():# self._current_edge_id != self._last_timestep_edge_id:
                 
+            if current_time is None:
+                current_time = traci.simulation.getCurrentTime()
+                
             #calculates travel time spent on last edge
-            self._time_spent_on_last_edge = traci.simulation.getCurrentTime() - self._entry_time
+            self._time_spent_on_last_edge = current_time - self._entry_time
             
             #stores entry time in curr. edge
-            self._entry_time = traci.simulation.getCurrentTime()
+            self._entry_time = current_time
             
             #updates traversed distance and knowledge base if last edge is valid (avoids errors at departure)
             if self._last_timestep_edge_id is not None:
-                self._length_of_traversed_edges += traci.lane.getLength(self._last_timestep_edge_id + '_0')
+                self._length_of_traversed_edges += self._edge_length(self._last_timestep_edge_id)
                 
                 self.set_known_travel_time(self._last_timestep_edge_id, 
                                            self._time_spent_on_last_edge / 1000)
@@ -640,8 +1807,8 @@ class Driver(object):
         
         """
         
-        #if is string, assumes that it contains the ID and returns it
-        if isinstance(edge_or_id, str):
+        #if is string (sumolib IDs are unicode), assumes that it contains the ID and returns it
+        if isinstance(edge_or_id, basestring):
             return edge_or_id
         
         #else, assumes that it is an Edge and returns the ID
@@ -656,7 +1823,7 @@ class Driver(object):
         :rtype: int
         
         '''
-        return self._knownprices[self.get_edge_ID(edge)]
+        return int(self._kb.known_price(self._kb_row, self._kb.index_of(self.get_edge_ID(edge))))
     
     def known_travel_time(self, edge):
         '''
@@ -667,7 +1834,7 @@ class Driver(object):
         :rtype: float
         
         '''
-        return self._knownTT[self.get_edge_ID(edge)]
+        return float(self._kb.known_travel_time(self._kb_row, self._kb.index_of(self.get_edge_ID(edge))))
     
     def norm_known_travel_time(self, edge, factor=100):
         '''
@@ -684,7 +1851,7 @@ class Driver(object):
         
         max_time = (3.0 * edg.getLength()) / edg.getSpeed()
             
-        return factor * self._knownTT[eid] / max_time
+        return factor * self.known_travel_time(eid) / max_time
     
     def set_known_travel_time(self, edge_or_id, travel_time):
         '''
@@ -698,7 +1865,7 @@ class Driver(object):
         
         '''
         
-        self._knownTT[self.get_edge_ID(edge_or_id)] = float(travel_time)
+        self._kb.set_travel_times(self._kb_row, self._kb.index_of(self.get_edge_ID(edge_or_id)), float(travel_time))
         return self
     
     
@@ -713,7 +1880,7 @@ class Driver(object):
         :rtype: Driver
         
         '''
-        self._knownprices[self.get_edge_ID(edge_or_id)] = int(price)
+        self._kb.set_prices(self._kb_row, self._kb.index_of(self.get_edge_ID(edge_or_id)), int(price))
         return self
         
     def edge_cost(self, edge):
@@ -730,6 +1897,24 @@ class Driver(object):
         return self._preference * self.norm_known_travel_time(edge) +\
                (1 - self._preference) * self.known_price(edge)
     
+    def cost_vector(self, factor=100):
+        '''
+        Returns the costs for traversing all edges of the road network,
+        computed as in edge_cost, in a single array indexed by the edge 
+        indices of the compiled road network
+        :param factor: the factor that scales normalized travel times
+        :type factor: int
+        :return: the costs of all edges
+        :rtype: numpy.ndarray
+        
+        '''
+        #rows are converted to float to compute the same costs of edge_cost
+        known_tt = self._kb.known_travel_times(self._kb_row).astype(float)
+        known_prices = self._kb.known_prices(self._kb_row).astype(float)
+        
+        return self._preference * (factor * known_tt / max_travel_times(self._kb.compiled_net)) +\
+               (1 - self._preference) * known_prices
+    
     def reset(self):
         '''
         Resets driver status data.
@@ -750,23 +1935,46 @@ class Driver(object):
         
         self._trip_expenses = 0    
     
-    def prepare_next_trip(self, depart_offset=0):
+    def calculate_route(self):
+        '''
+        Calculates the least-cost route from origin to destination 
+        according to the driver's costs
+        :return: the IDs of the edges in the route, None if the destination is unreachable
+        :rtype: list
+        
+        '''
+        the_route = dijkstra(self._road_network,
+                             self._origin, 
+                             self._destination,
+                             self.cost_vector())
+        if the_route is None:
+            return None
+        return [edg.getID().encode('utf-8') for edg in the_route]
+    
+    def prepare_next_trip(self, depart_offset=0, route=ROUTE_NOT_GIVEN):
         '''
         Increments the trip counter, calculates a new route and
         registers it via traci
         :param depart_offset: offset to add in departure time
         :type depart_offset: int
+        :param route: the IDs of the edges in the route, if already calculated (None if unreachable)
+        :type route: list
         :return: this driver (self)
         :rtype: Driver
         
         '''
         
+        if route is self.ROUTE_NOT_GIVEN:
+            route = self.calculate_route()
+        
+        if route is None:
+            raise ValueError(
+                'Driver %s: destination %s is not reachable from origin %s' % 
+                (self._driver_id, self._destination.getID(), self._origin.getID())
+            )
+        
         self._trip_number += 1
-        the_route = dijkstra(self._road_network,
-                             self._origin, 
-                             self._destination,
-                             lambda edge: self.edge_cost(edge))
-        self._route = [edg.getID().encode('utf-8') for edg in the_route]
+        self._route = route
         trip_ID = self._driver_id #+ '_' + str(self._trip_number)
         traci.route.add(trip_ID, self._route)
         #traci.vehicle.setRoute(d.getId(), edges)
@@ -5,10 +5,15 @@ road pricing experiment
 '''
 
 import drivers
+from search import PathCache
+import routing
+import routeinfo
+import checkpoint
 from auxiliaryload import DynamicLoadController
 import sumolib
 import netmanagement
 import traci
+import traci.constants as tc
 #from roadpricing.drivers import KBLoader, KBSaver
 from statistics.statswriter import StatsWriter
 
@@ -37,11 +42,15 @@ class Experiment(object):
                  initial_prc_file, initial_tt_file, ql_params,
                  num_iterations, start_iteration, broadcast_prices, time_limit, 
                  sumo_port, client_port, 
-                 stats_port, gui, summary_prefix = None, sumopath = None):
+                 stats_port, gui, summary_prefix = None, sumopath = None,
+                 route_workers = 1, persistent_sumo = False, 
+                 save_checkpoints = True, resume = False, binary_stats = False,
+                 departure_lookahead = 100, sparse_kb = False, online_payment = False):
         '''
         Initializes the experiment class, parsing the input files.
         If initial prices or travel times are to be loaded into drivers, BOTH 
-        initial_prc_file and initial_tt_file must be provided
+        initial_prc_file and initial_tt_file must be provided, unless 
+        initial_prc_file is a binary knowledge base snapshot
                  
         :param drv_file: path to the file containing the drivers to be loaded
         :type drv_file: string
@@ -71,6 +80,22 @@ class Experiment(object):
         :type stats_port: int
         :param gui: call SUMO with the graphical user interface?
         :type gui: bool
+        :param route_workers: number of processes that plan the routes (1 plans in this process) 
+        :type route_workers: int
+        :param persistent_sumo: keep a single SUMO instance, reloading it at each iteration?
+        :type persistent_sumo: bool
+        :param save_checkpoints: save the state of the experiment after each iteration?
+        :type save_checkpoints: bool
+        :param resume: resume from the checkpoint in output_path (if it exists)?
+        :type resume: bool
+        :param binary_stats: also save the statistics of each iteration in .npy files?
+        :type binary_stats: bool
+        :param departure_lookahead: drivers are loaded this number of timesteps before departing
+        :type departure_lookahead: int
+        :param sparse_kb: store only the edges observed by each driver in the knowledge base?
+        :type sparse_kb: bool
+        :param online_payment: drivers pay for each link when entering it, tracked via position subscriptions?
+        :type online_payment: bool
         
         '''
         self._network_file = road_net_file
@@ -83,6 +108,7 @@ class Experiment(object):
         self._time_limit = time_limit
         self._aux_drv_num = aux_drv_num
         self._broadcast_prices = broadcast_prices
+        self._online_payment = online_payment
         
         self._result_prefix = result_prefix
         self._output_path = output_path
@@ -100,30 +126,94 @@ class Experiment(object):
         self._sumopath = sumopath
         self._summary_prefix = summary_prefix
         
+        self._persistent_sumo = persistent_sumo
+        self._sumo_instance = None
+        self._loaded_iteration = None #iteration already loaded in persistent SUMO
+        
         #self._edge_data = edgedata.EdgeData(self._road_network)
         
         #parses the drivers file and stores drivers on the list
+        #their known prices and travel times are stored in a shared knowledge base
         print 'Parsing drivers file...'
-        self._drivers = drivers.parse_drivers(drv_file, self._road_network)
+        kb_class = drivers.SparseKnowledgeBase if sparse_kb else drivers.KnowledgeBase
+        self._knowledge_base = kb_class(self._road_network)
+        drivers_table = drivers.read_drivers_table(drv_file, self._knowledge_base.compiled_net)
+        self._drivers = drivers.create_drivers(
+            drivers_table, self._road_network, self._knowledge_base
+        )
         
+        #initial prices and travel times come from text files or a binary snapshot
+        if initial_prc_file is not None:
+            print 'Loading initial knowledge base...'
+            drivers.KBLoader(initial_prc_file, initial_tt_file).load(self._drivers)
+        
+        #restores the state saved after the last finished iteration
+        self._save_checkpoints = save_checkpoints
+        self._checkpoint_file = os.path.join(self._output_path, checkpoint.CHECKPOINT_FILE)
+        self._resumed = False
+        
+        if resume:
+            if os.path.exists(self._checkpoint_file):
+                last_iteration = checkpoint.load_checkpoint(
+                    self._checkpoint_file, self._knowledge_base, 
+                    self._network_manager.link_states, self._drivers
+                )
+                self._start_iteration = last_iteration + 1
+                self._resumed = True
+                print 'Resuming experiment from iteration', self._start_iteration
+            else:
+                print 'No checkpoint found in %s, starting from iteration %d' % \
+                    (self._output_path, self._start_iteration)
+        
+        #calculates the routes of drivers departing in the same time window at once
+        #or, with many workers, plans the routes of all drivers before each iteration
+        if route_workers > 1:
+            self._router = routing.ParallelRoutePlanner(self._road_network, route_workers)
+        else:
+            self._router = routing.BatchRouter(self._road_network)
+        
+        #releases the drivers to be loaded in the order of their departure times
+        self._scheduler = drivers.DepartureScheduler(
+            self._drivers, departure_lookahead, drivers_table.departure_order
+        )
+        
+        #routes of the auxiliary drivers are kept across iterations
+        self._aux_paths = PathCache(self._road_network)
+        
+        #statistics of the drivers' trips, calculated from the route information files
+        self._trip_stats = drivers.TripStatistics(self._drivers)
         
         if self._result_prefix is not None:
             o = os.path.join(self._output_path, self._result_prefix)
+            
+            #stats of iterations after the checkpoint (written before a crash) are discarded
+            keep = self._start_iteration - 1 if self._resumed else None
+            
             #link manager drv_stats writer is 'special', it is about the edges and
             #writes before iterations too, so it is created separately
-            self._lm_stats = StatsWriter(o + '_edg_prc.csv')
+            self._lm_stats = StatsWriter(o + '_edg_prc.csv', binary=binary_stats, keep_until=keep)
             
+            #driver stats are read from the trip statistics, once they are calculated
+            trip_stats = self._trip_stats
             self.drv_stats = [
-                {'attr': 'norm_travel_time', 'writer': StatsWriter(o + '_drv_tt.csv'), 'items': self._drivers},
-                {'attr': 'trip_expenses', 'writer': StatsWriter(o + '_drv_xps.csv'), 'items': self._drivers},
-                {'attr': 'perceived_trip_cost', 'writer': StatsWriter(o + '_drv_z.csv'), 'items': self._drivers},
+                {'attr': 'norm_travel_time', 'writer': StatsWriter(o + '_drv_tt.csv', binary=binary_stats, keep_until=keep), 
+                 'items': self._drivers, 'values': lambda: trip_stats.values('norm_travel_time')},
+                {'attr': 'trip_expenses', 'writer': StatsWriter(o + '_drv_xps.csv', binary=binary_stats, keep_until=keep), 
+                 'items': self._drivers, 'values': lambda: trip_stats.values('trip_expenses')},
+                {'attr': 'perceived_trip_cost', 'writer': StatsWriter(o + '_drv_z.csv', binary=binary_stats, keep_until=keep), 
+                 'items': self._drivers, 'values': lambda: trip_stats.values('perceived_trip_cost')},
                 #{'attr': 'revenue', 'writer': StatsWriter(o + '_hops.csv'), 'items': self._network_manager.list_of_managers()},
             ]
             
+            #edge stats are read at once from the arrays of link states ('values')
+            link_states = self._network_manager.link_states
             self.edg_stats = [
-                {'attr': 'occupancy', 'writer': StatsWriter(o + '_edg_occ.csv'), 'items': self._network_manager.list_of_managers},
-                {'attr': 'price', 'writer': self._lm_stats, 'items': self._network_manager.list_of_managers},
-                {'attr': 'total_users', 'writer': StatsWriter(o + '_edg_lus.csv'), 'items': self._network_manager.list_of_managers}
+                {'attr': 'occupancy', 'writer': StatsWriter(o + '_edg_occ.csv', binary=binary_stats, keep_until=keep), 
+                 'items': self._network_manager.list_of_managers, 'values': lambda: link_states.average_occupancy},
+                {'attr': 'price', 'writer': self._lm_stats, 
+                 'items': self._network_manager.list_of_managers, 'values': self._network_manager.current_prices},
+                {'attr': 'total_users', 'writer': StatsWriter(o + '_edg_lus.csv', binary=binary_stats, keep_until=keep), 
+                 'items': self._network_manager.list_of_managers, 'values': lambda: link_states.total_users}
             ]
         else:
             self.drv_stats = []
@@ -142,20 +232,19 @@ class Experiment(object):
                              ---- statistics utilitary 
         
         '''
+        #persistent SUMO loads the iteration when the previous one is closed
+        if self._loaded_iteration == iter_number:
+            print 'Using SUMO instance loaded for iteration', iter_number
+            return
+        
         #builds the string to be used to call SUMO    
         sumoExec = 'sumo-gui' if self._gui else 'sumo'
             
         if self._sumopath is not None:
             sumoExec = self._sumopath + sumoExec
         
-        sumoCmd = '%s -n %s --remote-port %d' % \
-            (sumoExec, self._network_file, self._sumo_port)
-        
-        sumoCmd += ' --vehroute-output %s --vehroute-output.exit-times' %\
-        (os.path.join(self._output_path, 'routeinfo_%d.xml' % (iter_number) ))
-        
-        if self._summary_prefix is not None:
-            sumoCmd += ' --summary-output %s%d.xml' % (self._summary_prefix, iter_number)
+        sumoCmd = '%s --remote-port %d %s' % \
+            (sumoExec, self._sumo_port, ' '.join(self.sumo_args(iter_number)))
         
 #        self._tracihub_cmd = 'tracihub %d %d %d' % (sumo_port, client_port, stats_port)
         
@@ -167,6 +256,43 @@ class Experiment(object):
         #connects road pricing client
         traci.init(self._sumo_port)
         
+    def sumo_args(self, iter_number):
+        '''
+        Returns the list of arguments that define the simulation of
+        an iteration in SUMO: road network and outputs
+        
+        '''
+        args = ['-n', self._network_file]
+        
+        args += ['--vehroute-output', 
+            os.path.join(self._output_path, 'routeinfo_%d.xml' % (iter_number)),
+            '--vehroute-output.exit-times'
+        ]
+        
+        if self._summary_prefix is not None:
+            args += ['--summary-output', '%s%d.xml' % (self._summary_prefix, iter_number)]
+            
+        return args
+    
+    def close_connections(self, iter_number):
+        '''
+        Finishes the simulation of an iteration. Persistent SUMO is not 
+        terminated: it loads the simulation of the next iteration, which 
+        also closes (i.e. completes) the outputs of this iteration.
+        Otherwise, closes the connection and waits for SUMO to terminate
+        
+        '''
+        if self._persistent_sumo and iter_number < self._num_iterations:
+            print 'Simulation finished. Loading the next iteration in SUMO...'
+            traci.load(self.sumo_args(iter_number + 1))
+            self._loaded_iteration = iter_number + 1
+            return
+        
+        print 'Simulation finished. Closing connection and waiting for SUMO to terminate...'
+        traci.close()
+        self._sumo_instance.wait()
+        self._loaded_iteration = None
+        
     def iterations(self):
         '''
         Runs the iterations. Before each iteration, SUMO, tracihub and
@@ -186,9 +312,12 @@ class Experiment(object):
                 stats['writer'].writeLine('x', [e.managed_link() for e in self._network_manager.list_of_managers], 'getID')
             #writes the ID of edges and their initial price     
             self._lm_stats.writeLine('0', self._network_manager.list_of_managers, 'price')
+            
+            self.flush_stats()
         
-        if self._start_iteration > 1:
-            print 'Loading data %d previous iteration(s) to resume experiment.' % self._start_iteration -1
+        #without a checkpoint, previous iterations are replayed from their route information
+        if self._start_iteration > 1 and not self._resumed:
+            print 'Loading data %d previous iteration(s) to resume experiment.' % (self._start_iteration -1)
             for it in range(1, self._start_iteration):
                 print 'Calculating road users...'
                 self._network_manager.calculate_link_users(
@@ -198,26 +327,26 @@ class Experiment(object):
                 #    print '%s: %s %s' % (d.driver_id, d.route, [self._network_manager.manager_of_link(e).price for e in d.route] )
                 
                 print 'Saving statistics...'
-                for s in self.drv_stats + self.edg_stats:
-                    s['writer'].writeLine(it+1, s['items'], s['attr'])
+                self.write_stats(it+1)
                     
     #            print 'Outputting edge data...'
     #            self._edge_data.write_output(os.path.join(self._output_path, 'edges_%d.xml' % (it+1)))
                 
                 print 'Performing price adjustment...'
                 #performs price adjustment
-                for mgr in self._network_manager.list_of_managers:
-                    mgr.commute_finished_action()
+                self._network_manager.commute_finished_action()
             
         print 'Starting iterations...'
         
         for it in range(self._start_iteration -1, self._num_iterations):
             print 'Preparing iteration', (it+1)
             self.open_connections(it + 1)
+            self._network_manager.subscribe_occupancy()
             
             iteration = Iteration(self._drivers, self._network_manager)
             aux_demand_ctrl = odpopulator.odloader.UniformLoader(
-                 self._road_network, None, self._aux_drv_num, 5, 'aux'
+                 self._road_network, None, self._aux_drv_num, 5, 'aux',
+                 path_cache=self._aux_paths
             )
             
             if self._warm_up_time > 0: 
@@ -231,15 +360,18 @@ class Experiment(object):
             print 'Preparing for trips...'
             iteration.prepare_for_trip()
             
-            garage = self._drivers[:] #copies the list of drivers
+            self._scheduler.reset()
             
             if self._broadcast_prices:
                 print 'Broadcasting prices...'
-                for d in self._drivers:
-                    for lm in self._network_manager.list_of_managers:
-                        d.set_known_price(lm.managed_link(), lm.price)
+                #managers are in the same order of the knowledge base columns
+                #the price vector is published once, not copied into each driver
+                self._knowledge_base.broadcast_prices(self._network_manager.current_prices())
                     
             
+            print 'Planning routes...'
+            self._router.plan(self._drivers)
+            
             print 'Simulating...'
             arrived = 0
             timestep = 0
@@ -251,67 +383,111 @@ class Experiment(object):
                     print 'Time limit reached.'
                     break
                 
-                #loads cars that are scheduled to depart in up to 100 timesteps
-                while len(garage) > 0:
-                    if garage[0].depart_time < timestep + 100:
-                        garage[0].prepare_next_trip() #calc. route and loads car
-                        del garage[0] #removes from garage
-                    else:
-                        break #breaks when 1st car in list is not scheduled for launch in 100 ts.
+                #loads cars that are scheduled to depart in up to 'lookahead' timesteps
+                departing = self._scheduler.release(timestep)
+                
+                if len(departing) > 0:
+                    self._router.prepare_trips(departing) #calc. routes and loads cars
                     
                 traci.simulationStep()
                 #self._edge_data.timestep_action()
                 self._network_manager.timestep_action()
                 arrived += traci.simulation.getArrivedNumber()
                 
+                #tracks the drivers en route, who pay for the links they enter
+                if self._online_payment:
+                    iteration.timestep_action()
+                
                 timestep += 1
                 sys.stdout.write("\rIteration %d's timestep #%d took %5.3f ms" % (it+1, timestep, time() - start))
                 sys.stdout.flush()
                 
-                #iteration.timestep_action()
                 #aux_demand_ctrl.act()
-            print 'Simulation finished. Closing connection and waiting for SUMO to terminate...'
-            traci.close()
-            self._sumo_instance.wait()
+            self.close_connections(it + 1)
             
 #            for d in self._drivers:
 #                prices = [self._network_manager.manager_of_link(e).price for e in d.route]
 #                print '%s: %s Tot: %s' % (d.driver_id, d.route, sum(prices))
             
-            print 'Updating drivers knowledge base...'
-            drivers.update_kb(
-                self._drivers, 
-                self._network_manager, 
-                os.path.join(self._output_path, 'routeinfo_%d.xml' % (it+1))
-            )
-            
-            print 'Calculating road users...'
-            self._network_manager.calculate_link_users(
+            print 'Updating drivers knowledge base and calculating road users...'
+            self.process_route_info(
                 os.path.join(self._output_path, 'routeinfo_%d.xml' % (it+1))
             )
             #for d in self._drivers:
             #    print '%s: %s %s' % (d.driver_id, d.route, [self._network_manager.manager_of_link(e).price for e in d.route] )
             
             print 'Saving statistics...'
-            for s in self.drv_stats + self.edg_stats:
-                s['writer'].writeLine(it+1, s['items'], s['attr'])
+            self.write_stats(it+1)
                 
 #            print 'Outputting edge data...'
 #            self._edge_data.write_output(os.path.join(self._output_path, 'edges_%d.xml' % (it+1)))
             
             print 'Performing price adjustment...'
             #performs price adjustment
-            for mgr in self._network_manager.list_of_managers:
-                mgr.commute_finished_action()
+            self._network_manager.commute_finished_action()
+            
+            if self._save_checkpoints:
+                print 'Saving checkpoint...'
+                checkpoint.save_checkpoint(
+                    self._checkpoint_file, it + 1, self._knowledge_base, 
+                    self._network_manager.link_states, self._drivers
+                )
                 
             print 'Iteration %d finished.' % (it + 1)
         
         for stats in self.drv_stats + self.edg_stats:
             del(stats['writer'])
         
+        self._router.close()
+        
         print 'Experiment finished.'
             
             
+    def write_stats(self, iter_number):
+        '''
+        Writes the statistics of the given iteration and flushes the writers
+        
+        '''
+        for s in self.drv_stats + self.edg_stats:
+            values = s['values']() if 'values' in s else None
+            
+            #without values (e.g. trips not processed yet) items are queried
+            if values is not None:
+                s['writer'].writeValues(iter_number, values)
+            else:
+                s['writer'].writeLine(iter_number, s['items'], s['attr'])
+        
+        self.flush_stats()
+        
+    def flush_stats(self):
+        '''
+        Writes the buffered statistics into their files
+        
+        '''
+        for s in self.drv_stats + self.edg_stats:
+            s['writer'].flush()
+        
+    def process_route_info(self, route_info_file):
+        '''
+        Reads the route information file of an iteration once, updating 
+        the drivers' knowledge base, counting the users of each link 
+        and calculating the statistics of the drivers' trips
+        
+        '''
+        drivers_dict = dict((d.driver_id, d) for d in self._drivers)
+        prices = self._network_manager.current_prices()
+        trips = []
+        
+        for record in routeinfo.read_routes(route_info_file, self._network_manager.index_of_link):
+            driver = drivers_dict[record.vehicle_id]
+            #with online payment, drivers have already paid for their trips
+            drivers.update_driver_kb(driver, record, prices, not self._online_payment)
+            self._network_manager.add_link_users(record.edges)
+            trips.append((driver, record))
+            
+        self._trip_stats.update(trips)
+            
+            
 class Iteration(object):
     '''
     Manages one iteration, performing drivers initialization, 
@@ -326,6 +502,12 @@ class Iteration(object):
         '''
         self._drivers = drivers
         self._net_mgr = net_manager
+        
+        #drivers are tracked by the events of the simulation: only the 
+        #ones en route (departed and not arrived) are updated every timestep
+        self._drivers_by_id = dict((d.driver_id, d) for d in drivers)
+        self._en_route = set(d for d in drivers if d.departed and not d.arrived)
+        self._num_arrived = len([d for d in drivers if d.arrived])
     
     def prepare_for_trip(self, prc_file = None, tt_file = None):
         '''
@@ -338,26 +520,51 @@ class Iteration(object):
 
         for d in self._drivers:
             d.reset()
+            
+        self._en_route = set()
+        self._num_arrived = 0
         
-        for lm in self._net_mgr.list_of_managers:
-            lm.before_commute_action()
+        self._net_mgr.before_commute_action()
+    
+    @property
+    def drivers_en_route(self):
+        '''
+        Returns the set of drivers that departed and have not arrived yet
+        
+        '''
+        return self._en_route
     
     def timestep_action(self):
-        arrived_list = traci.simulation.getArrivedIDList()
-        departed_list = traci.simulation.getDepartedIDList()
+        arrived_ids = set(traci.simulation.getArrivedIDList())
+        current_time = traci.simulation.getCurrentTime()
         
-        for d in self._drivers:
-                
-            #checks if driver has departed
-            if not d.departed and d.driver_id in departed_list:
-                d.on_depart()
+        #checks which drivers have departed (other vehicles are ignored)
+        #and subscribes to the road of their vehicles
+        for vehicle_id in traci.simulation.getDepartedIDList():
+            d = self._drivers_by_id.get(vehicle_id)
+            
+            if d is not None and not d.departed:
+                d.on_depart(current_time)
+                traci.vehicle.subscribe(vehicle_id, [tc.VAR_ROAD_ID])
+                self._en_route.add(d)
+        
+        #SUMO discards the subscriptions of arrived vehicles
+        positions = traci.vehicle.getSubscriptionResults()
+        
+        for d in list(self._en_route):
+            
+            #checks if driver has arrived
+            if d.driver_id in arrived_ids:
+                d.on_arrive(current_time)
+                self._en_route.remove(d)
+                self._num_arrived += 1
+            
+            #drivers that have just departed have no subscription results yet
+            road_id = None
+            if d.driver_id in positions:
+                road_id = positions[d.driver_id][tc.VAR_ROAD_ID]
                 
-            if not d.arrived:
-                #checks if driver has arrived
-                if d.driver_id in arrived_list:
-                    d.on_arrive()
-                    
-                d.on_timestep()
+            d.on_timestep(road_id, current_time)
             
             '''
             If entered a new link, pay the credits and save the price of this link
@@ -374,9 +581,4 @@ class Iteration(object):
         (i.e. all drivers have arrived)
         '''
         
-        for d in self._drivers:
-            if not d.arrived:
-                return False
-            
-        return True    
-    
\ No newline at end of file
+        return self._num_arrived == len(self._drivers)
@@ -8,12 +8,145 @@ Created on Nov 17, 2012
 
 import math
 import random
+import numpy
 import traci
-import xml.etree.ElementTree as ET
+import traci.constants as tc
+import routeinfo
 
 def is_internal_edge(edge_id):
     return edge_id.find(':') == 0
 
+class LinkStates(object):
+    '''
+    Stores the state of many link managers in arrays, one position
+    per link manager
+    
+    '''
+    
+    #(name, type) of the arrays, subclasses may add their own fields
+    FIELDS = [
+        ('average_occupancy', float),
+        ('timestep', int),
+        ('price', int),
+        ('next_commute_price', int),
+        ('total_users', int),
+    ]
+    
+    def __init__(self, size):
+        '''
+        Initializes the arrays with the state of size link managers
+        
+        '''
+        self._size = size
+        for name, dtype in self.FIELDS:
+            setattr(self, name, numpy.zeros(size, dtype))
+        
+    def __len__(self):
+        return self._size
+    
+    def copy_slot(self, other, src_slot, dst_slot):
+        '''
+        Copies the state at a position of other states to a 
+        position of these states
+        
+        :param other: the states to copy from (must have the same fields)
+        :type other: LinkStates
+        :param src_slot: the position in other
+        :type src_slot: int
+        :param dst_slot: the position in these states
+        :type dst_slot: int
+        
+        '''
+        for name, dtype in self.FIELDS:
+            getattr(self, name)[dst_slot] = getattr(other, name)[src_slot]
+            
+    def arrays(self):
+        '''
+        Returns a dict {name: array} with all arrays of these states
+        
+        '''
+        return dict((name, getattr(self, name)) for name, dtype in self.FIELDS)
+    
+    def restore(self, arrays):
+        '''
+        Copies the values of the given arrays (as returned by 
+        arrays()) into these states
+        
+        '''
+        for name, values in arrays.iteritems():
+            getattr(self, name)[:] = values
+    
+class StateField(object):
+    '''
+    Attribute of a link manager that is stored in its LinkStates, 
+    at the position of the manager
+    
+    '''
+    
+    def __init__(self, field, cast):
+        '''
+        :param field: the name of the array in LinkStates
+        :type field: str
+        :param cast: converts array items to python values (e.g. int)
+        :type cast: type
+        
+        '''
+        self._field = field
+        self._cast = cast
+        
+    def __get__(self, manager, owner):
+        if manager is None:
+            return self
+        return self._cast(getattr(manager._states, self._field)[manager._slot])
+    
+    def __set__(self, manager, value):
+        getattr(manager._states, self._field)[manager._slot] = value
+    
+class OccupancyCollector(object):
+    '''
+    Collects the occupancy of the managed links via a single TraCI 
+    subscription and updates their average occupancies at once
+    
+    '''
+    
+    def __init__(self, link_states, edge_ids):
+        '''
+        Initializes the collector
+        
+        :param link_states: the states whose occupancies will be updated
+        :type link_states: LinkStates
+        :param edge_ids: the IDs of the links, in the same order of the states
+        :type edge_ids: list
+        
+        '''
+        self._states = link_states
+        self._edge_ids = [eid.encode('utf-8') for eid in edge_ids]
+        
+    def subscribe(self):
+        '''
+        Subscribes to the occupancy of all links. Must be called 
+        after each connection to SUMO
+        
+        '''
+        for eid in self._edge_ids:
+            traci.edge.subscribe(eid, [tc.LAST_STEP_OCCUPANCY])
+    
+    def collect(self):
+        '''
+        Fetches the occupancies of the last step and updates the 
+        running averages of all links 
+        
+        '''
+        results = traci.edge.getSubscriptionResults()
+        values = numpy.fromiter(
+            (results[eid][tc.LAST_STEP_OCCUPANCY] for eid in self._edge_ids),
+            float, len(self._edge_ids)
+        )
+        
+        states = self._states
+        states.average_occupancy += (values - states.average_occupancy) / (states.timestep + 1)
+        states.timestep += 1
+
 class NetworkManager(object):
     def __init__(self, road_network, link_mgr_class, parameters = None):
         '''
@@ -29,10 +162,16 @@ class NetworkManager(object):
         self._road_network = road_network
         self._managers = {}
         self._list_of_managers = []
+        self._slots = {}
+        
+        self._occupancy_collector = None
+        self._alt_start = None
         
         if type(link_mgr_class) == str:
             link_mgr_class = manager_classes[link_mgr_class]
             
+        self._link_mgr_class = link_mgr_class
+        self._states = link_mgr_class.STATES_CLASS(len(road_network.getEdges()))
         
         #creates a link manager for each edge
         for edg in self._road_network.getEdges():
@@ -41,13 +180,76 @@ class NetworkManager(object):
             if parameters:
                 manager.set_params(parameters)
 
+            #the state of the manager is stored in the arrays of the network manager
+            manager.bind_states(self._states, len(self._list_of_managers))
+            
             self._managers[edg] = manager
+            self._slots[edg.getID()] = len(self._list_of_managers)
             self._list_of_managers.append(manager)
+        
+        self._build_alternatives()
+        
+        #capacities are calculated once, the highest is used to initialize prices
+        self._capacities = numpy.array(
+            [mgr.link_capacity() for mgr in self._list_of_managers], int
+        )
+        self._max_capacity = max(self._capacities.tolist()) if len(self._capacities) > 0 else None
             
         #after creating all managers, initializes their prices
-        for mgr in self.list_of_managers:
-            mgr.initialize_price()
+        if self._vectorized('initialize_price'):
+            link_mgr_class.initialize_price_all(self)
+        else:
+            for mgr in self.list_of_managers:
+                mgr.initialize_price()
             
+    def _build_alternatives(self):
+        '''
+        Builds the index of the alternatives of all links, in CSR form: the
+        alternatives of the i-th manager are the managers at the positions
+        _alt_index[_alt_start[i]:_alt_start[i+1]]
+        
+        '''
+        alternatives = [
+            [alt._slot for alt in lm.find_alternative_managers()] 
+            for lm in self._list_of_managers
+        ]
+        
+        self._alt_counts = numpy.array([len(alts) for alts in alternatives], int)
+        self._alt_start = numpy.zeros(len(alternatives) + 1, int)
+        numpy.cumsum(self._alt_counts, out=self._alt_start[1:])
+        self._alt_index = numpy.array([i for alts in alternatives for i in alts], int)
+        
+        #the manager (row) of each entry of the index
+        self._alt_rows = numpy.repeat(numpy.arange(len(alternatives)), self._alt_counts)
+        
+    def alternatives_of(self, manager):
+        '''
+        Returns the managers of the alternatives of the given manager's link,
+        or None if they are not indexed by this network manager
+        
+        :param manager: the link manager
+        :type manager: LinkManager
+        :return: list with the managers of the alternatives
+        :rtype: list
+        
+        '''
+        if self._alt_start is None or manager._states is not self._states:
+            return None
+        
+        slot = manager._slot
+        return [
+            self._list_of_managers[i] 
+            for i in self._alt_index[self._alt_start[slot]:self._alt_start[slot + 1]]
+        ]
+        
+    def index_of_link(self, edge_id):
+        '''
+        Returns the position of the manager of the given 
+        link in list_of_managers
+        
+        '''
+        return self._slots[edge_id]
+        
     def manager_of_link(self, edge):
         '''
         Returns the link manager of the given edge
@@ -66,27 +268,173 @@ class NetworkManager(object):
     def list_of_managers(self):
         return self._list_of_managers
     
+    @property
+    def link_capacities(self):
+        '''
+        Returns an array with the capacity of each link, in the same 
+        order of list_of_managers
+        
+        '''
+        return self._capacities
+    
+    @property
+    def max_link_capacity(self):
+        '''
+        Returns the capacity of the link with the highest capacity
+        
+        '''
+        return self._max_capacity
+    
+    @property
+    def link_states(self):
+        '''
+        Returns the states of all link managers, whose arrays are 
+        indexed in the same order of list_of_managers
+        
+        '''
+        return self._states
+    
+    def subscribe_occupancy(self):
+        '''
+        Subscribes to the occupancy of all managed links. Must be called
+        after each connection to SUMO. From then on, timestep_action
+        collects the occupancy of all links at once instead of calling 
+        the timestep_action of each link manager
+        
+        '''
+        self._occupancy_collector = OccupancyCollector(
+            self._states, [lm.managed_link().getID() for lm in self._list_of_managers]
+        )
+        self._occupancy_collector.subscribe()
+    
     def timestep_action(self):
         '''
         Updates links status
         '''
+        if self._occupancy_collector is not None:
+            self._occupancy_collector.collect()
+            return
+        
         for lm in self._list_of_managers:
             lm.timestep_action()
+    
+    def _vectorized(self, action):
+        '''
+        Returns whether the given action of the link managers can be 
+        performed at once for all links, i.e. whether the class that 
+        defines the action also defines its vectorized version (action_all)
         
+        '''
+        cls = self._link_mgr_class
+        defined_in = lambda attr: [c for c in cls.__mro__ if attr in c.__dict__][0]
+        
+        return defined_in(action) is defined_in(action + '_all')
+    
+    def alternatives_average_occupancy(self):
+        '''
+        Returns an array with the average occupancy of the alternatives
+        of each link (see LinkManager.average_occ_of_alternatives)
+        
+        '''
+        occupancies = self._states.average_occupancy
+        
+        #sums the occupancies of the alternatives of each link
+        sums = numpy.bincount(
+            self._alt_rows, occupancies[self._alt_index], len(self._list_of_managers)
+        )
+        
+        #prevents division by zero
+        averages = numpy.empty(len(sums))
+        averages.fill(0.5)
+        
+        has_alt = self._alt_counts > 0
+        averages[has_alt] = sums[has_alt] / self._alt_counts[has_alt]
+        
+        return averages
+        
+    def alternatives_price_bounds(self):
+        '''
+        Returns two arrays with the highest and the lowest price of the 
+        alternatives of each link. A link without alternatives 
+        has its own price as bounds
         
-    def calculate_link_users(self, route_info_file):
         '''
-        Assumes that route_info_file is a clean .xml file
-        (without the <!-- --> stuff that SUMO generates)
+        prices = self._states.price
+        highest = prices.copy()
+        lowest = prices.copy()
+        
+        if len(self._alt_index) == 0:
+            return highest, lowest
+        
+        has_alt = self._alt_counts > 0
+        alt_prices = prices[self._alt_index]
+        
+        highest[has_alt] = numpy.maximum.reduceat(alt_prices, self._alt_start[:-1][has_alt])
+        lowest[has_alt] = numpy.minimum.reduceat(alt_prices, self._alt_start[:-1][has_alt])
+        
+        return highest, lowest
+        
+    def commute_finished_action(self):
+        '''
+        Performs the action of all link managers at the end of a 
+        commuting period. Links are updated at once if their managers 
+        implement the vectorized update, otherwise the action of 
+        each manager is called 
+        
+        '''
+        if len(self._list_of_managers) == 0:
+            return
+        
+        if self._vectorized('commute_finished_action'):
+            self._link_mgr_class.commute_finished_action_all(self)
+            return
+        
+        for lm in self._list_of_managers:
+            lm.commute_finished_action()
+            
+    def before_commute_action(self):
+        '''
+        Performs the action of all link managers before a 
+        commuting period (at once, if possible)
+        
+        '''
+        if len(self._list_of_managers) == 0:
+            return
+        
+        if self._vectorized('before_commute_action'):
+            self._link_mgr_class.before_commute_action_all(self)
+            return
         
+        for lm in self._list_of_managers:
+            lm.before_commute_action()
+        
+        
+    def calculate_link_users(self, route_info_file):
         '''
-        rtree = ET.parse(route_info_file)
+        Counts the users of each link in route_info_file (the 
+        comments SUMO generates before <routes> are skipped)
         
-        for vehicle in rtree.getroot():
-            edges = vehicle[0].get('edges').split(' ')
+        '''
+        for record in routeinfo.read_routes(route_info_file, self.index_of_link):
+            self.add_link_users(record.edges)
             
-            for e in edges:
-                self.manager_of_link(e).increment_users() 
+    def add_link_users(self, edge_indices):
+        '''
+        Increments the number of users of the given links
+        
+        :param edge_indices: the indices of the links used by a vehicle
+        :type edge_indices: list
+        
+        '''
+        numpy.add.at(self._states.total_users, edge_indices, 1)
+        
+    def current_prices(self):
+        '''
+        Returns the current price of each link (indexed as list_of_managers),
+        corrected to be within the max and min prices
+        
+        '''
+        return self._link_mgr_class.clip_prices(self._states)
         
     
 
@@ -99,6 +447,15 @@ class LinkManager(object):
     
     MAX_PRICE = 100
     MIN_PRICE = 0
+    
+    STATES_CLASS = LinkStates
+    
+    #the state of the manager is stored in its LinkStates
+    _price = StateField('price', int)
+    _next_commute_price = StateField('next_commute_price', int)
+    _average_occupancy = StateField('average_occupancy', float)
+    _timestep = StateField('timestep', int)
+    _total_users = StateField('total_users', int)
 
     def __init__(self, link, net_manager):
         '''
@@ -109,13 +466,31 @@ class LinkManager(object):
         :param net_manager: The network manager 
         :type net_manager: NetworkManager
         '''
+        #uses its own state until bound to the network manager's states
+        self._states = self.STATES_CLASS(1)
+        self._slot = 0
+        
         self._price = 0
         self._next_commute_price = 0
         self._link = link
         self._net_mgr = net_manager
-        self._average_occupancy = 0
-        self._timestep = 0
         self._total_users = 0
+        self._capacity = None #calculated on first request
+        
+    def bind_states(self, link_states, slot):
+        '''
+        Moves the state of this manager to a position of the given states
+        
+        :param link_states: the states shared with other managers
+        :type link_states: LinkStates
+        :param slot: the position of this manager in the states
+        :type slot: int
+        
+        '''
+        link_states.copy_slot(self._states, self._slot, slot)
+        
+        self._states = link_states
+        self._slot = slot
         
     def set_params(self, params):
         '''
@@ -130,16 +505,29 @@ class LinkManager(object):
         links
         
         '''
-        #finds the highest capacity manager
-        max_cap_mgr = max(
-                          self._net_mgr.list_of_managers, 
-                          key=lambda m: m.link_capacity()
-                          )
+        #the highest capacity is calculated by the network manager
+        max_capacity = self._net_mgr.max_link_capacity
         
         self._price = int(self.link_capacity() * 
-                          self.MAX_PRICE / max_cap_mgr.link_capacity())
+                          self.MAX_PRICE / max_capacity)
         
         self._next_commute_price = self._price #does not bug when 'before_commute' is called for 1st time
+        
+    @classmethod
+    def initialize_price_all(cls, net_manager):
+        '''
+        Initializes the prices of all links of the network manager 
+        at once (see initialize_price)
+        
+        '''
+        #there are no prices to initialize in an empty network
+        if net_manager.max_link_capacity is None:
+            return
+        
+        states = net_manager.link_states
+        
+        states.price[:] = net_manager.link_capacities * cls.MAX_PRICE / net_manager.max_link_capacity
+        states.next_commute_price[:] = states.price
     
     def find_alternative_managers(self):
         '''
@@ -150,8 +538,17 @@ class LinkManager(object):
         :return: list with the managers of the alternatives of this LM's link
         :rtype: list
         '''
+        #uses the index of the network manager, when available
+        alternative_managers = self._net_mgr.alternatives_of(self)
+        if alternative_managers is not None:
+            return alternative_managers
+        
         incoming = [e for e in self._link.getIncoming()] #turns dict to list =/
         
+        #a link without incoming links has no alternatives
+        if len(incoming) == 0:
+            return []
+        
         alternative_managers = [self._net_mgr.manager_of_link(l) for l in incoming[0].getOutgoing()]
         alternative_managers.remove(self)
         
@@ -233,7 +630,9 @@ class LinkManager(object):
         return self._link
     
     def link_capacity(self):
-        return int(self._link.getLength() * self._link.getLaneNumber() / self.DEFAULT_CAR_SIZE)
+        if self._capacity is None:
+            self._capacity = int(self._link.getLength() * self._link.getLaneNumber() / self.DEFAULT_CAR_SIZE)
+        return self._capacity
     
     def timestep_action(self):
         '''
@@ -255,6 +654,18 @@ class LinkManager(object):
         '''
         pass
     
+    @classmethod
+    def commute_finished_action_all(cls, net_manager):
+        '''
+        Performs commute_finished_action on all links of the network 
+        manager at once, with array operations over their states. 
+        The standard link manager performs no action.
+        
+        :param net_manager: the network manager whose links are updated
+        :type net_manager: NetworkManager
+        
+        '''
+        pass
     
     def before_commute_action(self):
         '''
@@ -266,6 +677,30 @@ class LinkManager(object):
         self._average_occupancy = 0
         self._timestep = 0
         self._total_users = 0
+        
+    @classmethod
+    def before_commute_action_all(cls, net_manager):
+        '''
+        Performs before_commute_action on all links of the network manager
+        
+        '''
+        states = net_manager.link_states
+        states.price[:] = states.next_commute_price
+        states.average_occupancy[:] = 0
+        states.timestep[:] = 0
+        states.total_users[:] = 0
+        
+    @classmethod
+    def clip_prices(cls, link_states):
+        '''
+        Corrects the current prices of the given states to be within 
+        the max and min prices (as reading the price property does) 
+        and returns them
+        
+        '''
+        return numpy.clip(
+            link_states.price, cls.MIN_PRICE, cls.MAX_PRICE, out=link_states.price
+        )
     
 class GreedyLinkManager(LinkManager):
     '''
@@ -304,6 +739,27 @@ class GreedyLinkManager(LinkManager):
             #this is a difference from the netlogo implementation!
             if self._price != cmp_func(reference_mgr.price, self._price):
                 self._next_commute_price = reference_mgr.price + increment
+                
+    @classmethod
+    def commute_finished_action_all(cls, net_manager):
+        '''
+        Greedy price update of all links at once. Prices are
+        corrected to be within limits before comparison
+        
+        '''
+        states = net_manager.link_states
+        prices = cls.clip_prices(states)
+        
+        alt_avg_occ = net_manager.alternatives_average_occupancy()
+        highest, lowest = net_manager.alternatives_price_bounds()
+        
+        #price is NOT increased when it is already the highest
+        #NOR is decreased when it is already the lowest
+        increase = (states.average_occupancy > alt_avg_occ) & (highest > prices)
+        decrease = (states.average_occupancy < alt_avg_occ) & (lowest < prices)
+        
+        states.next_commute_price[increase] = highest[increase] + 10
+        states.next_commute_price[decrease] = lowest[decrease] - 10
     
     
     
@@ -324,7 +780,69 @@ class IncrementalLinkManager(LinkManager):
             
         elif self.occupancy < alt_avg_occ:
             self._next_commute_price = self._price - 10
+    
+    @classmethod
+    def commute_finished_action_all(cls, net_manager):
+        '''
+        Incremental price update of all links at once
+        
+        '''
+        states = net_manager.link_states
+        alt_avg_occ = net_manager.alternatives_average_occupancy()
+        
+        increase = states.average_occupancy > alt_avg_occ
+        decrease = states.average_occupancy < alt_avg_occ
+        
+        states.next_commute_price[increase] = states.price[increase] + 10
+        states.next_commute_price[decrease] = states.price[decrease] - 10
             
+class QLearningStates(LinkStates):
+    '''
+    Stores the state of many Q-learning link managers, including 
+    their q-tables (one row per manager, one column per price)
+    
+    '''
+    
+    #the prices (actions) in the iteration order of the former q-table 
+    #dict, as the last one with max q-value is chosen among ties
+    ACTIONS = dict((prc, 0) for prc in [i*10 for i in range(11)]).keys()
+    
+    FIELDS = LinkStates.FIELDS + [
+        ('alpha', float),
+        ('epsilon', float),
+        ('epsilon_end', float),
+        ('exploration', int),
+        ('decay', float),
+        ('curr_iter', int),
+    ]
+    
+    def __init__(self, size):
+        super(QLearningStates, self).__init__(size)
+        self.qtable = numpy.zeros((size, len(self.ACTIONS)))
+        
+        #column of each price in the q-table, -1 if price is not an action
+        self._columns = -numpy.ones(max(self.ACTIONS) + 1, int)
+        self._columns[self.ACTIONS] = range(len(self.ACTIONS))
+        
+    def copy_slot(self, other, src_slot, dst_slot):
+        super(QLearningStates, self).copy_slot(other, src_slot, dst_slot)
+        self.qtable[dst_slot] = other.qtable[src_slot]
+        
+    def arrays(self):
+        arrays = super(QLearningStates, self).arrays()
+        arrays['qtable'] = self.qtable
+        return arrays
+        
+    def column_of(self, prices):
+        '''
+        Returns the q-table columns of the given prices (array or int)
+        
+        '''
+        columns = self._columns[prices]
+        if numpy.any(columns < 0):
+            raise KeyError('Price is not an action of the q-table: %s' % prices)
+        return columns
+    
 class QLearningLinkManager(LinkManager):
     '''
     Implements the Q-learning link manager.
@@ -335,6 +853,15 @@ class QLearningLinkManager(LinkManager):
     
     MAX_COST = 30 #constant cost of operating this road
     
+    STATES_CLASS = QLearningStates
+    
+    alpha = StateField('alpha', float)
+    epsilon = StateField('epsilon', float)
+    epsilon_end = StateField('epsilon_end', float)
+    exploration = StateField('exploration', int)
+    decay = StateField('decay', float)
+    curr_iter = StateField('curr_iter', int)
+    
     def __init__(self, link, net_manager, alpha = 0.5, epsilon_begin = 1.0, exploration = 200):
         '''
         Initializes the q-table
@@ -351,9 +878,15 @@ class QLearningLinkManager(LinkManager):
         self.curr_iter = 1
         
         #print 'QLearningLingManager created with alpha =', alpha
-        #initializes q-table (1 entry per discretized price)        
-        prices = [i*10 for i in range(11)] #0,10,...,100
-        self._qtable = dict((prc, 0) for prc in prices)
+        #the q-table (1 entry per discretized price) is the row of this manager in the states
+    
+    @property
+    def qtable(self):
+        '''
+        Returns a dict {price: q-value} with the q-table of this manager
+        
+        '''
+        return dict(zip(self._states.ACTIONS, self._states.qtable[self._slot].tolist()))
         
     def set_params(self, params):
         '''
@@ -387,7 +920,7 @@ class QLearningLinkManager(LinkManager):
 #        
 #        self._price = round(self._price / 10) * 10 #makes it a multiple of 10
         
-        self._price = random.choice(self._qtable.keys())
+        self._price = random.choice(self._states.ACTIONS)
         self._next_commute_price = self._price
         
 
@@ -404,27 +937,91 @@ class QLearningLinkManager(LinkManager):
         #reward = profit
         reward = self.total_users
         
-        #updates q-table using q-learning update rule, reward is the profit
-        self._qtable[self.price] = self.alpha * reward + (1 - self.alpha) * self._qtable[self.price]
+        self._learn(reward)
+                    
+        #decays epsilon
+        if self.curr_iter <= self.exploration:
+            self.epsilon *= self.decay
+            
+        self.curr_iter += 1
+        #print self.epsilon
+        
+    def _learn(self, reward):
+        '''
+        Updates the q-table entry of the current price with the given 
+        reward and chooses the next price epsilon-greedily
+        
+        '''
+        qtable = self._states.qtable[self._slot]
+        actions = self._states.ACTIONS
+        col = self._states.column_of(self.price)
         
-        #decreases epsilon
+        #updates q-table using q-learning update rule
+        qtable[col] = self.alpha * reward + (1 - self.alpha) * qtable[col]
 
         #sets new price (epsilon-greedily)
         if random.random() < self.epsilon: #tries random action
-            self._next_commute_price = random.choice(self._qtable.keys())
+            self._next_commute_price = random.choice(actions)
         
         else: #executes action of max q
-            max_q = max(self._qtable.values())
-            for k,v in self._qtable.iteritems():
+            max_q = qtable.max()
+            for k,v in zip(actions, qtable):
                 if v == max_q:
-                    self._next_commute_price = k      
+                    self._next_commute_price = k
                     
+    @classmethod
+    def _learn_all(cls, link_states, rewards):
+        '''
+        Vectorized _learn over all managers of the given states. Random 
+        actions are drawn from numpy.random
+        
+        '''
+        rows = numpy.arange(len(link_states))
+        cols = link_states.column_of(link_states.price)
+        qtable = link_states.qtable
+        alpha = link_states.alpha
+        
+        #updates q-table using q-learning update rule
+        qtable[rows, cols] = alpha * rewards + (1 - alpha) * qtable[rows, cols]
+        
+        #greedy choice is the last column with max q (as in _learn)
+        num_actions = qtable.shape[1]
+        greedy = num_actions - 1 - numpy.argmax(qtable[:, ::-1], axis=1)
+        
+        explore = numpy.random.random(len(rows)) < link_states.epsilon
+        choices = numpy.where(
+            explore, numpy.random.randint(0, num_actions, len(rows)), greedy
+        )
+        
+        link_states.next_commute_price[:] = numpy.array(link_states.ACTIONS)[choices]
+        
+    @classmethod
+    def _profits(cls, link_states):
+        '''
+        Returns the profit earned by each manager of the given states 
+        (revenue - cost of operating the link)
+        
+        '''
+        users = link_states.total_users
+        return (users * link_states.price) - \
+        link_states.timestep * (cls.MAX_COST * numpy.power(math.e, -users.astype(float)))
+        
+    @classmethod
+    def commute_finished_action_all(cls, net_manager):
+        '''
+        Updates the q-tables and chooses the new prices of all links at once
+        
+        '''
+        states = net_manager.link_states
+        cls.clip_prices(states)
+        
+        cls._learn_all(states, states.total_users)
+        
         #decays epsilon
-        if self.curr_iter <= self.exploration:
-            self.epsilon *= self.decay
-            
-        self.curr_iter += 1
-        #print self.epsilon
+        decaying = states.curr_iter <= states.exploration
+        states.epsilon[decaying] *= states.decay[decaying]
+        
+        states.curr_iter += 1
         
 class OldQLinkManager(QLearningLinkManager):
     '''
@@ -446,17 +1043,19 @@ class OldQLinkManager(QLearningLinkManager):
         reward = profit
         
         #updates q-table using q-learning update rule, reward is the profit
-        self._qtable[self.price] = self.alpha * reward + (1 - self.alpha) * self._qtable[self.price]
-
-        #sets new price (epsilon-greedily)
-        if random.random() < self.epsilon: #tries random action
-            self._next_commute_price = random.choice(self._qtable.keys())
+        self._learn(reward)
         
-        else: #executes action of max q
-            max_q = max(self._qtable.values())
-            for k,v in self._qtable.iteritems():
-                if v == max_q:
-                    self._next_commute_price = k                
+    @classmethod
+    def commute_finished_action_all(cls, net_manager):
+        '''
+        Updates the q-tables (with the profits) and chooses 
+        the new prices of all links at once
+        
+        '''
+        states = net_manager.link_states
+        cls.clip_prices(states)
+        
+        cls._learn_all(states, cls._profits(states))
             
 #little hack to create the manager classes from strings        
 manager_classes = {
@@ -36,7 +36,7 @@ class ODKeeper(object):
 
 
     def __init__(self, road_net, od_matrix, num_veh = 900, max_per_action = 0, aux_prefix = 'aux',  
-                 exclude_prefix = None):
+                 exclude_prefix = None, path_cache = None, precompute_paths = False):
         '''
         Initializes the od-keeper
         
@@ -52,15 +52,32 @@ class ODKeeper(object):
         :type aux_prefix: str
         :param exclude_prefix: the prefix of the vehicle ID's to be discounted while checking the total
         :type exclude_prefix: str
+        :param path_cache: the cache of the routes (length-based) between edges (created if None)
+        :type path_cache: search.PathCache
+        :param precompute_paths: calculate the routes between all sources and sinks of the OD matrix now?
+        :type precompute_paths: bool
         
         '''
         self._road_net = road_net
         self._od_matrix = od_matrix
+        
+        #origins and destinations are selected with the precompiled weights of the matrix
+        self._od_sampler = od_matrix.sampler()
+        
         self._num_veh = num_veh
         self._max_per_action = max_per_action
         self._aux_prefix = aux_prefix
         self._exclude_prefix = exclude_prefix
         self._insertions = 0
+        
+        #routes are calculated once for each origin and destination
+        self._paths = path_cache if path_cache is not None else search.PathCache(road_net)
+        
+        if precompute_paths:
+            sources, sinks = od_matrix.source_and_sink_ids()
+            self._paths.precompute(
+                [road_net.getEdge(e) for e in sources], [road_net.getEdge(e) for e in sinks]
+            )
     
     def act(self):
         '''
@@ -80,19 +97,18 @@ class ODKeeper(object):
             if self._exclude_prefix is not None and self._exclude_prefix in vehId:
                 continue
 
-            (orig_taz, dest_taz) = self._od_matrix.select_od_taz()
-            orig_edg = self._road_net.getEdge(orig_taz.select_source()['id'])
-            dest_edg = self._road_net.getEdge(dest_taz.select_sink()['id']) 
+            #unconnected pairs are discarded before searching
+            od_edges = self._od_sampler.select_od_edges(self._paths.reachable)
+            if od_edges is None:
+                continue
             
-            theRoute = search.dijkstra(
-                self._road_net, 
-                orig_edg, 
-                dest_edg, None, True
+            theRoute = self._paths.path(
+                self._road_net.getEdge(od_edges[0]), self._road_net.getEdge(od_edges[1])
             )
             #tries again if dest is not reachable from orig
             if theRoute is None:
                 continue
-             
+            
             edges = [edge.getID().encode('utf-8') for edge in theRoute]
             
             vehId = str(thisTs) + '-' + vehId
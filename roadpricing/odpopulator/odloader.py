@@ -38,7 +38,7 @@ class ODLoader(object):
 
 
     def __init__(self, road_net, od_matrix, num_veh = 900, max_per_action = 0, aux_prefix = 'aux',  
-                 exclude_prefix = None, output = None):
+                 exclude_prefix = None, output = None, path_cache = None, precompute_paths = False):
         '''
         Initializes the od-loader
         
@@ -56,10 +56,18 @@ class ODLoader(object):
         :type exclude_prefix: str
         :param output: the file to write the generated demand
         :type output: str
+        :param path_cache: the cache of the routes (length-based) between edges (created if None)
+        :type path_cache: search.PathCache
+        :param precompute_paths: calculate the routes between all sources and sinks of the OD matrix now?
+        :type precompute_paths: bool
         
         '''
         self._road_net = road_net
         self._od_matrix = od_matrix
+        
+        #origins and destinations are selected with the precompiled weights of the matrix
+        self._od_sampler = od_matrix.sampler() if od_matrix is not None else None
+        
         self._num_veh = num_veh
         self._max_per_action = max_per_action
         self._aux_prefix = aux_prefix
@@ -78,6 +86,15 @@ class ODLoader(object):
         
         self._launched_vehicles = {}
         
+        #routes are calculated once for each origin and destination
+        self._paths = path_cache if path_cache is not None else search.PathCache(road_net)
+        
+        if precompute_paths and od_matrix is not None:
+            sources, sinks = od_matrix.source_and_sink_ids()
+            self._paths.precompute(
+                [road_net.getEdge(e) for e in sources], [road_net.getEdge(e) for e in sinks]
+            )
+        
     def set_steady_duration(self, duration):
         '''
         Sets how many timesteps the loader will keep the 
@@ -148,14 +165,13 @@ class ODLoader(object):
             if self._max_per_action != 0 and inserted_this_ts >= self._max_per_action:
                 break
             
-            (orig_taz, dest_taz) = self._od_matrix.select_od_taz()
-            orig_edg = self._road_net.getEdge(orig_taz.select_source()['id'])
-            dest_edg = self._road_net.getEdge(dest_taz.select_sink()['id']) 
+            #unconnected pairs are discarded before searching
+            od_edges = self._od_sampler.select_od_edges(self._paths.reachable)
+            if od_edges is None:
+                continue
             
-            theRoute = search.dijkstra(
-                self._road_net, 
-                orig_edg, 
-                dest_edg, None, True
+            theRoute = self._paths.path(
+                self._road_net.getEdge(od_edges[0]), self._road_net.getEdge(od_edges[1])
             )
             #tries again if dest is not reachable from orig
             if theRoute is None:
@@ -246,11 +262,7 @@ class UniformLoader(ODLoader):
                 orig_edg = random.choice(self._road_net._edges) 
                 dest_edg = random.choice(self._road_net._edges) 
                 
-                theRoute = search.dijkstra(
-                    self._road_net, 
-                    orig_edg, 
-                    dest_edg, None, True
-                )
+                theRoute = self._paths.path(orig_edg, dest_edg)
                 #tries again if dest is not reachable from orig
                 if theRoute is None:
                     continue
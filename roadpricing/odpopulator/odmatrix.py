@@ -7,6 +7,7 @@ Created on Jan 2, 2013
 @author: anderson
 '''
 
+import numpy
 import util
 
 class TAZ(object):
@@ -101,6 +102,7 @@ class ODMatrix(object):
         '''
         
         self.taz_list = []
+        self._taz_index = {}
         
     def add_taz(self, taz):
         '''
@@ -110,6 +112,7 @@ class ODMatrix(object):
         
         '''
         self.taz_list.append(taz)
+        self._taz_index.setdefault(taz.taz_id, taz)
         
     def all_taz(self):
         '''
@@ -119,6 +122,20 @@ class ODMatrix(object):
         '''
         return self.taz_list
     
+    def source_and_sink_ids(self):
+        '''
+        return: the IDs of the source edges and of the sink edges of all TAZs, without repetitions
+        :rtype: tuple(list, list)
+        
+        '''
+        sources = set()
+        sinks = set()
+        for taz in self.taz_list:
+            sources.update([s['id'] for s in taz.sources])
+            sinks.update([s['id'] for s in taz.sinks])
+        
+        return sorted(sources), sorted(sinks)
+    
     def select_od_taz(self):
         '''
         Performs the weighted selection of origin and destination TAZs
@@ -145,6 +162,30 @@ class ODMatrix(object):
         )
         return [origin_taz, self.find(dest_taz_dict['name'])]
     
+    def select_od_edges(self, reachable = None, max_tries = 100):
+        '''
+        Selects the origin and destination TAZs (see select_od_taz) and then
+        a source edge of the origin and a sink edge of the destination. Pairs of 
+        edges that are not connected are discarded and selected again
+        
+        :param reachable: function that receives two edge IDs and tells whether the second is reachable from the first (all pairs are accepted if None)
+        :type reachable: function
+        :param max_tries: the maximum number of selections
+        :type max_tries: int
+        return: the IDs of the source and sink edges, or None if no connected pair was selected
+        :rtype: tuple(str, str)
+        
+        '''
+        for i in range(max_tries):
+            (orig_taz, dest_taz) = self.select_od_taz()
+            source = orig_taz.select_source()['id']
+            sink = dest_taz.select_sink()['id']
+            
+            if reachable is None or reachable(source, sink):
+                return source, sink
+        
+        return None
+    
     def incoming_trips(self, taz_id):
         '''
         return: the number of trips that ends in the given TAZ
@@ -168,8 +209,128 @@ class ODMatrix(object):
         :rtype: odmatrix.TAZ
          
         '''
-        for taz in self.taz_list:
-            if taz.taz_id == taz_id:
-                return taz
+        return self._taz_index.get(taz_id)
+    
+    def sampler(self):
+        '''
+        return: a sampler of the TAZs and edges of this matrix, as it is now
+        :rtype: odmatrix.ODSampler
+        
+        '''
+        return ODSampler(self)
+    
+class ODSampler(object):
+    '''
+    Immutable, precompiled version of the weighted selections of an ODMatrix.
+    
+    The origin TAZs, the destinations of each origin and the sources and 
+    sinks of each TAZ are selected with alias tables (see util.AliasTables), 
+    in constant time, instead of summing the weights on each selection. 
+    Changes in the matrix after the sampler is built are not seen by it.
+    
+    '''
+    
+    def __init__(self, od_matrix):
+        '''
+        Compiles the weights of the given matrix
+        :param od_matrix: the OD matrix with the TAZs and their trips
+        :type od_matrix: odmatrix.ODMatrix
         
-        return None
\ No newline at end of file
+        '''
+        self._taz = list(od_matrix.all_taz())
+        self._taz_index = dict((taz.taz_id, i) for i, taz in reversed(list(enumerate(self._taz))))
+        
+        #destinations of each origin, as TAZ indices
+        self._destinations = [
+            [self._taz_index[d] for d in taz.destinations] for taz in self._taz
+        ]
+        self._origin_table = util.AliasTables([[taz.outgoing_trips() for taz in self._taz]])
+        self._destination_tables = util.AliasTables(
+            [taz.destinations.values() for taz in self._taz]
+        )
+        self._destination_flat, self._destination_start = _flatten(self._destinations)
+        
+        #edge IDs of the sources and sinks of each TAZ, in flat arrays
+        self._source_table = util.AliasTables([[s['weight'] for s in taz.sources] for taz in self._taz])
+        self._sink_table = util.AliasTables([[s['weight'] for s in taz.sinks] for taz in self._taz])
+        
+        self._sources = [[s['id'] for s in taz.sources] for taz in self._taz]
+        self._sinks = [[s['id'] for s in taz.sinks] for taz in self._taz]
+        
+        self._source_ids, self._source_start = _flatten(self._sources)
+        self._sink_ids, self._sink_start = _flatten(self._sinks)
+    
+    def find(self, taz_id):
+        '''
+        return: the TAZ identified by its ID or None 
+        :rtype: odmatrix.TAZ
+        
+        '''
+        index = self._taz_index.get(taz_id)
+        return self._taz[index] if index is not None else None
+    
+    def select_od_taz(self):
+        '''
+        Same as ODMatrix.select_od_taz
+        return: the origin and destination TAZ's in a list: [odmatrix.TAZ, odmatrix.TAZ]
+        :rtype: list(odmatrix.TAZ) 
+        
+        '''
+        origin, destination = self._select_od_indices()
+        return [self._taz[origin], self._taz[destination]]
+    
+    def select_od_edges(self, reachable = None, max_tries = 100):
+        '''
+        Same as ODMatrix.select_od_edges
+        return: the IDs of the source and sink edges, or None if no connected pair was selected
+        :rtype: tuple(str, str)
+        
+        '''
+        for i in range(max_tries):
+            origin, destination = self._select_od_indices()
+            source = self._sources[origin][self._source_table.draw(origin)]
+            sink = self._sinks[destination][self._sink_table.draw(destination)]
+            
+            if reachable is None or reachable(source, sink):
+                return source, sink
+        
+        return None
+    
+    def sample_edges(self, num_pairs):
+        '''
+        Selects many pairs of source and sink edges at once (see select_od_edges)
+        :param num_pairs: the number of pairs to be selected
+        :type num_pairs: int
+        return: the IDs of the source edges and of the sink edges of the pairs
+        :rtype: tuple(numpy.ndarray, numpy.ndarray)
+        
+        '''
+        origins = self._origin_table.draw_many(numpy.zeros(num_pairs, dtype=numpy.int64))
+        destinations = self._destination_flat[
+            self._destination_start[origins] + self._destination_tables.draw_many(origins)
+        ]
+        
+        sources = self._source_start[origins] + self._source_table.draw_many(origins)
+        sinks = self._sink_start[destinations] + self._sink_table.draw_many(destinations)
+        
+        return self._source_ids[sources], self._sink_ids[sinks]
+    
+    def _select_od_indices(self):
+        '''
+        return: the indices of the selected origin and destination TAZs
+        :rtype: tuple(int, int)
+        
+        '''
+        origin = self._origin_table.draw()
+        destination = self._destinations[origin][self._destination_tables.draw(origin)]
+        return origin, destination
+
+def _flatten(lists):
+    '''
+    return: the items of all lists in a single array and the position where each list starts
+    :rtype: tuple(numpy.ndarray, numpy.ndarray)
+    
+    '''
+    flat = numpy.array([item for l in lists for item in l])
+    start = numpy.cumsum([0] + [len(l) for l in lists])[:-1].astype(numpy.int64)
+    return flat, start
@@ -1,6 +1,6 @@
 '''
 Provides a method for selecting an item with chance proportional to
-its weight
+its weight, and alias tables that do the same in constant time
 
 Created on Jan 3, 2013
 
@@ -8,6 +8,7 @@ Created on Jan 3, 2013
 
 '''
 import random
+import numpy
 
 def weighted_selection(total_ammount, items_list, weight_selector):
     '''
@@ -32,4 +33,121 @@ def weighted_selection(total_ammount, items_list, weight_selector):
         cumulative += weight
         if variate < cumulative:
             return item
-    return item # Shouldn't get here, but just in case of rounding...   
+    return item # Shouldn't get here, but just in case of rounding...
+
+class AliasTables(object):
+    '''
+    Walker's alias tables of many discrete distributions, stored in
+    flat arrays (the table of distribution g is at [start[g]:start[g+1]]).
+    
+    Each draw costs O(1): a column is chosen uniformly and either it
+    or its alias is returned, so the weights are summed only once, when the
+    tables are built
+    
+    '''
+    
+    def __init__(self, weight_lists):
+        '''
+        Builds the tables (Vose's method)
+        
+        :param weight_lists: the weights of the items of each distribution. Distributions with total weight of zero become uniform
+        :type weight_lists: list(list(float))
+        
+        '''
+        sizes = [len(w) for w in weight_lists]
+        self._start = numpy.concatenate(([0], numpy.cumsum(sizes))).astype(numpy.int64)
+        self._sizes = numpy.array(sizes, dtype=numpy.int64)
+        
+        #probability of keeping each column and its alias (index within the distribution)
+        self._prob = numpy.ones(self._start[-1])
+        self._alias = numpy.zeros(self._start[-1], dtype=numpy.int64)
+        
+        for g, weights in enumerate(weight_lists):
+            weights = numpy.asarray(weights, dtype=float)
+            total = weights.sum()
+            if len(weights) == 0 or total <= 0:
+                continue
+            
+            scaled = weights * (len(weights) / total)
+            prob = self._prob[self._start[g]:self._start[g+1]]
+            alias = self._alias[self._start[g]:self._start[g+1]]
+            alias[:] = numpy.arange(len(weights))
+            
+            small = [i for i in range(len(weights)) if scaled[i] < 1.0]
+            large = [i for i in range(len(weights)) if scaled[i] >= 1.0]
+            while small and large:
+                s = small.pop()
+                l = large[-1]
+                
+                prob[s] = scaled[s]
+                alias[s] = l
+                
+                scaled[l] -= 1.0 - scaled[s]
+                if scaled[l] < 1.0:
+                    small.append(large.pop())
+            
+            #the remaining columns are (up to rounding errors) full
+            for i in small + large:
+                prob[i] = 1.0
+        
+        self._prob_list = self._prob.tolist()
+        self._alias_list = self._alias.tolist()
+        self._start_list = self._start.tolist()
+        
+    def __len__(self):
+        return len(self._sizes)
+    
+    def size(self, group):
+        '''
+        return: the number of items of the given distribution
+        :rtype: int
+        
+        '''
+        return self._start_list[group + 1] - self._start_list[group]
+    
+    def draw(self, group = 0):
+        '''
+        Selects an item of the given distribution with chance
+        proportional to its weight
+        
+        :param group: the index of the distribution
+        :type group: int
+        return: the index of the item within its distribution
+        :rtype: int
+        
+        '''
+        start = self._start_list[group]
+        size = self._start_list[group + 1] - start
+        if size == 0:
+            raise ValueError('Cannot draw from empty distribution %d' % group)
+        
+        variate = random.random() * size
+        column = int(variate)
+        if column == size: #rounding
+            column -= 1
+        
+        if variate - column < self._prob_list[start + column]:
+            return column
+        return self._alias_list[start + column]
+    
+    def draw_many(self, groups):
+        '''
+        Draws one item of each given distribution at once
+        
+        :param groups: the indices of the distributions (repetitions allowed)
+        :type groups: numpy.ndarray
+        return: the index of each drawn item within its distribution
+        :rtype: numpy.ndarray
+        
+        '''
+        groups = numpy.asarray(groups, dtype=numpy.int64)
+        sizes = self._sizes[groups]
+        if len(groups) > 0 and sizes.min() == 0:
+            raise ValueError('Cannot draw from empty distribution %d' % groups[sizes == 0][0])
+        
+        variates = numpy.random.random(len(groups)) * sizes
+        columns = numpy.minimum(variates.astype(numpy.int64), sizes - 1)
+        
+        flat = self._start[groups] + columns
+        keep = (variates - columns) < self._prob[flat]
+        return numpy.where(keep, columns, self._alias[flat])
@@ -0,0 +1,250 @@
+'''
+Runs independent replications of road pricing experiments in parallel.
+
+Each replication is a pair (config file, seed). Replications run in
+worker processes, each one with its own TraCI port and output directory.
+When all replications finish, an index (csv) with the result files of
+each replication is written in the base output directory.
+
+Usage example:
+python replications.py -s 1,2,3 -p 4 -o results 5k-time/config.xml 5k-money/config.xml
+
+'''
+
+import sys
+import os
+import socket
+import random
+import glob
+import csv
+import traceback
+import multiprocessing
+from optparse import OptionParser
+
+import numpy
+import configparser
+import roadpricing
+
+def free_port():
+    '''
+    Returns a TCP port that is currently free, chosen by the
+    operating system
+
+    '''
+    return free_ports(1)[0]
+
+def free_ports(num_ports):
+    '''
+    Returns distinct TCP ports that are currently free. All sockets are
+    kept bound until every port is chosen, so the operating system
+    cannot give the same port twice
+
+    :param num_ports: the number of ports
+    :type num_ports: int
+    :return: the ports
+    :rtype: list
+
+    '''
+    sockets = []
+    try:
+        for i in range(num_ports):
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sockets.append(s)
+            s.bind(('', 0))
+
+        return [s.getsockname()[1] for s in sockets]
+    finally:
+        for s in sockets:
+            s.close()
+
+def replication_jobs(config_files, seeds, base_output_path):
+    '''
+    Returns the list of replications: one for each config file and seed
+
+    :param config_files: paths to the experiments' config files
+    :type config_files: list
+    :param seeds: the seeds of the random number generators
+    :type seeds: list
+    :param base_output_path: directory where the replications' output directories are created
+    :type base_output_path: str
+    :return: list of dicts {'config': path, 'seed': seed, 'output_path': path}
+    :rtype: list
+
+    '''
+    #names the replications after the directory of the config file (or the file itself)
+    names = []
+    for cfg_file in config_files:
+        name = os.path.basename(os.path.dirname(os.path.abspath(cfg_file)))
+        if os.path.basename(cfg_file) != 'config.xml':
+            name = os.path.splitext(os.path.basename(cfg_file))[0]
+        names.append(name)
+
+    jobs = []
+    for number, (cfg_file, name) in enumerate(zip(config_files, names)):
+        #config files with the same name are told apart by their position
+        if names.count(name) > 1:
+            name = '%s-%d' % (name, number + 1)
+
+        for seed in seeds:
+            jobs.append({
+                'config': cfg_file,
+                'seed': seed,
+                'output_path': os.path.join(base_output_path, '%s_seed%d' % (name, seed))
+            })
+
+    return jobs
+
+def run_replication(job):
+    '''
+    Runs one replication in the current process. The experiment's
+    output and SUMO's are written to log.txt in its output directory
+
+    :param job: the replication (see replication_jobs), with the 'port' of SUMO, if already chosen
+    :type job: dict
+    :return: the job, with 'port', 'status' and 'files' (the result csv files)
+    :rtype: dict
+
+    '''
+    result = dict(job)
+    result['port'] = job.get('port')
+    result['files'] = []
+
+    if not os.path.exists(job['output_path']):
+        os.makedirs(job['output_path'])
+
+    #redirects the output of this process and its children (SUMO)
+    log = open(os.path.join(job['output_path'], 'log.txt'), 'w')
+    sys.stdout.flush()
+    os.dup2(log.fileno(), 1)
+    os.dup2(log.fileno(), 2)
+
+    try:
+        cfg = configparser.ConfigParser(job['config'])
+        cfg.output_path = job['output_path']
+        if result['port'] is None:
+            result['port'] = free_port()
+        cfg.port = result['port']
+
+        #summaries are also written in the replication's directory
+        if cfg.summary_prefix is not None:
+            cfg.summary_prefix = os.path.join(
+                job['output_path'], os.path.basename(cfg.summary_prefix)
+            )
+
+        #worker processes cannot have their own route planners
+        cfg.route_workers = 1
+
+        random.seed(job['seed'])
+        numpy.random.seed(job['seed'])
+
+        roadpricing.create_experiment(cfg).iterations()
+
+        result['status'] = 'finished'
+        result['files'] = sorted(glob.glob(
+            os.path.join(job['output_path'], '%s_*.csv' % cfg.resultprefix)
+        ))
+
+    except Exception:
+        traceback.print_exc()
+        result['status'] = 'failed'
+
+    sys.stdout.flush()
+    log.close()
+
+    return result
+
+def write_index(results, filename):
+    '''
+    Writes the index of the replications' results: one line per
+    result file of each replication
+
+    '''
+    outfile = open(filename, 'w')
+    writer = csv.writer(outfile)
+
+    writer.writerow(['config', 'seed', 'port', 'status', 'output_path', 'file'])
+    for r in results:
+        for f in r['files'] or [None]:
+            writer.writerow([r['config'], r['seed'], r['port'], r['status'], r['output_path'], f])
+
+    outfile.close()
+
+def run_replications(jobs, processes=None, index_file=None):
+    '''
+    Runs the replications in a pool of worker processes
+
+    :param jobs: the replications (see replication_jobs)
+    :type jobs: list
+    :param processes: the number of workers (number of CPUs if None)
+    :type processes: int
+    :param index_file: where the index of results is written (not written if None)
+    :type index_file: str
+    :return: the results of run_replication for each job
+    :rtype: list
+
+    '''
+    #ports are chosen at once, so that concurrent workers do not share one
+    jobs = [dict(job, port=port) for job, port in zip(jobs, free_ports(len(jobs)))]
+
+    #each worker runs a single replication, so that nothing is left from previous ones
+    pool = multiprocessing.Pool(processes, maxtasksperchild=1)
+
+    results = []
+    for result in pool.imap_unordered(run_replication, jobs):
+        print 'Replication %s (seed %d) %s.' % (result['config'], result['seed'], result['status'])
+        results.append(result)
+
+    pool.close()
+    pool.join()
+
+    if index_file is not None:
+        write_index(results, index_file)
+
+    return results
+
+def parse_seeds(value):
+    '''
+    Parses the seeds given as a list (e.g. 1,2,5) or a range (e.g. 1-10)
+
+    '''
+    if '-' in value:
+        first, last = value.split('-')
+        return range(int(first), int(last) + 1)
+
+    return [int(s) for s in value.split(',')]
+
+if __name__ == '__main__':
+
+    parser = OptionParser(
+        usage='%prog [options] config1.xml [config2.xml ...]',
+        description='Runs replications of road pricing experiments in parallel.'
+    )
+
+    parser.add_option(
+        '-s', '--seeds', type='string', default='1',
+        help='the seeds of the replications: a list (1,2,5) or a range (1-10)'
+    )
+
+    parser.add_option(
+        '-p', '--processes', type='int', default=None,
+        help='the number of replications running at once (number of CPUs by default)'
+    )
+
+    parser.add_option(
+        '-o', '--output-path', dest='output_path', type='string', default='.',
+        help='the directory where the output directories of the replications are created'
+    )
+
+    (options, args) = parser.parse_args(sys.argv[1:])
+
+    if len(args) == 0:
+        parser.error('at least one config file must be given')
+
+    jobs = replication_jobs(args, parse_seeds(options.seeds), options.output_path)
+    print 'Running %d replications...' % len(jobs)
+
+    run_replications(
+        jobs, options.processes, os.path.join(options.output_path, 'index.csv')
+    )
+
+    print 'Replications finished.'
@@ -9,7 +9,7 @@ Created on Feb 12, 2013
 '''
 
 import sys
-from optparse import OptionParser
+from optparse import OptionParser, Values
 import configparser
 import experiment
 
@@ -61,25 +61,89 @@ def register_options(parser):
         default=False, help="activate graphical user interface"
     )
     
+    parser.add_option(
+      '--route-workers', dest='route_workers', type='int',
+      default=1, help = 'the number of processes that plan the routes of drivers'
+    )
+    
+    parser.add_option(
+        '--persistent-sumo', dest='persistent_sumo', action='store_true',
+        default=False, help='keeps a single SUMO instance, reloaded at each iteration'
+    )
+    
+    parser.add_option(
+        '--no-checkpoint', dest='checkpoint', action='store_false',
+        default=True, help='does not save the state of the experiment after each iteration'
+    )
+    
+    parser.add_option(
+        '--resume', dest='resume', action='store_true',
+        default=False, help='resumes the experiment from the checkpoint in the output path'
+    )
+    
+    parser.add_option(
+        '--binary-stats', dest='binary_stats', action='store_true',
+        default=False, help='also saves the statistics of each iteration in .npy files'
+    )
+    
+    parser.add_option(
+        '--departure-lookahead', dest='departure_lookahead', type='int',
+        default=100, help='the number of timesteps before departure that drivers are loaded into the simulation'
+    )
+    
+    parser.add_option(
+        '--sparse-kb', dest='sparse_kb', action='store_true',
+        default=False, help='stores only the edges observed by each driver in the knowledge base'
+    )
+    
+    parser.add_option(
+        '--online-payment', dest='online_payment', action='store_true',
+        default=False, help='drivers pay for each link when entering it, instead of after the trip'
+    )
+    
     parser.add_option('-c','--config-file',
         default=None, help="loads experiment configuration from a file"
     )
 
 
-if __name__ == '__main__':
-    
-    parser = OptionParser(description='''Main script. Performs a road pricing experiment.''')
-    
-    register_options(parser)
-    
-    (options, args) = parser.parse_args(sys.argv)
+def merge_options(cfg, parser, args):
+    '''
+    Overrides the configuration with the options given in the command 
+    line (even if given with their default values)
+    
+    :param cfg: the parsed config file
+    :type cfg: configparser.ConfigParser
+    :param parser: the parser of the command line options
+    :type parser: optparse.OptionParser
+    :param args: the command line arguments
+    :type args: list
+    :return: the configuration (cfg), with the given options
+    :rtype: configparser.ConfigParser
+    
+    '''
+    #parsed without defaults, only the given options are set
+    (given, args) = parser.parse_args(args, values=Values())
+    
+    for dest, value in vars(given).items():
+        #options without a counterpart in the config file are ignored
+        if dest == 'config_file' or not hasattr(cfg, dest):
+            continue
+        
+        setattr(cfg, dest, value)
+    
+    return cfg
+
+def create_experiment(cfg):
+    '''
+    Creates the experiment with the given configuration
     
-    if options.config_file:
-        cfg = configparser.ConfigParser(options.config_file)
-    else:
-        cfg = options
+    :param cfg: the configuration (parsed config file or command line options)
+    :type cfg: configparser.ConfigParser
+    :return: the experiment, ready to run its iterations
+    :rtype: experiment.Experiment
     
-    experiment = experiment.Experiment(
+    '''
+    return experiment.Experiment(
         cfg.drivers_file, 
         cfg.netfile, 
         cfg.link_manager_class, 
@@ -91,7 +155,7 @@ if __name__ == '__main__':
         cfg.initial_traveltime_file,
         cfg.qlparams,
         cfg.iterations,
-        1, #start_iteration (complicated to use 'resume' now...)
+        1, #start_iteration (resume starts from the checkpoint)
         cfg.broadcast_prices,
         cfg.time_limit,
         cfg.port,
@@ -99,10 +163,35 @@ if __name__ == '__main__':
         8815,
         cfg.usegui,
         cfg.summary_prefix,
-        cfg.sumopath
+        cfg.sumopath,
+        cfg.route_workers,
+        cfg.persistent_sumo,
+        cfg.checkpoint,
+        cfg.resume,
+        cfg.binary_stats,
+        cfg.departure_lookahead,
+        cfg.sparse_kb,
+        cfg.online_payment
     )
+
+if __name__ == '__main__':
+    
+    parser = OptionParser(description='''Main script. Performs a road pricing experiment.''')
+    
+    register_options(parser)
+    
+    (options, args) = parser.parse_args(sys.argv)
+    
+    if options.config_file:
+        cfg = merge_options(
+            configparser.ConfigParser(options.config_file), parser, sys.argv
+        )
+    else:
+        cfg = options
+    
+    exp = create_experiment(cfg)
     #self.coordinated = True
     #self.sumopath = None
     
-    experiment.iterations()
+    exp.iterations()
     
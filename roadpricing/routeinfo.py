@@ -0,0 +1,90 @@
+'''
+routeinfo module
+
+Reads the route information files generated by SUMO
+(--vehroute-output with --vehroute-output.exit-times) incrementally,
+one vehicle at a time, without loading the whole file into memory.
+
+'''
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+#the trip of one vehicle, edges are given by their indices
+RouteRecord = namedtuple(
+    'RouteRecord', ['vehicle_id', 'depart', 'arrival', 'edges', 'exit_times']
+)
+
+def open_from_root(filename, rootname='<routes'):
+    '''
+    Opens the file positioned at the line of its root element, skipping
+    the comments generated by SUMO, which may contain double dashes (--)
+    that are not accepted by the xml parser
+
+    :param filename: the path to the xml file
+    :type filename: str
+    :param rootname: the beginning of the line of the root element
+    :type rootname: str
+    :return: the opened file
+    :rtype: file
+
+    '''
+    f = open(filename)
+
+    while True:
+        position = f.tell()
+        line = f.readline()
+
+        if line == '':
+            f.close()
+            raise ValueError('%s not found in %s' % (rootname, filename))
+
+        if line.startswith(rootname):
+            f.seek(position)
+            return f
+
+def read_routes(route_info_file, index_of):
+    '''
+    Yields a RouteRecord for each vehicle in the route information file
+
+    :param route_info_file: the path to the route information file
+    :type route_info_file: str
+    :param index_of: function that returns the index of an edge ID
+    :type index_of: function
+    :return: generator of the vehicles' records
+    :rtype: generator
+
+    '''
+    f = open_from_root(route_info_file)
+    last_arrival = 0 #for glitch-fixing
+    root = None
+
+    try:
+        for event, element in ET.iterparse(f, ('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = element
+                continue
+
+            if element.tag != 'vehicle':
+                continue
+
+            #vehicles with no arrival have the last arrival registered
+            arrival = element.get('arrival')
+            arrival = float(arrival) if arrival else last_arrival
+            last_arrival = arrival
+
+            route = element[0]
+            record = RouteRecord(
+                element.get('id'),
+                float(element.get('depart')),
+                arrival,
+                [index_of(e) for e in route.get('edges').split(' ')],
+                [float(t) for t in route.get('exitTimes').split(' ')]
+            )
+
+            #discards the vehicles already read
+            root.clear()
+
+            yield record
+    finally:
+        f.close()
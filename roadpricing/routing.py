@@ -0,0 +1,220 @@
+'''
+routing module
+
+Provides the calculation of routes for many drivers at once,
+optionally spread among worker processes.
+
+'''
+import sys
+import os
+import multiprocessing
+
+#looks up on ../lib to import Guilherme's implementation of Dijkstra algorithm
+path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'lib', 'search'))
+if not path in sys.path: sys.path.append(path)
+
+from search import compiled_net_of, search_compiled_many
+
+class BatchRouter(object):
+    '''
+    Calculates the routes of a batch of drivers. Drivers with the same
+    origin and the same edge costs share a single search tree, from
+    which the routes to all their destinations are extracted.
+
+    '''
+
+    def __init__(self, road_network):
+        '''
+        Initializes the router
+
+        :param road_network: the road network
+        :type road_network: sumolib.net.Net
+
+        '''
+        self._compiled = compiled_net_of(road_network)
+
+        #routes are registered in traci with encoded IDs
+        self._route_ids = [eid.encode('utf-8') for eid in self._compiled.ids]
+
+    def group_drivers(self, drivers):
+        '''
+        Groups the drivers by origin and edge costs
+
+        :param drivers: the drivers to be grouped
+        :type drivers: list
+        :return: dict {(origin index, costs signature): (costs, [driver positions in the list])}
+        :rtype: dict
+
+        '''
+        groups = {}
+        for i, d in enumerate(drivers):
+            costs = d.cost_vector()
+            key = (self._compiled.index_of(d.origin), costs.tostring())
+
+            if key not in groups:
+                groups[key] = (costs, [])
+            groups[key][1].append(i)
+
+        return groups
+
+    def calculate_routes(self, drivers):
+        '''
+        Calculates the routes of the given drivers, which are the same
+        returned by Driver.calculate_route
+
+        :param drivers: the drivers whose routes will be calculated
+        :type drivers: list
+        :return: list with the route (edge IDs) of each driver, None if unreachable
+        :rtype: list
+
+        '''
+        routes = [None] * len(drivers)
+
+        for (origin, signature), (costs, members) in self.group_drivers(drivers).iteritems():
+            destinations = [self._compiled.index_of(drivers[i].destination) for i in members]
+
+            paths = search_compiled_many(
+                self._compiled, origin, destinations, costs.tolist()
+            )
+            for i, path in zip(members, paths):
+                routes[i] = self.route_ids(path)
+
+        return routes
+
+    def plan(self, drivers):
+        '''
+        Called before the drivers' trips are prepared in an iteration.
+        This router performs no action, routes are calculated when the
+        trips are prepared
+
+        '''
+        pass
+
+    def close(self):
+        '''
+        Releases the resources of the router (none for this router)
+
+        '''
+        pass
+
+    def route_ids(self, path):
+        '''
+        Returns the edge IDs of a path of edge indices (None if path is None)
+
+        '''
+        if path is None:
+            return None
+        return [self._route_ids[i] for i in path]
+
+    def prepare_trips(self, drivers, depart_offset=0):
+        '''
+        Calculates the routes of the drivers and prepares their next
+        trips, in the order they are given
+
+        :param drivers: the drivers whose trips will be prepared
+        :type drivers: list
+        :param depart_offset: offset to add in departure time
+        :type depart_offset: int
+
+        '''
+        routes = self.calculate_routes(drivers)
+
+        for d, route in zip(drivers, routes):
+            d.prepare_next_trip(depart_offset, route)
+
+
+#the compiled road network of a worker process
+_worker_net = None
+
+def _init_worker(compiled_net):
+    global _worker_net
+    _worker_net = compiled_net
+
+def _route_group(job):
+    '''
+    Calculates the paths of a group of drivers in a worker process
+
+    :param job: the origin, destinations and edge costs of the group
+    :type job: tuple
+    :return: the path (edge indices) to each destination
+    :rtype: list
+
+    '''
+    origin, destinations, costs = job
+    return search_compiled_many(_worker_net, origin, destinations, costs.tolist())
+
+class ParallelRoutePlanner(BatchRouter):
+    '''
+    Plans the routes of all drivers of an iteration before they depart,
+    spreading the groups of drivers among worker processes. The compiled
+    road network is sent only once to each worker. Trips are still
+    prepared (i.e. added via traci) by the main process.
+
+    '''
+
+    def __init__(self, road_network, processes=None):
+        '''
+        Initializes the router and starts the workers. Must be called
+        before connecting to SUMO, so that workers do not inherit the
+        connection.
+
+        :param road_network: the road network
+        :type road_network: sumolib.net.Net
+        :param processes: the number of workers (number of CPUs if None)
+        :type processes: int
+
+        '''
+        super(ParallelRoutePlanner, self).__init__(road_network)
+
+        self._pool = multiprocessing.Pool(
+            processes, _init_worker, (self._compiled,)
+        )
+        self._planned = {}
+
+    def plan(self, drivers):
+        '''
+        Calculates the routes of the given drivers in the workers. These
+        routes are used when their trips are prepared.
+
+        :param drivers: the drivers departing in the iteration
+        :type drivers: list
+
+        '''
+        self._planned = {}
+        self._plan_in_workers(drivers)
+
+    def calculate_routes(self, drivers):
+        '''
+        Returns the planned routes of the given drivers, calculating
+        the ones that were not planned
+
+        '''
+        unplanned = [d for d in drivers if d.driver_id not in self._planned]
+        if len(unplanned) > 0:
+            self._plan_in_workers(unplanned)
+
+        return [self._planned.pop(d.driver_id) for d in drivers]
+
+    def _plan_in_workers(self, drivers):
+        '''
+        Calculates and stores the routes of the given drivers, 
+        with one job per group of drivers
+
+        '''
+        groups = self.group_drivers(drivers).items()
+        jobs = [
+            (origin, [self._compiled.index_of(drivers[i].destination) for i in members], costs)
+            for (origin, signature), (costs, members) in groups
+        ]
+
+        for ((key, (costs, members)), paths) in zip(groups, self._pool.map(_route_group, jobs)):
+            for i, path in zip(members, paths):
+                self._planned[drivers[i].driver_id] = self.route_ids(path)
+
+    def close(self):
+        '''
+        Terminates the worker processes
+
+        '''
+        self._pool.close()
+        self._pool.join()
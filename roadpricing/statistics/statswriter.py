@@ -5,21 +5,42 @@ Created on Oct 6, 2012
 
 @author: anderson
 '''
+import os
+import numpy
 from fileinput import close
 from string import rstrip
 
 class StatsWriter(object):
     '''
-    Default statistics writer
+    Default statistics writer. Lines are buffered and only written 
+    to the file when flush() is called (e.g. at the end of iterations) 
+    or when the writer is closed
     
     '''
     outFile = None#the output outFile to write stats into
     
-    def __init__(self, filename, mode = 'a'):
+    def __init__(self, filename, mode = 'a', binary = False, keep_until = None):
         '''
         Constructor
+        
+        :param filename: the path to the output (csv) file
+        :type filename: str
+        :param mode: the mode to open the file (appends by default)
+        :type mode: str
+        :param binary: also save each line as a .npy file ([filename]_[dataName].npy)?
+        :type binary: bool
+        :param keep_until: if given, lines of later iterations are removed from the existing file (e.g. when resuming)
+        :type keep_until: int
+        
         '''
+        if keep_until is not None and os.path.exists(filename):
+            discard_lines_after(filename, keep_until)
+        
         self.outFile = open(filename, mode)
+        self._lines = []
+        
+        self._binary = binary
+        self._binary_prefix = os.path.splitext(filename)[0]
     
     def writeLine(self, dataName, collection, attrCall, separator = ','):
         '''
@@ -27,20 +48,76 @@ class StatsWriter(object):
         calling attrCall() and writing it separated by 'separator' parameter
         
         '''
-        line = str(dataName) + separator
-        
+        values = []
         for dataHolder in collection:
             item = getattr(dataHolder, attrCall)
             #calls function with item's name if it is a function
             if hasattr(item, '__call__'):
                 item = item() 
             
-            line += str(item) + separator
+            values.append(item)
             
-        self.outFile.write(rstrip(line, ',') + '\n')
+        self.writeValues(dataName, values, separator)
+        
+    def writeValues(self, dataName, values, separator = ','):
+        '''
+        Writes dataName as the first column, then the values 
+        separated by 'separator' parameter
+        
+        :param dataName: the first column of the line
+        :type dataName: str|int
+        :param values: the values (e.g. one per driver)
+        :type values: list|numpy.ndarray
+        
+        '''
+        if self._binary:
+            numpy.save('%s_%s.npy' % (self._binary_prefix, dataName), numpy.asarray(values))
+        
+        #python values are written as before (e.g. with the precision of str(float))
+        if hasattr(values, 'tolist'):
+            values = values.tolist()
+        
+        line = separator.join([str(dataName)] + [str(item) for item in values]) + separator
+        self._lines.append(rstrip(line, ',') + '\n')
+        
+    def flush(self):
+        '''
+        Writes the buffered lines into the file
+        
+        '''
+        self.outFile.writelines(self._lines)
         self.outFile.flush()
+        self._lines = []
         
     def __del__(self):
         if self.outFile is not None:
+            self.flush()
             self.outFile.close()
-        
\ No newline at end of file
+
+def discard_lines_after(filename, iteration):
+    '''
+    Rewrites the statistics file without the lines of the iterations
+    after the given one. Lines whose first column is not an iteration
+    number (e.g. the headers) are kept
+    
+    :param filename: the path to the statistics file
+    :type filename: str
+    :param iteration: the last iteration to be kept
+    :type iteration: int
+    
+    '''
+    infile = open(filename)
+    lines = infile.readlines()
+    infile.close()
+    
+    kept = []
+    for line in lines:
+        first = line.split(',', 1)[0].strip()
+        if first.isdigit() and int(first) > iteration:
+            continue
+        kept.append(line)
+    
+    if len(kept) < len(lines):
+        outfile = open(filename, 'w')
+        outfile.writelines(kept)
+        outfile.close()
@@ -0,0 +1,75 @@
+'''
+Tests saving and loading the state of an experiment
+
+'''
+import unittest
+import sys
+import os
+import random
+import tempfile
+import numpy
+from sumomockup.roadnetpatch import MyRoadNetwork
+
+sys.path.append(os.path.join('..','roadpricing'))
+from drivers import Driver, KnowledgeBase
+from netmanagement import NetworkManager, QLearningLinkManager
+from checkpoint import save_checkpoint, load_checkpoint
+
+class Test(unittest.TestCase):
+
+    def create_state(self, road_net):
+        '''
+        Creates a knowledge base with two drivers and 
+        a network manager with Q-learning link managers
+        
+        '''
+        kb = KnowledgeBase(road_net)
+        edges = road_net.getEdges()
+        drivers = [
+            Driver('d%d' % i, road_net, edges[0], edges[-1], knowledge_base=kb) 
+            for i in range(2)
+        ]
+        return kb, drivers, NetworkManager(road_net, QLearningLinkManager)
+
+    def test_save_and_load(self):
+        road_net = MyRoadNetwork()
+        kb, drivers, net_mgr = self.create_state(road_net)
+        
+        drivers[0].set_known_price('e2', 30)
+        drivers[1].set_known_travel_time('e3', 42)
+        drivers[1].pay_credits(15)
+        
+        for mgr in net_mgr.list_of_managers:
+            mgr._total_users = 3
+        net_mgr.commute_finished_action()
+        
+        fd, filename = tempfile.mkstemp('.pkl')
+        os.close(fd)
+        try:
+            save_checkpoint(filename, 7, kb, net_mgr.link_states, drivers)
+            expected_random = random.random(), numpy.random.random()
+            
+            #a new experiment state, loaded from the checkpoint
+            new_kb, new_drivers, new_net_mgr = self.create_state(road_net)
+            iteration = load_checkpoint(filename, new_kb, new_net_mgr.link_states, new_drivers)
+        finally:
+            os.remove(filename)
+            
+        self.assertEqual(7, iteration)
+        self.assertEqual(30, new_drivers[0].known_price('e2'))
+        self.assertEqual(42, new_drivers[1].known_travel_time('e3'))
+        self.assertEqual(15, new_drivers[1].total_expenses)
+        
+        for mgr, new_mgr in zip(net_mgr.list_of_managers, new_net_mgr.list_of_managers):
+            self.assertEqual(mgr.price, new_mgr.price)
+            self.assertEqual(mgr.next_commute_price, new_mgr.next_commute_price)
+            self.assertEqual(mgr.qtable, new_mgr.qtable)
+            self.assertEqual(mgr.epsilon, new_mgr.epsilon)
+            self.assertEqual(mgr.curr_iter, new_mgr.curr_iter)
+        
+        #random number generators continue from the saved state
+        self.assertEqual(expected_random, (random.random(), numpy.random.random()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,13 +8,20 @@ import os
 import sys
 import traci
 import StringIO
+import tempfile
 from sumomockup.roadnetpatch import MyEdge, MyRoadNetwork
 import sumomockup.tracipatch as tracipatch
 
 #TODO remove this by installing the module in PYTHONPATH
 sys.path.append(os.path.join('..','roadpricing'))
 
-from drivers import Driver, parse_drivers, KBSaver, KBLoader
+from drivers import Driver, KnowledgeBase, parse_drivers, KBSaver, KBLoader
+from drivers import TripStatistics, update_driver_kb, KBSnapshot, read_drivers_table, create_drivers
+from drivers import DepartureScheduler, SparseKnowledgeBase, save_kb_snapshot
+from search import compiled_net_of
+from routeinfo import RouteRecord
+from statistics.statswriter import StatsWriter
+import numpy
 
 class Test(unittest.TestCase):
     '''
@@ -112,9 +119,159 @@ class Test(unittest.TestCase):
         d.set_known_travel_time(e1, 55.55)
         d.set_known_price(e1, 49)
         
-        self.assertEquals(55.55, d.known_travel_time(e1))
+        #knowledge base stores single precision values
+        self.assertAlmostEquals(55.55, d.known_travel_time(e1), 5)
         self.assertEquals(49, d.known_price(e1))
         
+    def test_shared_KB(self):
+        '''
+        Tests whether drivers sharing a knowledge base store their
+        known prices and travel times in their own rows
+        
+        '''
+        road_net =  MyRoadNetwork()
+        kb = KnowledgeBase(road_net, 1)
+        
+        #the second driver makes the knowledge base grow
+        d1 = Driver('id1', road_net, None, None, knowledge_base=kb)
+        d2 = Driver('id2', road_net, None, None, knowledge_base=kb)
+        
+        self.assertEqual(2, len(kb))
+        self.assertEqual((2, 4), kb.prices.shape)
+        self.assertEqual((0, 1), (d1.kb_row, d2.kb_row))
+        
+        d1.set_known_price('e2', 70)
+        d2.set_known_travel_time('e3', 30)
+        
+        self.assertEqual(70, kb.prices[0, kb.index_of('e2')])
+        self.assertEqual(50, d2.known_price('e2'))
+        self.assertEqual(30, d2.known_travel_time('e3'))
+        self.assertEqual(10, d1.known_travel_time('e3'))
+        
+        #broadcasting overwrites the known prices of all drivers
+        kb.broadcast_prices([10, 20, 30, 40])
+        for d in [d1, d2]:
+            self.assertEqual([10, 20, 30, 40], [d.known_price(e) for e in road_net.getEdges()])
+        
+    
+    def test_broadcast_with_overrides(self):
+        '''
+        Tests whether prices written after a broadcast override the 
+        broadcast prices only for their driver and edge, until the next
+        broadcast
+        
+        '''
+        road_net =  MyRoadNetwork()
+        kb = KnowledgeBase(road_net)
+        d1 = Driver('id1', road_net, None, None, preference=0, knowledge_base=kb)
+        d2 = Driver('id2', road_net, None, None, preference=0, knowledge_base=kb)
+        
+        d1.set_known_price('e1', 70)
+        kb.broadcast_prices([10, 20, 30, 40])
+        d2.set_known_price('e3', 90)
+        
+        #drivers created after the broadcast know the default prices
+        d3 = Driver('id3', road_net, None, None, preference=0, knowledge_base=kb)
+        
+        self.assertEqual([10, 20, 30, 40], [d1.known_price(e) for e in road_net.getEdges()])
+        self.assertEqual([10, 20, 90, 40], [d2.known_price(e) for e in road_net.getEdges()])
+        self.assertEqual([10, 20, 90, 40], d2.cost_vector().tolist())
+        self.assertEqual([[10, 20, 30, 40], [10, 20, 90, 40], [50, 50, 50, 50]], kb.prices.tolist())
+        
+        #the prices matrix is only changed through the knowledge base
+        self.assertRaises(ValueError, kb.prices.__setitem__, (0, 0), 1)
+        
+        kb.broadcast_prices([15, 25, 35, 45])
+        for d in [d1, d2, d3]:
+            self.assertEqual([15, 25, 35, 45], [d.known_price(e) for e in road_net.getEdges()])
+    
+    def test_sparse_kb(self):
+        '''
+        Tests whether the sparse knowledge base returns the same known 
+        prices and travel times of the dense one
+        
+        '''
+        road_net =  MyRoadNetwork()
+        kbs = [KnowledgeBase(road_net), SparseKnowledgeBase(road_net)]
+        
+        for kb in kbs:
+            d1, d2 = [Driver('id%d' % i, road_net, None, None, preference=0.5, knowledge_base=kb) for i in range(2)]
+            
+            d1.set_known_price('e2', 70)
+            d2.set_known_travel_time('e4', 25.5)
+            kb.set_travel_times(0, [3, 1, 3], [11, 12, 13])
+            kb.broadcast_prices([10, 20, 30, 40])
+            kb.set_prices(1, [0, 2], [60, 80])
+            
+            #the third driver is created after the broadcast
+            Driver('id2', road_net, None, None, knowledge_base=kb).set_known_price('e1', 5)
+        
+        dense, sparse = kbs
+        
+        #only the observed edges are stored
+        self.assertEqual([[1, 3], [0, 2, 3], [0]], [c.tolist() for c in sparse._columns])
+        
+        for row in range(3):
+            self.assertEqual(dense.known_prices(row).tolist(), sparse.known_prices(row).tolist())
+            self.assertEqual(dense.known_travel_times(row).tolist(), sparse.known_travel_times(row).tolist())
+            for col in range(4):
+                self.assertEqual(dense.known_price(row, col), sparse.known_price(row, col))
+                self.assertEqual(dense.known_travel_time(row, col), sparse.known_travel_time(row, col))
+        
+        self.assertEqual(dense.prices.tolist(), sparse.prices.tolist())
+        self.assertEqual(dense.travel_times.tolist(), sparse.travel_times.tolist())
+        
+        rows, cols = [2, 0, 1, 0, 1], [0, 3, 3, 1, 2]
+        self.assertEqual(dense.travel_times_at(rows, cols).tolist(), sparse.travel_times_at(rows, cols).tolist())
+        
+        #restoring the arrays of the knowledge base
+        restored = SparseKnowledgeBase(road_net)
+        restored.allocate_rows(3)
+        restored.restore(sparse.arrays())
+        self.assertEqual(dense.prices.tolist(), restored.prices.tolist())
+        self.assertEqual(dense.travel_times.tolist(), restored.travel_times.tolist())
+        
+        #repeated columns (e.g. of looping routes) keep the last value, even if it is the known one
+        for kb in kbs:
+            kb.broadcast_prices([41, 29, 41, 62])
+            kb.set_prices(0, [2, 2, 2], [11, 84, 41])
+            kb.set_travel_times(1, [0, 1, 0], [7, 8, 10])
+        
+        self.assertEqual(41, sparse.known_price(0, 2))
+        self.assertEqual(10, sparse.known_travel_time(1, 0))
+        self.assertEqual(dense.prices.tolist(), sparse.prices.tolist())
+        self.assertEqual(dense.travel_times.tolist(), sparse.travel_times.tolist())
+        
+    def test_sparse_kb_warm_start(self):
+        '''
+        Tests whether loading whole rows (e.g. from a snapshot) into
+        the sparse knowledge base stores only the non-default values
+        
+        '''
+        road_net =  MyRoadNetwork()
+        dense = KnowledgeBase(road_net)
+        drivers = [Driver('id%d' % i, road_net, None, None, knowledge_base=dense) for i in range(2)]
+        drivers[0].set_known_price('e2', 70)
+        drivers[1].set_known_travel_time('e4', 25.5)
+        
+        fd, filename = tempfile.mkstemp('.kb')
+        os.close(fd)
+        try:
+            save_kb_snapshot(filename, drivers)
+            
+            sparse = SparseKnowledgeBase(road_net)
+            warm = [Driver('id%d' % i, road_net, None, None, knowledge_base=sparse) for i in range(2)]
+            KBSnapshot(filename).load(warm)
+        finally:
+            os.remove(filename)
+        
+        self.assertEqual([[1], [3]], [c.tolist() for c in sparse._columns])
+        self.assertEqual(dense.prices.tolist(), sparse.prices.tolist())
+        self.assertEqual(dense.travel_times.tolist(), sparse.travel_times.tolist())
+        
+        #values equal to the default ones are still stored for observed edges
+        sparse.set_prices(0, [1], [sparse.DEFAULT_PRICE])
+        self.assertEqual(sparse.DEFAULT_PRICE, sparse.known_price(0, 1))
             
     def test_edge_costs(self):
         '''
@@ -143,6 +300,24 @@ class Test(unittest.TestCase):
         for e in road_net.getEdges():
             self.assertEqual(50, d.edge_cost(e))
             
+    def test_cost_vector(self):
+        '''
+        Tests whether the cost vector used for routing contains
+        the same costs given by edge_cost for each edge
+        
+        '''
+        road_net =  MyRoadNetwork()
+        d = Driver('id', road_net, None, None, 0, 0.3)
+        
+        d.set_known_travel_time('e2', 25)
+        d.set_known_price('e3', 80)
+        
+        costs = d.cost_vector()
+        self.assertEqual(len(road_net.getEdges()), len(costs))
+        
+        for i, e in enumerate(road_net.getEdges()):
+            self.assertAlmostEqual(d.edge_cost(e), costs[i], None, None, .000001)
+            
     def test_perceived_trip_costs(self):
         '''
         Tests whether the driver returns the correct cost it perceives for 
@@ -166,6 +341,58 @@ class Test(unittest.TestCase):
         self.assertEqual(50, d.perceived_trip_cost)
         
             
+    def test_trip_statistics(self):
+        '''
+        Tests whether the statistics calculated from the trips' records 
+        are the same returned by the drivers' properties
+        
+        '''
+        road_net =  MyRoadNetwork()
+        kb = KnowledgeBase(road_net)
+        
+        drivers = [
+            Driver('id%d' % i, road_net, None, None, preference=pref, knowledge_base=kb) 
+            for i, pref in enumerate([0.3, 1, 0.75])
+        ]
+        
+        #the first driver pays a credit en-route, the last one does not travel
+        drivers[0].pay_credits(5)
+        trips = [
+            (drivers[0], RouteRecord('id0', 0.0, 31.0, [0, 1, 3], [12.0, 25.0, 31.0])),
+            (drivers[1], RouteRecord('id1', 4.0, 29.5, [2, 0], [17.0, 29.5])),
+        ]
+        for d, record in trips:
+            update_driver_kb(d, record, numpy.array([10, 20, 30, 40]))
+        
+        stats = TripStatistics(drivers)
+        stats.update(trips)
+        
+        for i, d in enumerate(drivers):
+            self.assertAlmostEqual(d.norm_travel_time, stats.norm_travel_time[i])
+            self.assertEqual(d.trip_expenses, stats.trip_expenses[i])
+            self.assertAlmostEqual(d.perceived_trip_cost, stats.perceived_trip_cost[i])
+        
+        self.assertEqual(75, stats.trip_expenses[0])
+        self.assertEqual(Driver.NOT_DEPARTED, stats.norm_travel_time[2])
+        
+        #the driver that did not depart is written as -1, as by its property
+        fd, filename = tempfile.mkstemp('.csv')
+        os.close(fd)
+        try:
+            writer = StatsWriter(filename)
+            writer.writeValues(1, stats.values('norm_travel_time'))
+            writer.flush()
+            line = open(filename).read().strip()
+        finally:
+            os.remove(filename)
+        self.assertEqual('-1', line.split(',')[3])
+        self.assertEqual(drivers[2].norm_travel_time, stats.values('norm_travel_time')[2])
+        
+        #with online payment, the route is not charged again
+        update_driver_kb(drivers[1], trips[1][1], numpy.array([10, 20, 30, 40]), False)
+        self.assertEqual(40, drivers[1].trip_expenses)
+        self.assertEqual([30, 10], [drivers[1].known_price(e) for e in ['e3', 'e1']])
+    
     def test_route_calculation(self):
         '''
         Tests driver route calculation by calling prepare_next_trip
@@ -182,6 +409,21 @@ class Test(unittest.TestCase):
         
         self.assertEqual(['e1','e2','e4'], d.route)
         
+    def test_unreachable_destination(self):
+        '''
+        Tests whether preparing a trip to an unreachable destination
+        fails, either when the route is calculated or given as None
+        
+        '''
+        road_net = MyRoadNetwork()
+        edges = road_net.getEdges()
+        #e1 is not reachable from e4
+        d = Driver('id', road_net, edges[-1], edges[0])
+        
+        self.assertEqual(None, d.calculate_route())
+        self.assertRaises(ValueError, d.prepare_next_trip)
+        self.assertRaises(ValueError, d.prepare_next_trip, 0, None)
+        
     def test_driver_doesnt_query_traci_position_after_arrival(self):
         '''
         Tests whether driver is querying traci position after arrival.
@@ -397,6 +639,40 @@ class Test(unittest.TestCase):
         
         #TODO update with pricing calculation
         
+    def test_on_timestep_with_given_road(self):
+        '''
+        Tests the update of driver status when the road of the vehicle 
+        and the simulation time are given (e.g. from subscriptions),
+        in which case they must not be queried via TraCI
+        
+        '''
+        road_net = MyRoadNetwork()
+        edges = road_net.getEdges()
+        
+        d = Driver('v1', road_net, edges[0], edges[-1], 0, 1, None, lambda x: 20)
+        d.prepare_next_trip()
+        
+        def fail(*args):
+            self.fail('Driver is querying TraCI for a given value!')
+        
+        traci.vehicle.getRoadID = fail
+        traci.simulation.getCurrentTime = fail
+        traci.lane.getLength = fail
+        
+        d.on_depart(0)
+        d.on_timestep('e1', 0)
+        
+        #traverses e1 in 10 seconds, its length comes from the road network
+        d.on_timestep('e2', 10000)
+        self.assertEquals(10, d.known_travel_time('e1'))
+        self.assertEquals(100, d._length_of_traversed_edges)
+        
+        d.on_timestep('e2', 11000)
+        d.on_arrive(25000)
+        self.assertEquals(15, d.known_travel_time('e2'))
+        self.assertEquals(200, d._length_of_traversed_edges)
+        self.assertEquals(25, d.travel_time / 1000)
+        
     def test_parse_drivers(self):
         '''
         Tests the driver parser by checking the drivers created by the 
@@ -424,6 +700,83 @@ class Test(unittest.TestCase):
         self.assertEquals(1, drivers[1].preference)
         
         
+    def test_read_drivers_table(self):
+        '''
+        Tests the columns read from a drivers' file with comments 
+        and extra columns
+        
+        '''
+        road_net = MyRoadNetwork()
+        
+        fd, filename = tempfile.mkstemp('.drv')
+        os.write(fd, '#id orig dest depart pref\nid1 e1 e3 9 0.5\nid2 e2 e4 5 1 extra\nid3 e4 e1 5 0\n')
+        os.close(fd)
+        
+        try:
+            table = read_drivers_table(filename, compiled_net_of(road_net))
+        finally:
+            os.remove(filename)
+        
+        self.assertEqual(['id1', 'id2', 'id3'], table.ids)
+        self.assertEqual([0, 1, 3], table.origins.tolist())
+        self.assertEqual([2, 3, 0], table.destinations.tolist())
+        self.assertEqual([9, 5, 5], table.departs.tolist())
+        self.assertEqual([0.5, 1, 0], table.preferences.tolist())
+        
+        #drivers departing at the same time keep their order
+        self.assertEqual([1, 2, 0], table.departure_order.tolist())
+        
+        #the scheduler takes the order of the table
+        drivers = create_drivers(table, road_net)
+        scheduler = DepartureScheduler(drivers, 1, table.departure_order)
+        self.assertEqual(['id2', 'id3'], [d.driver_id for d in scheduler.release(5)])
+        
+    def test_read_drivers_table_missing_columns(self):
+        '''
+        Tests whether a line with missing columns is reported, even
+        if another line has extra columns
+        
+        '''
+        road_net = MyRoadNetwork()
+        
+        fd, filename = tempfile.mkstemp('.drv')
+        os.write(fd, 'id1 e1 e3 9 0.5 extra\n\nid2 e2 e4 5\nid3 e4 e1 5 0\n')
+        os.close(fd)
+        
+        try:
+            read_drivers_table(filename, compiled_net_of(road_net))
+            self.fail('ValueError expected')
+        except ValueError, e:
+            self.assertTrue(str(e).startswith('Line 3 of'))
+        finally:
+            os.remove(filename)
+        
+    def test_departure_scheduler(self):
+        '''
+        Tests whether drivers given in any order are released in 
+        batches, sorted by their departure times
+        
+        '''
+        road_net = MyRoadNetwork()
+        departs = [30, 0, 150, 30, 99, 100]
+        drivers = [Driver('id%d' % i, road_net, None, None, dep) for i, dep in enumerate(departs)]
+        
+        scheduler = DepartureScheduler(drivers, 100)
+        self.assertEqual(6, len(scheduler))
+        
+        released = scheduler.release(0)
+        self.assertEqual(['id1', 'id0', 'id3', 'id4'], [d.driver_id for d in released])
+        self.assertEqual([], scheduler.release(0))
+        self.assertEqual(2, len(scheduler))
+        
+        self.assertEqual(['id5'], [d.driver_id for d in scheduler.release(1)])
+        self.assertEqual(['id2'], [d.driver_id for d in scheduler.release(100)])
+        self.assertEqual(0, len(scheduler))
+        
+        #after reset, all drivers are released again
+        scheduler.reset()
+        self.assertEqual(6, len(scheduler.release(200)))
+        
     def test_kb_saver(self):
         '''
         Tests the saving of the knowledge base. Creates two drivers,
@@ -505,6 +858,70 @@ class Test(unittest.TestCase):
         self.assertEqual(10.0, driver2.known_travel_time('e4'))
         
         
+    def test_kb_snapshot(self):
+        '''
+        Tests saving the knowledge base in a binary snapshot and loading
+        it into drivers with another knowledge base
+        
+        '''
+        road_net = MyRoadNetwork()
+        drivers = [Driver('id%d' % i, road_net, None, None) for i in range(3)]
+        
+        drivers[0].set_known_price('e1', 40)
+        drivers[2].set_known_price('e4', 90)
+        drivers[1].set_known_travel_time('e2', 20.5)
+        
+        fd, filename = tempfile.mkstemp('.kb')
+        os.close(fd)
+        
+        try:
+            KBSaver(drivers[1:], road_net, None, None).save_snapshot(filename, 3, 10)
+            
+            snapshot = KBSnapshot(filename)
+            self.assertEqual((3, 10), (snapshot.iteration, snapshot.timestep))
+            self.assertEqual(['e1', 'e2', 'e3', 'e4'], snapshot.edge_ids)
+            self.assertEqual(['id1', 'id2'], snapshot.driver_ids)
+            self.assertEqual((2, 4), snapshot.prices.shape)
+            
+            #drivers are matched by ID, the first one is not in the snapshot
+            loaded = [Driver('id%d' % i, road_net, None, None) for i in (2, 0, 1)]
+            loaded[1].set_known_price('e1', 60)
+            
+            KBLoader(filename, None).load(loaded)
+        finally:
+            os.remove(filename)
+        
+        self.assertEqual([50, 50, 50, 90], [loaded[0].known_price(e) for e in road_net.getEdges()])
+        self.assertEqual(60, loaded[1].known_price('e1'))
+        self.assertEqual(20.5, loaded[2].known_travel_time('e2'))
+        self.assertEqual(10.0, loaded[2].known_travel_time('e1'))
+    
+    def test_kb_loader_from_filename(self):
+        '''
+        Tests whether knowledge base text files given by name are read 
+        (and kept intact)
+        
+        '''
+        content = '1\n10\ndrv_id\\edg_id,e1,e2,e3,e4\nid1,40,50,50,50\n'
+        
+        filenames = []
+        for i in range(2):
+            fd, filename = tempfile.mkstemp('.csv')
+            os.write(fd, content)
+            os.close(fd)
+            filenames.append(filename)
+        
+        driver = Driver('id1', MyRoadNetwork(), None, None)
+        try:
+            KBLoader(filenames[0], filenames[1]).load([driver])
+            self.assertEqual(content, open(filenames[0]).read())
+        finally:
+            for filename in filenames:
+                os.remove(filename)
+        
+        self.assertEqual(40, driver.known_price('e1'))
+        self.assertEqual(50, driver.known_travel_time('e2'))
+
 
 #----- Monkeypatches from now on ------#
         
@@ -7,6 +7,7 @@ import sys
 import os
 import unittest
 import traci
+import traci.constants as tc
 from sumomockup.roadnetpatch import MyRoadNetwork, MyEdge
 
 #TODO remove this by installing the module in PYTHONPATH
@@ -40,6 +41,32 @@ class Test(unittest.TestCase):
                 mgr.commute_finished_action()
                 self.assertEqual(100, mgr.price)  
     
+    def test_price_initialization(self):
+        '''
+        Tests whether prices initialized at once by the network
+        manager are the same initialized by each manager
+        
+        '''
+        road_net = MyRoadNetwork()
+        self._net_mgr = NetworkManager(road_net, LinkManager)
+        
+        self.assertEqual(20, self._net_mgr.max_link_capacity)
+        self.assertEqual([20] * 4, self._net_mgr.link_capacities.tolist())
+        
+        for mgr in self._net_mgr.list_of_managers:
+            price = mgr.price
+            mgr.initialize_price()
+            self.assertEqual(price, mgr.price)
+            self.assertEqual(price, mgr.next_commute_price)
+    
+    def test_empty_network(self):
+        road_net = MyRoadNetwork()
+        road_net._edges = []
+        
+        net_mgr = NetworkManager(road_net, LinkManager)
+        self.assertEqual([], net_mgr.list_of_managers)
+        self.assertEqual(None, net_mgr.max_link_capacity)
+        
     def test_prc_within_limits(self):
         road_net = MyRoadNetwork()
         self._net_mgr = NetworkManager(road_net, LinkManager)
@@ -127,6 +154,108 @@ class Test(unittest.TestCase):
         
         
         
+    def test_occupancy_subscription(self):
+        '''
+        Tests whether the average occupancies collected via subscription
+        are the same calculated by each link manager
+        
+        '''
+        traci.edge.getLastStepOccupancy = my_traci_edge_getLastStepOccupancy
+        traci.edge.subscribe = lambda edgeID, varIDs: None
+        traci.edge.getSubscriptionResults = my_traci_edge_getSubscriptionResults
+        
+        road_net = MyRoadNetwork()
+        self._net_mgr = NetworkManager(road_net, LinkManager)
+        
+        #calculates the expected averages in separate managers
+        expected = [LinkManager(e, self._net_mgr) for e in road_net.getEdges()]
+        
+        self._net_mgr.subscribe_occupancy()
+        for timestep in range(10):
+            self._net_mgr.timestep_action()
+            for mgr in expected:
+                mgr.timestep_action()
+        
+        for mgr, exp in zip(self._net_mgr.list_of_managers, expected):
+            self.assertEqual(10, mgr._timestep)
+            self.assertAlmostEqual(exp.occupancy, mgr.occupancy)
+            
+        #new commute resets the averages
+        for mgr in self._net_mgr.list_of_managers:
+            mgr.before_commute_action()
+            self.assertEqual(0, mgr.occupancy)
+            self.assertEqual(0, mgr._timestep)
+        
+    def test_vectorized_prc_update(self):
+        '''
+        Tests whether the price update of all links at once (via network 
+        manager) gives the same next prices of the update of each manager
+        
+        '''
+        road_net = MyRoadNetwork()
+        
+        for mgr_class in [GreedyLinkManager, IncrementalLinkManager]:
+            expected = NetworkManager(road_net, mgr_class)
+            vectorized = NetworkManager(road_net, mgr_class)
+            
+            for net_mgr in [expected, vectorized]:
+                net_mgr.manager_of_link('e2')._price = 50
+                net_mgr.manager_of_link('e3')._price = 70
+                
+                net_mgr.manager_of_link('e2')._average_occupancy = 0.5
+                net_mgr.manager_of_link('e3')._average_occupancy = 0.3
+                
+            for mgr in expected.list_of_managers:
+                mgr.commute_finished_action()
+            vectorized.commute_finished_action()
+            
+            self.assertEqual(
+                [m.next_commute_price for m in expected.list_of_managers],
+                [m.next_commute_price for m in vectorized.list_of_managers]
+            )
+            
+            #new commute: prices receive the next prices and averages are reset
+            vectorized.before_commute_action()
+            for mgr in vectorized.list_of_managers:
+                self.assertEqual(mgr.next_commute_price, mgr.price)
+                self.assertEqual(0, mgr.occupancy)
+                
+    def test_alternatives_index(self):
+        '''
+        Tests the alternatives indexed by the network manager and
+        the average occupancy of the alternatives of all links
+        
+        '''
+        road_net = MyRoadNetwork()
+        self._net_mgr = NetworkManager(road_net, LinkManager)
+        
+        e2 = self._net_mgr.manager_of_link('e2')
+        e3 = self._net_mgr.manager_of_link('e3')
+        
+        #e2 and e3 are the alternatives of each other, e1 and e4 have none
+        self.assertEqual([e3], e2.find_alternative_managers())
+        self.assertEqual([e2], e3.find_alternative_managers())
+        self.assertEqual([], self._net_mgr.manager_of_link('e1').find_alternative_managers())
+        self.assertEqual([], self._net_mgr.manager_of_link('e4').find_alternative_managers())
+        
+        e2._average_occupancy = 0.5
+        e3._average_occupancy = 0.3
+        
+        self.assertEqual(
+            [lm.average_occ_of_alternatives() for lm in self._net_mgr.list_of_managers],
+            self._net_mgr.alternatives_average_occupancy().tolist()
+        )
+                
+            
+def my_traci_edge_getSubscriptionResults():
+    '''
+    Mock for traci.edge.getSubscriptionResults, returns the
+    same occupancies of my_traci_edge_getLastStepOccupancy
+    '''
+    return dict(
+        (e, {tc.LAST_STEP_OCCUPANCY: my_traci_edge_getLastStepOccupancy(e)})
+        for e in ['e1', 'e2', 'e3', 'e4']
+    )
             
 def my_traci_edge_getLastStepOccupancy(edgeID):
     '''
@@ -0,0 +1,93 @@
+'''
+Tests the alias tables and the precompiled sampler of OD matrices
+
+'''
+import unittest
+import sys
+import os
+import random
+import numpy
+
+sys.path.append(os.path.join('..','roadpricing'))
+from odpopulator.odmatrix import ODMatrix, TAZ
+from odpopulator.util import AliasTables
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(1)
+        numpy.random.seed(1)
+
+        #trips: A->B (30), A->C (10), B->C (60), C has no trips
+        self.od_matrix = ODMatrix()
+        self.od_matrix.add_taz(TAZ(
+            'A', [{'id': 'a1', 'weight': 1.0}, {'id': 'a2', 'weight': 3.0}],
+            [{'id': 'a3', 'weight': 1.0}], {'B': 30, 'C': 10}
+        ))
+        self.od_matrix.add_taz(TAZ(
+            'B', [{'id': 'b1', 'weight': 1.0}],
+            [{'id': 'b2', 'weight': 1.0}, {'id': 'b3', 'weight': 0.0}], {'C': 60}
+        ))
+        self.od_matrix.add_taz(TAZ(
+            'C', [{'id': 'c1', 'weight': 1.0}], [{'id': 'c2', 'weight': 1.0}], {}
+        ))
+
+    def test_alias_tables(self):
+        tables = AliasTables([[1, 3, 0, 4], [], [0, 0], [5]])
+        self.assertEqual(4, len(tables))
+        self.assertEqual(4, tables.size(0))
+
+        draws = numpy.array([tables.draw(0) for i in range(8000)])
+        many = tables.draw_many(numpy.zeros(8000, dtype=int))
+        for sample in [draws, many]:
+            freq = numpy.bincount(sample, minlength=4) / 8000.0
+            self.assertTrue(numpy.allclose([0.125, 0.375, 0, 0.5], freq, atol=0.03))
+            self.assertEqual(0, freq[2])
+
+        #zero-weight distributions are uniform
+        self.assertEqual(set([0, 1]), set(tables.draw_many(numpy.array([2] * 100)).tolist()))
+        self.assertEqual([0, 0], tables.draw_many(numpy.array([3, 3])).tolist())
+
+        self.assertRaises(ValueError, tables.draw, 1)
+        self.assertRaises(ValueError, tables.draw_many, numpy.array([0, 1]))
+
+    def test_find(self):
+        sampler = self.od_matrix.sampler()
+        for taz_id in ['A', 'B', 'C']:
+            self.assertTrue(self.od_matrix.find(taz_id) is sampler.find(taz_id))
+        self.assertEqual(None, self.od_matrix.find('D'))
+        self.assertEqual(None, sampler.find('D'))
+
+    def test_sample_edges(self):
+        sources, sinks = self.od_matrix.sampler().sample_edges(10000)
+        self.assertEqual((10000,), sources.shape)
+
+        pairs = {}
+        for pair in zip(sources.tolist(), sinks.tolist()):
+            pairs[pair] = pairs.get(pair, 0) + 1
+
+        #only the sources/sinks of TAZs with trips between them are selected
+        expected = {
+            ('a1', 'b2'): 0.075, ('a2', 'b2'): 0.225,
+            ('a1', 'c2'): 0.025, ('a2', 'c2'): 0.075, ('b1', 'c2'): 0.6
+        }
+        self.assertEqual(set(expected), set(pairs))
+        for pair, freq in expected.items():
+            self.assertAlmostEqual(freq, pairs[pair] / 10000.0, delta=0.02)
+
+    def test_select_od_edges(self):
+        sampler = self.od_matrix.sampler()
+
+        origin, destination = sampler.select_od_taz()
+        self.assertTrue(destination.taz_id in origin.destinations)
+
+        #only pairs ending in b2 are accepted
+        reachable = lambda source, sink: sink == 'b2'
+        for od_selector in [sampler, self.od_matrix]:
+            for i in range(20):
+                self.assertEqual('b2', od_selector.select_od_edges(reachable)[1])
+
+            self.assertEqual(None, od_selector.select_od_edges(lambda source, sink: False))
+
+if __name__ == "__main__":
+    unittest.main()
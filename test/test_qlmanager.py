@@ -11,9 +11,10 @@ Created on Mar 21, 2013
 import unittest
 import sys
 import os
+from sumomockup.roadnetpatch import MyRoadNetwork
 
 sys.path.append(os.path.join('..','roadpricing'))
-from netmanagement import QLearningLinkManager
+from netmanagement import QLearningLinkManager, OldQLinkManager, NetworkManager
 
 class Test(unittest.TestCase):
 
@@ -63,6 +64,40 @@ class Test(unittest.TestCase):
         self.assertAlmostEqual(0.001, qlmgr.epsilon, None, None, 0.000000001)
 
 
+    def test_vectorized_update(self):
+        '''
+        Tests the q-table update of all links at once, with no 
+        exploration (i.e. the price of max q-value is chosen)
+        
+        '''
+        road_net = MyRoadNetwork()
+        
+        for mgr_class in [QLearningLinkManager, OldQLinkManager]:
+            expected = NetworkManager(road_net, mgr_class)
+            vectorized = NetworkManager(road_net, mgr_class)
+            
+            for net_mgr in [expected, vectorized]:
+                for i, mgr in enumerate(net_mgr.list_of_managers):
+                    mgr.epsilon = 0
+                    mgr._price = 10 * i
+                    mgr._total_users = i + 1
+                    mgr._timestep = 100
+                    
+            for mgr in expected.list_of_managers:
+                mgr.commute_finished_action()
+            vectorized.commute_finished_action()
+            
+            for exp, mgr in zip(expected.list_of_managers, vectorized.list_of_managers):
+                self.assertEqual(exp.qtable, mgr.qtable)
+                self.assertEqual(exp.next_commute_price, mgr.next_commute_price)
+                self.assertEqual(exp.curr_iter, mgr.curr_iter)
+                
+                #QLearningLinkManager's rewards (users) are positive, so the
+                #price just learned has the max q-value
+                if mgr_class is QLearningLinkManager:
+                    self.assertEqual(exp.price, mgr.next_commute_price)
+        
+        
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testEpsilonDecrease']
     unittest.main()
\ No newline at end of file
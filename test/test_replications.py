@@ -0,0 +1,59 @@
+'''
+Tests the preparation of replications of experiments
+
+'''
+import unittest
+import sys
+import os
+import socket
+
+sys.path.append(os.path.join('..','roadpricing'))
+from replications import replication_jobs, parse_seeds, free_port, free_ports
+
+class Test(unittest.TestCase):
+
+    def test_replication_jobs(self):
+        jobs = replication_jobs(['exp/5k-time/config.xml', 'exp/8500-gsn.xml'], [1, 2], 'out')
+        
+        self.assertEqual(4, len(jobs))
+        self.assertEqual(
+            [os.path.join('out', name) for name in 
+             ['5k-time_seed1', '5k-time_seed2', '8500-gsn_seed1', '8500-gsn_seed2']],
+            [j['output_path'] for j in jobs]
+        )
+        self.assertEqual([1, 2, 1, 2], [j['seed'] for j in jobs])
+        
+        #output directories are distinct
+        self.assertEqual(len(jobs), len(set(j['output_path'] for j in jobs)))
+        
+    def test_replication_jobs_same_name(self):
+        jobs = replication_jobs(
+            ['a/exp/config.xml', 'b/exp/config.xml', 'a/x.xml', 'b/x.xml', 'c/y.xml'], [1], 'out'
+        )
+        
+        #config files with the same name get distinct output directories
+        self.assertEqual(
+            [os.path.join('out', name) for name in 
+             ['exp-1_seed1', 'exp-2_seed1', 'x-3_seed1', 'x-4_seed1', 'y_seed1']],
+            [j['output_path'] for j in jobs]
+        )
+        
+    def test_parse_seeds(self):
+        self.assertEqual([1, 2, 5], parse_seeds('1,2,5'))
+        self.assertEqual([3, 4, 5, 6], parse_seeds('3-6'))
+        
+    def test_free_port(self):
+        port = free_port()
+        
+        #the port can be bound
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.bind(('', port))
+        s.close()
+        
+    def test_free_ports(self):
+        ports = free_ports(20)
+        self.assertEqual(20, len(set(ports)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+'''
+Tests merging the command line options over the config file
+
+'''
+import unittest
+import sys
+import os
+from optparse import OptionParser
+
+sys.path.append(os.path.join('..','roadpricing'))
+import configparser
+from roadpricing import register_options, merge_options
+
+class Test(unittest.TestCase):
+
+    def merge(self, args):
+        parser = OptionParser()
+        register_options(parser)
+        
+        return merge_options(
+            configparser.ConfigParser(os.path.join('..', 'roadpricing', 'config.xml')),
+            parser, args
+        )
+    
+    def test_merge_options(self):
+        cfg = self.merge([
+            '-c', 'config.xml', '-i', '7', '--route-workers', '4', '--sparse-kb', 
+            '--no-checkpoint', '--departure-lookahead', '50'
+        ])
+        
+        #given options override the config file
+        self.assertEqual(7, cfg.iterations)
+        self.assertEqual(4, cfg.route_workers)
+        self.assertEqual(50, cfg.departure_lookahead)
+        self.assertTrue(cfg.sparse_kb)
+        self.assertFalse(cfg.checkpoint)
+        
+        #the others keep the values of the config file
+        self.assertEqual(8001, cfg.port)
+        self.assertEqual('ql', cfg.resultprefix)
+        self.assertFalse(cfg.resume)
+        self.assertFalse(cfg.persistent_sumo)
+        
+    def test_merge_default_values(self):
+        #the config file has 400 iterations and port 8001
+        cfg = self.merge(['-c', 'config.xml', '-i', '50', '--port', '8813'])
+        
+        #options given with the parser's defaults still override the config file
+        self.assertEqual(50, cfg.iterations)
+        self.assertEqual(8813, cfg.port)
+
+if __name__ == "__main__":
+    unittest.main()
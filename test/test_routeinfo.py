@@ -0,0 +1,60 @@
+'''
+Tests the reading of route information files generated by SUMO
+
+'''
+import unittest
+import sys
+import os
+import tempfile
+
+sys.path.append(os.path.join('..','roadpricing'))
+from routeinfo import read_routes
+
+ROUTE_INFO = '''<?xml version="1.0" encoding="UTF-8"?>
+
+<!-- generated on 03/21/13 by SUMO Version 0.16.0
+<configuration>
+    <input>
+        <net-file value="net.xml"/>
+    </input>
+</configuration>
+-- double dashes are not valid xml comments -->
+
+<routes>
+    <vehicle id="d1" depart="0.00" arrival="30.00">
+        <route edges="e1 e2 e4" exitTimes="10.00 25.00 30.00"/>
+    </vehicle>
+    <vehicle id="d2" depart="5.00" arrival="">
+        <route edges="e1 e3" exitTimes="15.00 40.00"/>
+    </vehicle>
+</routes>
+'''
+
+class Test(unittest.TestCase):
+
+    def test_read_routes(self):
+        fd, filename = tempfile.mkstemp('.xml')
+        os.write(fd, ROUTE_INFO)
+        os.close(fd)
+        
+        index = {'e1': 0, 'e2': 1, 'e3': 2, 'e4': 3}
+        try:
+            records = list(read_routes(filename, index.__getitem__))
+        finally:
+            os.remove(filename)
+        
+        self.assertEqual(2, len(records))
+        
+        self.assertEqual('d1', records[0].vehicle_id)
+        self.assertEqual(0, records[0].depart)
+        self.assertEqual(30, records[0].arrival)
+        self.assertEqual([0, 1, 3], records[0].edges)
+        self.assertEqual([10, 25, 30], records[0].exit_times)
+        
+        #d2 has no arrival, it receives the last registered arrival
+        self.assertEqual(30, records[1].arrival)
+        self.assertEqual([0, 2], records[1].edges)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+'''
+Tests the batch calculation of routes
+
+'''
+import unittest
+import sys
+import os
+from sumomockup.roadnetpatch import MyRoadNetwork
+
+sys.path.append(os.path.join('..','roadpricing'))
+from drivers import Driver, KnowledgeBase
+from routing import BatchRouter, ParallelRoutePlanner
+
+class Test(unittest.TestCase):
+
+    def test_batch_routes(self):
+        '''
+        Tests whether drivers with the same origin and costs are grouped
+        and whether their routes are the same calculated individually
+
+        '''
+        road_net = MyRoadNetwork()
+        e1, e2, e3, e4 = road_net.getEdges()
+        kb = KnowledgeBase(road_net)
+
+        drivers = [
+            Driver('d1', road_net, e1, e4, knowledge_base=kb),
+            Driver('d2', road_net, e1, e3, knowledge_base=kb),
+            Driver('d3', road_net, e1, e4, 0, 0.5, knowledge_base=kb),
+            Driver('d4', road_net, e2, e4, knowledge_base=kb),
+            Driver('d5', road_net, e4, e1, knowledge_base=kb),
+        ]
+        #d1 knows that e2 is slow, thus its costs are different from d2's
+        drivers[0].set_known_travel_time(e2, 100)
+
+        router = BatchRouter(road_net)
+        self.assertEqual(5, len(router.group_drivers(drivers)))
+
+        drivers[0].set_known_travel_time(e2, 10)
+        self.assertEqual(4, len(router.group_drivers(drivers)))
+
+        routes = router.calculate_routes(drivers)
+        self.assertEqual(['e1', 'e2', 'e4'], routes[0])
+        self.assertEqual(['e1', 'e3'], routes[1])
+        self.assertEqual(['e2', 'e4'], routes[3])
+
+        #e1 is not reachable from e4
+        self.assertEqual(None, routes[4])
+
+        for d, route in zip(drivers[:4], routes):
+            self.assertEqual(d.calculate_route(), route)
+
+    def test_parallel_planner(self):
+        '''
+        Tests whether routes planned by worker processes are the same
+        calculated by the batch router
+
+        '''
+        road_net = MyRoadNetwork()
+        e1, e2, e3, e4 = road_net.getEdges()
+
+        drivers = [
+            Driver('d1', road_net, e1, e4),
+            Driver('d2', road_net, e1, e3, 0, 0.2),
+            Driver('d3', road_net, e2, e4),
+        ]
+        drivers[0].set_known_travel_time(e2, 100)
+
+        planner = ParallelRoutePlanner(road_net, 2)
+        planner.plan(drivers)
+
+        self.assertEqual(
+            BatchRouter(road_net).calculate_routes(drivers),
+            planner.calculate_routes(drivers)
+        )
+        self.assertEqual(['e1', 'e3', 'e4'], planner.calculate_routes(drivers[:1])[0])
+        planner.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+'''
+Tests the searches over compiled networks, comparing them
+with the original AStar implementation
+
+'''
+import unittest
+import sys
+import os
+import random
+from sumomockup.roadnetpatch import MyRoadNetwork
+
+sys.path.append(os.path.join('..','lib','search'))
+from search import dijkstra, AStar, CompiledNet, compiled_net_of, search_compiled, PathCache
+from search import ReachabilityIndex, reachability_of
+
+class Edge(object):
+    '''
+    Minimal edge of a network built from a list of connections
+
+    '''
+    def __init__(self, edge_id):
+        self._id = edge_id
+        self._out = []
+
+    def getID(self):
+        return self._id
+
+    def getLength(self):
+        return 1.0
+
+    def getSpeed(self):
+        return 1.0
+
+    def getOutgoing(self):
+        return self._out
+
+class Network(object):
+    '''
+    Network with the given number of edges and connections (pairs of indices)
+
+    '''
+    def __init__(self, num_edges, connections):
+        self._edges = [Edge('e%d' % i) for i in range(num_edges)]
+        for a, b in connections:
+            self._edges[a]._out.append(self._edges[b])
+
+    def getEdges(self):
+        return self._edges
+
+class Test(unittest.TestCase):
+
+    def test_compiled_net(self):
+        '''
+        Tests the indices and successor arrays of a compiled network
+
+        '''
+        road_net = MyRoadNetwork()
+        compiled = CompiledNet(road_net)
+
+        self.assertEqual(len(road_net.getEdges()), len(compiled))
+        for i, e in enumerate(road_net.getEdges()):
+            self.assertEqual(i, compiled.index_of(e))
+            self.assertEqual(i, compiled.index_of(e.getID()))
+            self.assertEqual(e.getLength(), compiled.lengths[i])
+            self.assertEqual(
+                sorted([o.getID() for o in e.getOutgoing()]),
+                sorted([compiled.ids[s] for s in compiled.successors(i)])
+            )
+
+    def test_compiled_net_is_cached(self):
+        road_net = MyRoadNetwork()
+        self.assertTrue(compiled_net_of(road_net) is compiled_net_of(road_net))
+
+    def test_same_paths_as_astar(self):
+        '''
+        Compares the paths of dijkstra (which uses the compiled network)
+        with the ones found by AStar, for all pairs of edges
+
+        '''
+        road_net = MyRoadNetwork()
+        edges = road_net.getEdges()
+        astar = AStar(lambda e: e.getLength(), lambda a, b: 0.0)
+
+        for accept_single_edge in [False, True]:
+            for orig in edges:
+                for dest in edges:
+                    expected = astar.search(road_net, orig, dest, accept_single_edge)
+                    result = dijkstra(road_net, orig, dest, None, accept_single_edge)
+
+                    if expected is None:
+                        self.assertEqual(None, result)
+                    else:
+                        self.assertEqual(
+                            [e.getID() for e in expected],
+                            [e.getID() for e in result]
+                        )
+
+    def test_cost_sequence(self):
+        '''
+        Tests searching with a sequence of costs indexed by edge index
+        and whether the search buffers are restored afterwards
+
+        '''
+        road_net = MyRoadNetwork()
+        compiled = compiled_net_of(road_net)
+
+        #makes e2 expensive, so that the route goes through e3
+        costs = [1.0] * len(compiled)
+        costs[compiled.index_of('e2')] = 10.0
+
+        route = dijkstra(road_net, road_net.getEdge('e1'), road_net.getEdge('e4'), costs)
+        self.assertEqual(['e1', 'e3', 'e4'], [e.getID() for e in route])
+
+        self.assertEqual(None, search_compiled(
+            compiled, compiled.index_of('e4'), compiled.index_of('e1'), costs
+        ))
+        self.assertEqual([-1] * len(compiled), compiled.previous)
+        self.assertFalse(any(compiled.closed))
+
+
+    def test_path_cache(self):
+        '''
+        Tests whether the cached paths are the ones found by dijkstra
+        and the eviction of the least recently used paths
+
+        '''
+        road_net = MyRoadNetwork()
+        edges = road_net.getEdges()
+        e1, e4 = road_net.getEdge('e1'), road_net.getEdge('e4')
+
+        cache = PathCache(road_net, max_size=2)
+        for orig in edges:
+            for dest in edges:
+                expected = dijkstra(road_net, orig, dest, None, True)
+                result = cache.path(orig, dest)
+                if expected is None:
+                    self.assertEqual(None, result)
+                else:
+                    self.assertEqual(
+                        [e.getID() for e in expected], [e.getID() for e in result]
+                    )
+        self.assertEqual(2, len(cache))
+        self.assertEqual(9, cache.misses)
+        self.assertEqual(len(edges) ** 2, cache.misses + cache.rejected)
+
+        #the last path is still cached, the first one was evicted
+        cache.path(edges[-1], edges[-1])
+        self.assertEqual(1, cache.hits)
+        cache.path(edges[0], edges[0])
+        self.assertEqual(1, cache.hits)
+
+        #precomputed paths are the same and are not searched again
+        cache = PathCache(road_net, max_size=None)
+        cache.precompute(edges, [e4])
+        self.assertEqual(len(edges), len(cache))
+        self.assertEqual(
+            [e.getID() for e in dijkstra(road_net, e1, e4, None, True)],
+            [e.getID() for e in cache.path(e1, e4)]
+        )
+        self.assertEqual((1, 0), (cache.hits, cache.misses))
+
+    def test_reachability(self):
+        '''
+        Compares the reachability index with the paths found by dijkstra,
+        in a random network with cycles, self-loops and dead ends
+
+        '''
+        rnd = random.Random(7)
+        connections = set((rnd.randrange(40), rnd.randrange(40)) for i in range(60))
+        road_net = Network(40, sorted(connections))
+        reachability = reachability_of(road_net)
+
+        self.assertTrue(reachability is reachability_of(road_net))
+        self.assertEqual(40, len(reachability))
+
+        edges = road_net.getEdges()
+        for accept_single_edge in [False, True]:
+            for orig in edges:
+                for dest in edges:
+                    self.assertEqual(
+                        dijkstra(road_net, orig, dest, None, accept_single_edge) is not None,
+                        reachability.reachable(orig, dest, accept_single_edge)
+                    )
+
+    def test_path_cache_rejects_unreachable(self):
+        road_net = MyRoadNetwork()
+        cache = PathCache(road_net)
+
+        self.assertFalse(cache.reachable('e4', 'e1'))
+        self.assertEqual(None, cache.path(road_net.getEdge('e4'), road_net.getEdge('e1')))
+        self.assertEqual((1, 0, 0), (cache.rejected, cache.misses, len(cache)))
+
+if __name__ == "__main__":
+    unittest.main()
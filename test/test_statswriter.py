@@ -0,0 +1,92 @@
+'''
+Tests the buffered statistics writer
+
+'''
+import unittest
+import sys
+import os
+import tempfile
+import shutil
+import numpy
+
+sys.path.append(os.path.join('..','roadpricing'))
+from statistics.statswriter import StatsWriter
+
+class Holder(object):
+    '''
+    Holds a value returned by an attribute and by a method
+
+    '''
+    def __init__(self, value):
+        self.value = value
+
+    def get_value(self):
+        return self.value
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'exp_edg_occ.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self):
+        f = open(self.filename)
+        content = f.read()
+        f.close()
+        return content
+
+    def test_lines_are_buffered_until_flush(self):
+        writer = StatsWriter(self.filename)
+
+        writer.writeLine('x', [Holder('e1'), Holder('e2')], 'value')
+        self.assertEqual('', self.read())
+
+        writer.flush()
+        self.assertEqual('x,e1,e2\n', self.read())
+
+    def test_values_written_as_lines(self):
+        writer = StatsWriter(self.filename)
+        holders = [Holder(0.1), Holder(2.0 / 3), Holder(5)]
+
+        #attributes, methods and arrays of values produce the same csv line
+        writer.writeLine(2, holders, 'value')
+        writer.writeLine(2, holders, 'get_value')
+        writer.writeValues(2, numpy.array([0.1, 2.0 / 3, 5.0]))
+        writer.writeValues(3, numpy.array([10, 0, 90]))
+        writer.flush()
+
+        lines = self.read().split('\n')
+        self.assertEqual('2,0.1,0.666666666667,5', lines[0])
+        self.assertEqual(lines[0], lines[1])
+        self.assertEqual('2,0.1,0.666666666667,5.0', lines[2])
+        self.assertEqual('3,10,0,90', lines[3])
+
+    def test_binary_output(self):
+        writer = StatsWriter(self.filename, binary=True)
+
+        writer.writeValues(1, numpy.array([3, 1, 2]))
+        writer.flush()
+
+        stored = numpy.load(os.path.join(self.tmpdir, 'exp_edg_occ_1.npy'))
+        self.assertEqual([3, 1, 2], stored.tolist())
+        self.assertEqual('1,3,1,2\n', self.read())
+
+    def test_lines_after_checkpoint_are_discarded(self):
+        writer = StatsWriter(self.filename)
+        writer.writeLine('x', [Holder('e1')], 'value')
+        for iteration in range(4):
+            writer.writeValues(iteration, [iteration * 10])
+        writer.flush()
+        
+        #resumes after iteration 1, i.e. lines of 2 and 3 were written before a crash
+        writer = StatsWriter(self.filename, keep_until=1)
+        writer.writeValues(2, [99])
+        writer.flush()
+        
+        self.assertEqual('x,e1\n0,0\n1,10\n2,99\n', self.read())
+
+if __name__ == "__main__":
+    unittest.main()